@@ -0,0 +1,64 @@
+"""
+Conditional GET for polled JSON endpoints.
+
+The transactions page, the shop menu and the order history poll endpoints
+whose data rarely changes between polls. conditional_on() derives an ETag
+and Last-Modified from one aggregate query, the newest updated_at and the
+row count of the rows behind the response, and answers 304 Not Modified
+when the client's If-None-Match or If-Modified-Since still matches, before
+the view runs. A changed row moves updated_at; a deleted one changes the
+count.
+
+Responses are marked private and no-cache, so browsers always revalidate
+instead of reusing a stale copy.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+
+def conditional_on(queryset_func, vary_func=None):
+    """
+    Decorate a view to answer conditional GETs from its rows' updated_at.
+
+    Args:
+        queryset_func: Callable taking the view's arguments and returning the
+            queryset the response is built from; it needs an updated_at field
+        vary_func: Optional callable taking the view's arguments and
+            returning a string for anything else the response depends on,
+            such as the user or query parameters
+
+    Returns:
+        A view decorator
+    """
+    def validator(request, *args, **kwargs):
+        # Computed once per request and shared by the ETag and Last-Modified
+        if not hasattr(request, '_conditional_validator'):
+            state = queryset_func(request, *args, **kwargs).order_by().aggregate(
+                last_modified=Max('updated_at'), count=Count('pk')
+            )
+            vary = vary_func(request, *args, **kwargs) if vary_func else ''
+            last_modified = state['last_modified']
+            raw = f"{last_modified.isoformat() if last_modified else ''}:{state['count']}:{vary}"
+            request._conditional_validator = (hashlib.md5(raw.encode()).hexdigest(), last_modified)
+        return request._conditional_validator
+
+    def etag(request, *args, **kwargs):
+        return validator(request, *args, **kwargs)[0]
+
+    def last_modified(request, *args, **kwargs):
+        return validator(request, *args, **kwargs)[1]
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,166 @@
+"""
+Query-count budgets for view tests.
+
+Each app's tests.py uses QueryBudgetMixin to assert a maximum number of
+database queries per endpoint. assertQueryBudget runs the request, grows the
+data set and runs it again, so a view whose query count depends on the number
+of orders (an N+1) fails even when it fits the budget on a small data set.
+Failure messages list the SQL that was executed.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from dashboard.models import InventoryItem
+from managepayments import idempotency
+from managepayments.models import DeliveryInfo
+from managers.models import ManagerProfile
+from shop import middleware as shop_middleware
+from shop import order_ids
+from shop.models import Order, OrderItem, ShopUser
+from shop.rollups import rebuild_order_days
+from shop.totals import totals_for_lines
+from shop.user_cache import bump_user_version, get_identity_version
+
+MENU = [
+    ('Veg Sandwich', Decimal('40.00')),
+    ('Masala Dosa', Decimal('60.00')),
+    ('Cold Coffee', Decimal('50.00')),
+    ('Samosa', Decimal('15.00')),
+    ('Tea', Decimal('10.00')),
+]
+PAYMENT_METHODS = ['cash', 'upi', 'card', 'classroom_delivery']
+
+
+class QueryBudgetMixin:
+    """TestCase mixin with seeding helpers and query budget assertions."""
+
+    def _format_queries(self, context):
+        return '\n'.join(
+            f"{number}. {query['sql']}" for number, query in enumerate(context.captured_queries, start=1)
+        )
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default'):
+        """Fail if the block runs more than budget queries."""
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context)
+        if executed > budget:
+            self.fail(
+                f"{executed} queries executed, budget is {budget}:\n{self._format_queries(context)}"
+            )
+
+    def assertQueryBudget(self, budget, make_request, grow=None):
+        """
+        Assert make_request stays within budget before and after growing the data.
+
+        make_request is called once unmeasured first, so one-off costs such as
+        reserving a block of order IDs do not hide growth in the measured calls.
+        The cache is cleared before each measured call, so the budget covers
+        the uncached path.
+
+        Args:
+            budget: Maximum number of queries for one call of make_request
+            make_request: Callable performing the request; its result is returned
+            grow: Callable that adds data; defaults to seeding 20 more orders
+
+        Returns:
+            The result of the last make_request call
+        """
+        make_request()
+        cache.clear()
+        with self.assertMaxQueries(budget) as small:
+            make_request()
+        (grow or (lambda: self.seed_orders(20)))()
+        cache.clear()
+        with self.assertMaxQueries(budget) as large:
+            result = make_request()
+        if len(large) > len(small):
+            self.fail(
+                f"Query count grew with the data from {len(small)} to {len(large)}:\n"
+                f"{self._format_queries(large)}"
+            )
+        return result
+
+    def reset_process_state(self):
+        """
+        Drop process-local state that outlives each test's database rollback.
+
+        The order ID allocator starts with no block, and no idempotent
+        responses or rendered fragments are cached from earlier tests, whose
+        rows no longer exist.
+        """
+        order_ids._allocator = None
+        idempotency._front_cache.clear()
+        cache.clear()
+
+    def create_shop_user(self, name='asha'):
+        return ShopUser.objects.create(name=name, email=f"{name}@example.com", phone='9999999999')
+
+    def login_shop_user(self, user):
+        session = self.client.session
+        session['shop_user_id'] = user.id
+        session[shop_middleware.SESSION_KEY] = shop_middleware.session_identity(
+            user, get_identity_version(user.id)
+        )
+        session.save()
+
+    def login_manager(self):
+        user = User.objects.create_user(username='manager', password='manager-password')
+        ManagerProfile.objects.create(user=user)
+        self.client.force_login(user)
+        session = self.client.session
+        session['is_manager'] = True
+        session.save()
+        return user
+
+    def seed_inventory(self):
+        return InventoryItem.objects.bulk_create([
+            InventoryItem(name=name, quantity=1000, category='menu') for name, _ in MENU
+        ])
+
+    def seed_orders(self, count, user=None, items_per_order=3):
+        """Create count orders with items, a mix of payment methods and some deliveries."""
+        start = Order.objects.count()
+        now = timezone.now()
+        lines = [
+            [(MENU[(index + line) % len(MENU)], 1 + line) for line in range(items_per_order)]
+            for index in range(count)
+        ]
+        totals = [totals_for_lines((price, quantity) for (_, price), quantity in order_lines)
+                  for order_lines in lines]
+        orders = Order.objects.bulk_create([
+            Order(
+                order_id=f"CMS-{900000 + start + index:06d}",
+                student_id=user.name if user else f"student-{index}",
+                name=user.name if user else f"Student {index}",
+                user_id=user.id if user else None,
+                payment_method=PAYMENT_METHODS[index % len(PAYMENT_METHODS)],
+                status='in_progress',
+                date_created=now - timedelta(minutes=start + index),
+                total_amount=totals[index][0],
+                item_count=totals[index][1],
+            )
+            for index in range(count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, name=name, price=price, quantity=quantity)
+            for order, order_lines in zip(orders, lines)
+            for (name, price), quantity in order_lines
+        ])
+        DeliveryInfo.objects.bulk_create([
+            DeliveryInfo(order=order, floor_number='1', classroom='A101', delivery_time='12:30')
+            for order in orders if order.payment_method == 'classroom_delivery'
+        ])
+        # Bulk inserted, so the daily sales are recomputed for their days
+        rebuild_order_days(*(order.date_created for order in orders))
+        if user:
+            bump_user_version(user.id)
+        return orders
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'shop.middleware.ShopUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
@@ -164,6 +165,67 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Post-order side effects (delivery records, inventory) are queued in the
+# order outbox and applied right after the order commits. Set to False when
+# `manage.py run_order_worker` is running to apply them outside the request;
+# entries whose inline attempt failed are picked up by the worker as well.
+ORDER_OUTBOX_INLINE = os.environ.get('ORDER_OUTBOX_INLINE', 'True') == 'True'
+
+# Seconds a stored response for a payment callback or order submission is
+# replayed for the same order ID; `manage.py clear_idempotency_keys` removes
+# expired keys.
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# Order IDs each worker process reserves from the database at a time; see
+# shop.order_ids.
+ORDER_ID_BLOCK_SIZE = int(os.environ.get('ORDER_ID_BLOCK_SIZE', 100))
+
+# Cache for rendered history rows and per-user cached reads (see
+# shop.user_cache). Local memory is per process; set CACHE_URL to
+# redis://host:6379/0 (needs the redis package) or file:///path/to/dir to
+# share one cache between web workers and the SMS reader.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif CACHE_URL.startswith('file://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': CACHE_URL[len('file://'):],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'cafeteria',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+# Seconds a per-user cached read is kept. Entries are invalidated when the
+# student's orders change, so with a shared cache this only bounds how long
+# unused ones linger. Local memory is per process: an order written by one
+# worker (or the SMS reader) does not invalidate another worker's copy, so
+# there the timeout is how stale a student's history may get.
+USER_CACHE_TIMEOUT = int(os.environ.get(
+    'USER_CACHE_TIMEOUT',
+    30 if CACHES['default']['BACKEND'].endswith('LocMemCache') else 24 * 60 * 60,
+))
+
+# The live order stream (/transactions/api/live/) needs an ASGI server such
+# as `uvicorn cafeteria_management_system.asgi:application`. Order writes in
+# the same process reach it at once; writes in other processes within this
+# many seconds. A comment line is sent after HEARTBEAT seconds of silence so
+# proxies keep the connection open.
+LIVE_ORDERS_POLL_INTERVAL = float(os.environ.get('LIVE_ORDERS_POLL_INTERVAL', 3))
+LIVE_ORDERS_HEARTBEAT = float(os.environ.get('LIVE_ORDERS_HEARTBEAT', 15))
 # import dj_database_url
 
 # DATABASES['default'] = dj_database_url.config(default='sqlite:///' + str(BASE_DIR / "db.sqlite3"))
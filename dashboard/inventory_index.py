@@ -0,0 +1,193 @@
+"""
+Process-local name index over InventoryItem.
+
+Checkout carts carry item names, not inventory ids, so every order has to map
+names onto inventory rows. This module keeps an in-memory index of
+(id, normalized name) pairs and resolves a whole cart in one pass using the
+same three strategies the checkout code has always used:
+
+1. Exact match (case-insensitive)
+2. Partial match (inventory name contains the cart name)
+3. Reverse match (cart name contains the inventory name)
+
+Substring lookups run over Aho-Corasick automatons, so matching a cart costs
+no queries and a single scan of the inventory names. The index is rebuilt
+lazily after the dashboard endpoints call invalidate_inventory_index(), and
+after INVENTORY_INDEX_MAX_AGE seconds as a safety net for changes made in
+other worker processes or through the admin.
+"""
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+
+from .models import InventoryItem
+
+# Result of a name lookup; strategy is 'exact', 'partial' or 'reverse'
+InventoryMatch = namedtuple('InventoryMatch', ['id', 'name', 'strategy'])
+
+
+def normalize_name(name):
+    """Lower-case a name and collapse runs of whitespace."""
+    return ' '.join(str(name).lower().split())
+
+
+class _Automaton:
+    """Aho-Corasick automaton reporting which patterns occur in a text."""
+
+    def __init__(self, patterns):
+        # State 0 is the root; each state has goto edges, a failure link and
+        # the indexes of the patterns that end there (after following links)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for index, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = next_state
+            self._out[state].append(index)
+
+        # Breadth-first pass to compute failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def search(self, text):
+        """Return the set of pattern indexes that occur anywhere in text."""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.update(self._out[state])
+        return found
+
+
+class InventoryNameIndex:
+    """Immutable snapshot of inventory names used to resolve cart lines."""
+
+    def __init__(self, rows):
+        """
+        Args:
+            rows: Iterable of (id, name) pairs in id order
+        """
+        self._entries = [(item_id, name, normalize_name(name)) for item_id, name in rows]
+
+        self._exact = {}
+        for position, (_, _, key) in enumerate(self._entries):
+            self._exact.setdefault(key, position)
+
+        self._automaton = _Automaton([key for _, _, key in self._entries])
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls):
+        """Load the index from the database with a single query."""
+        return cls(InventoryItem.objects.order_by('id').values_list('id', 'name'))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _match(self, position, strategy):
+        item_id, name, _ = self._entries[position]
+        return InventoryMatch(item_id, name, strategy)
+
+    def match(self, name):
+        """Resolve a single name; returns an InventoryMatch or None."""
+        return self.match_cart([name]).get(name)
+
+    def match_cart(self, names):
+        """
+        Resolve every cart name to an inventory item.
+
+        When several inventory items qualify, the one with the lowest id wins,
+        which mirrors the order the previous per-line queries returned rows in.
+
+        Args:
+            names: Iterable of item names as they appear in the cart
+
+        Returns:
+            Dictionary mapping each name to an InventoryMatch, or None when
+            no inventory item matches
+        """
+        results = {}
+        pending = {}
+        for name in names:
+            if name in results or name in pending:
+                continue
+            key = normalize_name(name)
+            position = self._exact.get(key)
+            if position is not None:
+                results[name] = self._match(position, 'exact')
+            elif key:
+                pending[name] = key
+            else:
+                results[name] = None
+
+        if not pending:
+            return results
+
+        # Strategy 2: one scan of the inventory names over an automaton built
+        # from the unmatched cart names, keeping the first hit per name
+        cart_names = list(pending)
+        cart_automaton = _Automaton([pending[name] for name in cart_names])
+        partial = {}
+        for position, (_, _, key) in enumerate(self._entries):
+            for hit in cart_automaton.search(key):
+                partial.setdefault(cart_names[hit], position)
+            if len(partial) == len(cart_names):
+                break
+
+        # Strategy 3: scan each remaining cart name over the inventory automaton
+        for name in cart_names:
+            if name in partial:
+                results[name] = self._match(partial[name], 'partial')
+                continue
+            hits = self._automaton.search(pending[name])
+            results[name] = self._match(min(hits), 'reverse') if hits else None
+
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_inventory_index():
+    """Return the process-wide index, rebuilding it when missing or expired."""
+    global _index
+    max_age = getattr(settings, 'INVENTORY_INDEX_MAX_AGE', 300)
+    index = _index
+    if index is None or time.monotonic() - index.built_at > max_age:
+        with _index_lock:
+            index = _index
+            if index is None or time.monotonic() - index.built_at > max_age:
+                index = InventoryNameIndex.build()
+                _index = index
+    return index
+
+
+def invalidate_inventory_index():
+    """Drop the cached index so the next lookup reloads inventory names."""
+    global _index
+    with _index_lock:
+        _index = None
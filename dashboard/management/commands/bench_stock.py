@@ -0,0 +1,128 @@
+import random
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from dashboard.models import InventoryItem
+from dashboard.stock import InsufficientStock, decrement_stock
+
+
+class Command(BaseCommand):
+    help = (
+        'Fire concurrent checkouts at the stock engine and verify no decrement is lost. '
+        'Runs against the configured database; point DATABASE_URL at SQLite or PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent checkout threads')
+        parser.add_argument('--orders', type=int, default=50, help='Orders placed by each thread')
+        parser.add_argument('--items', type=int, default=5, help='Inventory items shared by all orders')
+        parser.add_argument('--stock', type=int, default=1000, help='Starting quantity of each item')
+        parser.add_argument('--reject', action='store_true',
+                            help='Reject short orders instead of partially filling them')
+        parser.add_argument('--naive', action='store_true',
+                            help='Use the old read-modify-write decrement for comparison')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for cart contents')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['orders'] < 1 or options['items'] < 1:
+            raise CommandError('--threads, --orders and --items must be positive')
+
+        prefix = f"bench-stock-{uuid.uuid4().hex[:8]}"
+        item_ids = [
+            InventoryItem.objects.create(
+                name=f"{prefix}-{index}", quantity=options['stock'], category='benchmark'
+            ).id
+            for index in range(options['items'])
+        ]
+
+        filled = {item_id: 0 for item_id in item_ids}
+        counters = {'orders': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        rng = random.Random(options['seed'])
+        carts = [
+            [
+                [(item_id, rng.randint(1, 3)) for item_id in rng.sample(item_ids, rng.randint(1, len(item_ids)))]
+                for _ in range(options['orders'])
+            ]
+            for _ in range(options['threads'])
+        ]
+        start_barrier = threading.Barrier(options['threads'])
+
+        def worker(thread_carts):
+            local_filled = {item_id: 0 for item_id in item_ids}
+            local = {'orders': 0, 'rejected': 0, 'errors': 0}
+            try:
+                start_barrier.wait()
+                for cart in thread_carts:
+                    try:
+                        if options['naive']:
+                            lines = self._naive_decrement(cart)
+                        else:
+                            lines = [(line.item_id, line.filled) for line in
+                                     decrement_stock(cart, partial=not options['reject'])]
+                        for item_id, amount in lines:
+                            local_filled[item_id] += amount
+                        local['orders'] += 1
+                    except InsufficientStock:
+                        local['rejected'] += 1
+                    except Exception as e:
+                        local['errors'] += 1
+                        self.stderr.write(f"Checkout failed: {e}")
+            finally:
+                connection.close()
+                with lock:
+                    for item_id, amount in local_filled.items():
+                        filled[item_id] += amount
+                    for key, value in local.items():
+                        counters[key] += value
+
+        threads = [threading.Thread(target=worker, args=(thread_carts,)) for thread_carts in carts]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        final = dict(InventoryItem.objects.filter(id__in=item_ids).values_list('id', 'quantity'))
+        lost = 0
+        oversold = 0
+        for item_id in item_ids:
+            # Every unit the checkouts believe they took must be gone from stock
+            lost += abs((options['stock'] - final[item_id]) - filled[item_id])
+            if final[item_id] < 0:
+                oversold += -final[item_id]
+
+        InventoryItem.objects.filter(id__in=item_ids).delete()
+
+        attempted = options['threads'] * options['orders']
+        self.stdout.write(f"Database: {connections['default'].vendor}")
+        self.stdout.write(f"Mode: {'naive read-modify-write' if options['naive'] else 'stock engine'}"
+                          f"{' (reject short orders)' if options['reject'] else ''}")
+        self.stdout.write(f"Orders: {counters['orders']} placed, {counters['rejected']} rejected, "
+                          f"{counters['errors']} errors of {attempted}")
+        self.stdout.write(f"Elapsed: {elapsed:.2f}s ({attempted / elapsed:.1f} orders/s)")
+        for item_id in item_ids:
+            self.stdout.write(f"  item {item_id}: start {options['stock']}, filled {filled[item_id]}, "
+                              f"final {final[item_id]}")
+
+        if lost or oversold:
+            self.stdout.write(self.style.ERROR(f"Lost updates: {lost} units, oversold: {oversold} units"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Lost updates: 0, oversold: 0'))
+
+    def _naive_decrement(self, cart):
+        """The pre-engine read-modify-write decrement, kept for comparison."""
+        taken = []
+        for item_id, quantity in cart:
+            item = InventoryItem.objects.get(id=item_id)
+            original = item.quantity
+            item.quantity = max(0, original - quantity)
+            time.sleep(0)  # Yield so the race window is visible under threads
+            item.save()
+            taken.append((item_id, original - item.quantity))
+        return taken
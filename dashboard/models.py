@@ -4,6 +4,8 @@ class InventoryItem(models.Model):
     name = models.CharField(max_length=100)
     quantity = models.IntegerField()
     category = models.CharField(max_length=50)
+    # Bumped on every save; queryset.update() callers set it explicitly
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
\ No newline at end of file
@@ -0,0 +1,162 @@
+"""
+Atomic stock decrements for inventory items.
+
+Orders used to decrement stock read-modify-write (load the row, subtract in
+Python, save), so two concurrent checkouts could both read the same quantity
+and one decrement was lost. decrement_stock() applies a whole cart inside one
+transaction and never lets a quantity drop below zero:
+
+- On backends with SELECT ... FOR UPDATE (PostgreSQL), all rows of the cart
+  are locked in id order with one query and written back with one UPDATE.
+- Elsewhere (SQLite), each line is a conditional UPDATE using F() that only
+  succeeds when enough stock is left, so the database does the arithmetic.
+
+Lines that lack stock are either partially filled or cause the whole cart to
+be rejected, depending on the caller.
+"""
+import logging
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import InventoryItem
+
+logger = logging.getLogger(__name__)
+
+# Outcome for one inventory item; remaining is None if the item no longer exists
+StockLine = namedtuple('StockLine', ['item_id', 'requested', 'filled', 'remaining'])
+
+
+class InsufficientStock(Exception):
+    """Raised when partial fills are not allowed and a line lacks stock."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        short = ', '.join(
+            f"item {line.item_id} ({line.filled}/{line.requested})"
+            for line in lines if line.filled < line.requested
+        )
+        super().__init__(f"Insufficient stock for {short}")
+
+
+def _merge(quantities):
+    """Combine (item_id, quantity) pairs so each item is decremented once."""
+    if hasattr(quantities, 'items'):
+        quantities = quantities.items()
+    wanted = {}
+    for item_id, quantity in quantities:
+        quantity = int(quantity)
+        if quantity > 0:
+            wanted[item_id] = wanted.get(item_id, 0) + quantity
+    return wanted
+
+
+def _decrement_locked(wanted, partial):
+    """Lock every row of the cart, then write all new quantities at once."""
+    available = dict(
+        InventoryItem.objects.select_for_update()
+        .filter(id__in=wanted).order_by('id')
+        .values_list('id', 'quantity')
+    )
+
+    lines = []
+    for item_id in sorted(wanted):
+        requested = wanted[item_id]
+        if item_id not in available:
+            lines.append(StockLine(item_id, requested, 0, None))
+            continue
+        filled = max(0, min(requested, available[item_id]))
+        lines.append(StockLine(item_id, requested, filled, available[item_id] - filled))
+
+    if not partial and any(line.filled < line.requested for line in lines):
+        raise InsufficientStock(lines)
+
+    changed = [line for line in lines if line.filled]
+    if changed:
+        InventoryItem.objects.filter(id__in=[line.item_id for line in changed]).update(
+            quantity=Case(
+                *[When(id=line.item_id, then=Value(line.remaining)) for line in changed],
+                output_field=IntegerField(),
+            ),
+            # update() skips auto_now; polled inventory ETags depend on it
+            updated_at=timezone.now(),
+        )
+    return lines
+
+
+def _decrement_conditional(wanted, partial):
+    """Decrement each line with an UPDATE guarded by the available quantity."""
+    filled = {}
+    for item_id in sorted(wanted):
+        requested = wanted[item_id]
+        updated = InventoryItem.objects.filter(id=item_id, quantity__gte=requested).update(
+            quantity=F('quantity') - requested, updated_at=timezone.now()
+        )
+        if updated:
+            filled[item_id] = requested
+            continue
+        if not partial:
+            filled[item_id] = 0
+            continue
+
+        # Not enough stock: take whatever is left with compare-and-set so a
+        # concurrent decrement between the read and the write is never lost
+        filled[item_id] = 0
+        while True:
+            current = InventoryItem.objects.filter(id=item_id).values_list('quantity', flat=True).first()
+            if current is None or current <= 0:
+                break
+            take = min(requested, current)
+            if InventoryItem.objects.filter(id=item_id, quantity=current).update(
+                quantity=current - take, updated_at=timezone.now()
+            ):
+                filled[item_id] = take
+                break
+
+    remaining = dict(InventoryItem.objects.filter(id__in=wanted).values_list('id', 'quantity'))
+    lines = [
+        StockLine(item_id, wanted[item_id], filled[item_id], remaining.get(item_id))
+        for item_id in sorted(wanted)
+    ]
+    if not partial and any(line.filled < line.requested for line in lines):
+        # Raising inside the atomic block rolls back the lines already applied
+        raise InsufficientStock(lines)
+    return lines
+
+
+def decrement_stock(quantities, partial=True):
+    """
+    Decrement stock for a whole cart in one transaction.
+
+    Args:
+        quantities: Mapping or iterable of (inventory item id, quantity) pairs;
+            repeated ids are combined
+        partial: When True, lines short of stock take whatever is left. When
+            False, any short line raises InsufficientStock and nothing changes.
+
+    Returns:
+        List of StockLine tuples in item id order with the requested and filled
+        quantities and the quantity remaining after this order
+
+    Raises:
+        InsufficientStock: If partial is False and any line lacks stock
+    """
+    wanted = _merge(quantities)
+    if not wanted:
+        return []
+
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            lines = _decrement_locked(wanted, partial)
+        else:
+            lines = _decrement_conditional(wanted, partial)
+
+    for line in lines:
+        if line.filled < line.requested:
+            logger.warning(
+                f"Stock short for inventory item {line.item_id}: "
+                f"filled {line.filled} of {line.requested}"
+            )
+    return lines
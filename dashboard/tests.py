@@ -0,0 +1,143 @@
+import json
+from unittest import mock
+
+from django.db import transaction
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from cafeteria_management_system.query_budget import QueryBudgetMixin
+from dashboard import inventory_index
+from dashboard.inventory_index import InventoryNameIndex, _Automaton, get_inventory_index, invalidate_inventory_index
+from dashboard.models import InventoryItem
+from dashboard.stock import InsufficientStock, StockLine, _decrement_locked, decrement_stock
+
+
+class InventoryNameIndexTests(QueryBudgetMixin, TestCase):
+    """Cart names resolve to inventory items without a query per line."""
+
+    def setUp(self):
+        invalidate_inventory_index()
+        self.addCleanup(invalidate_inventory_index)
+
+    def index(self, *names):
+        return InventoryNameIndex(enumerate(names, start=1))
+
+    def test_automaton_reports_overlapping_patterns(self):
+        automaton = _Automaton(['he', 'she', 'his', 'hers', ''])
+        self.assertEqual(automaton.search('ushers'), {0, 1, 3})
+        self.assertEqual(automaton.search('this'), {2})
+        self.assertEqual(automaton.search('xyz'), set())
+
+    def test_match_strategies(self):
+        index = self.index('Masala Dosa', 'Cold Coffee', 'Tea')
+        matches = index.match_cart(['masala  DOSA', 'Coffee', 'Ginger Tea', 'Pizza', '  '])
+        self.assertEqual(matches['masala  DOSA'], (1, 'Masala Dosa', 'exact'))
+        self.assertEqual(matches['Coffee'], (2, 'Cold Coffee', 'partial'))
+        self.assertEqual(matches['Ginger Tea'], (3, 'Tea', 'reverse'))
+        self.assertIsNone(matches['Pizza'])
+        self.assertIsNone(matches['  '])
+
+    def test_overlapping_names_pick_lowest_id(self):
+        index = self.index('Veg Sandwich Combo', 'Sandwich', 'Veg Sandwich')
+        # An exact match wins over the lower id that contains the name
+        self.assertEqual(index.match('VEG SANDWICH'), (3, 'Veg Sandwich', 'exact'))
+        self.assertEqual(index.match('sandwich').strategy, 'exact')
+        self.assertEqual(index.match('Veg Sand'), (1, 'Veg Sandwich Combo', 'partial'))
+        # Both inventory names occur in the cart name; the lower id wins
+        self.assertEqual(index.match('Big Veg Sandwich Meal'), (2, 'Sandwich', 'reverse'))
+
+    def test_match_cart_costs_no_queries(self):
+        InventoryItem.objects.bulk_create([
+            InventoryItem(name=name, quantity=10, category='menu') for name in ['Samosa', 'Tea']
+        ])
+        index = get_inventory_index()
+        with self.assertMaxQueries(0):
+            matches = index.match_cart(['samosa', 'Masala Tea', 'Samosa'])
+            self.assertIs(get_inventory_index(), index)
+        self.assertEqual(matches['samosa'].name, 'Samosa')
+        self.assertEqual(matches['Masala Tea'].name, 'Tea')
+
+    def test_rebuilt_after_inventory_change(self):
+        self.login_manager()
+        self.assertIsNone(get_inventory_index().match('Samosa'))
+
+        response = self.client.post(reverse('dashboard:add_item'), json.dumps({
+            'name': 'Samosa', 'quantity': 10, 'category': 'menu',
+        }), content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(get_inventory_index().match('samosa').id, response.json()['id'])
+
+        self.client.put(reverse('dashboard:update_item', args=[response.json()['id']]),
+                        json.dumps({'name': 'Aloo Samosa'}), content_type='application/json')
+        self.assertEqual(get_inventory_index().match('aloo samosa').strategy, 'exact')
+
+    @override_settings(INVENTORY_INDEX_MAX_AGE=0)
+    def test_expired_index_is_rebuilt(self):
+        index = get_inventory_index()
+        # Changes made elsewhere (the admin, another process) are picked up
+        InventoryItem.objects.create(name='Tea', quantity=5, category='menu')
+        index.built_at -= 1
+        self.assertIsNot(get_inventory_index(), index)
+        self.assertIsNotNone(inventory_index._index.match('Tea'))
+
+
+class DecrementStockTests(QueryBudgetMixin, TestCase):
+    """Stock decrements never lose an update or drop below zero."""
+
+    def setUp(self):
+        self.samosa, self.tea = InventoryItem.objects.bulk_create([
+            InventoryItem(name='Samosa', quantity=3, category='menu'),
+            InventoryItem(name='Tea', quantity=10, category='menu'),
+        ])
+
+    def quantities(self):
+        return dict(InventoryItem.objects.values_list('id', 'quantity'))
+
+    def test_partial_fill(self):
+        lines = decrement_stock([(self.samosa.id, 2), (self.tea.id, 4), (self.samosa.id, 3), (999, 1)])
+        self.assertEqual(lines, [
+            StockLine(self.samosa.id, 5, 3, 0),
+            StockLine(self.tea.id, 4, 4, 6),
+            StockLine(999, 1, 0, None),
+        ])
+        self.assertEqual(self.quantities(), {self.samosa.id: 0, self.tea.id: 6})
+
+    def test_rejected_cart_rolls_back(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            # Tea is decremented first, then undone when Samosa falls short
+            decrement_stock({self.tea.id: 4, self.samosa.id: 5}, partial=False)
+        self.assertIn(f"item {self.samosa.id} (0/5)", str(raised.exception))
+        self.assertEqual(self.quantities(), {self.samosa.id: 3, self.tea.id: 10})
+
+    def test_ignores_empty_lines(self):
+        with self.assertMaxQueries(0):
+            self.assertEqual(decrement_stock({self.tea.id: 0}), [])
+
+    def test_partial_fill_retries_after_concurrent_decrement(self):
+        real_filter = InventoryItem.objects.filter
+        raced = []
+
+        def racing_filter(*args, **kwargs):
+            if 'quantity' in kwargs and not raced:
+                # Another checkout takes one between the read and the write
+                raced.append(kwargs['quantity'])
+                real_filter(id=self.samosa.id).update(quantity=F('quantity') - 1)
+            return real_filter(*args, **kwargs)
+
+        with mock.patch.object(InventoryItem.objects, 'filter', side_effect=racing_filter):
+            lines = decrement_stock({self.samosa.id: 5})
+        self.assertEqual(raced, [3])
+        self.assertEqual(lines, [StockLine(self.samosa.id, 5, 2, 0)])
+        self.assertEqual(self.quantities()[self.samosa.id], 0)
+
+    def test_locked_path(self):
+        # One locking read and one UPDATE for the whole cart
+        with transaction.atomic(), self.assertMaxQueries(2):
+            lines = _decrement_locked({self.samosa.id: 5, self.tea.id: 4}, partial=True)
+        self.assertEqual(lines, [StockLine(self.samosa.id, 5, 3, 0), StockLine(self.tea.id, 4, 4, 6)])
+        self.assertEqual(self.quantities(), {self.samosa.id: 0, self.tea.id: 6})
+
+        with self.assertRaises(InsufficientStock), transaction.atomic():
+            _decrement_locked({self.tea.id: 7, 999: 1}, partial=False)
+        self.assertEqual(self.quantities(), {self.samosa.id: 0, self.tea.id: 6})
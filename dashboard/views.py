@@ -1,9 +1,11 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from .models import InventoryItem
+from .inventory_index import invalidate_inventory_index
 import json
 from django.views.decorators.csrf import csrf_exempt
 from managers.decorators import manager_required
+from cafeteria_management_system.conditional import conditional_on
 
 @manager_required
 def management(request):
@@ -17,8 +19,13 @@ def get_items(request):
 
 
 # Add this new public endpoint for the shop
+@conditional_on(lambda request: InventoryItem.objects.all())
 def get_public_items(request):
-    """Public endpoint for accessing inventory data (read-only)"""
+    """
+    Public endpoint for accessing inventory data (read-only).
+
+    Answers 304 while the inventory is unchanged since the client's ETag.
+    """
     items = list(InventoryItem.objects.values('id', 'name', 'quantity', 'category'))
     return JsonResponse({'items': items})
 
@@ -35,6 +42,7 @@ def add_item(request):
                 category=data['category'],
                 # Remove product_id and price
             )
+            invalidate_inventory_index()
             return JsonResponse({
                 'success': True,
                 'id': item.id,  # Make sure to include item.id
@@ -53,6 +61,7 @@ def delete_item(request, item_id):
         try:
             item = InventoryItem.objects.get(id=item_id)
             item.delete()
+            invalidate_inventory_index()
             return JsonResponse({'success': True})
         except InventoryItem.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Item not found'})
@@ -64,10 +73,14 @@ def update_item(request, item_id):
         try:
             data = json.loads(request.body)
             item = InventoryItem.objects.get(id=item_id)
+            original_name = item.name
             item.name = data.get('name', item.name)
             item.quantity = data.get('quantity', item.quantity)
             item.category = data.get('category', item.category)
             item.save()
+            # Only renames affect name matching at checkout
+            if item.name != original_name:
+                invalidate_inventory_index()
             return JsonResponse({
                 'success': True,
                 'id': item.id,
@@ -2,8 +2,16 @@ from django.contrib import admin
 from .models import DeliveryInfo
 
 from .models import DeliveryStatus
+from .models import OrderOutbox
 
 admin.site.register(DeliveryInfo)
 
 
-admin.site.register(DeliveryStatus)
\ No newline at end of file
+admin.site.register(DeliveryStatus)
+
+
+@admin.register(OrderOutbox)
+class OrderOutboxAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status']
+    search_fields = ['order_id']
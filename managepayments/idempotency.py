@@ -0,0 +1,170 @@
+"""
+Idempotency keys for order-creating requests.
+
+Browser refreshes and retries of payment_callback, process_upi_payment and
+process_payment used to create the order again, or fail part-way on the
+order_id unique constraint. Views decorated with @idempotent claim a key
+before running; the response is stored against that key and later requests
+with the same key get the stored response back without touching the order
+tables.
+
+Lookups go to a small process-local cache first and fall back to one query
+on the unique key column. Keys expire after IDEMPOTENCY_KEY_TTL seconds
+(24 hours by default); `manage.py clear_idempotency_keys` deletes expired rows.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from managepayments.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# A claim older than this is assumed to belong to a request that died
+CLAIM_TIMEOUT = timedelta(seconds=60)
+FRONT_CACHE_SIZE = 1024
+
+_front_cache = OrderedDict()
+_front_cache_lock = threading.Lock()
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def _cache_get(key):
+    with _front_cache_lock:
+        entry = _front_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= timezone.now():
+            del _front_cache[key]
+            return None
+        _front_cache.move_to_end(key)
+        return entry
+
+
+def _cache_put(key, expires_at, status_code, content_type, body):
+    with _front_cache_lock:
+        _front_cache[key] = (expires_at, status_code, content_type, body)
+        _front_cache.move_to_end(key)
+        while len(_front_cache) > FRONT_CACHE_SIZE:
+            _front_cache.popitem(last=False)
+
+
+def _replay(entry):
+    _, status_code, content_type, body = entry
+    response = HttpResponse(bytes(body), status=status_code, content_type=content_type)
+    response['Idempotent-Replay'] = 'true'
+    return response
+
+
+def _claim(key):
+    """
+    Claim a key for the current request.
+
+    Returns:
+        Tuple of (claimed, stored entry). stored entry is set when a completed
+        response already exists for the key.
+    """
+    now = timezone.now()
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=key, expires_at=now + _ttl())
+            return True, None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(key=key).first()
+        if existing is None:
+            continue
+        if existing.expires_at > now and existing.status_code is not None:
+            return False, (existing.expires_at, existing.status_code, existing.content_type, existing.body)
+        if existing.expires_at > now and existing.created_at > now - CLAIM_TIMEOUT:
+            # Another request holding this key is still running
+            return False, None
+
+        # Expired, or abandoned by a request that never finished: take it over
+        IdempotencyKey.objects.filter(id=existing.id, created_at=existing.created_at).delete()
+    return False, None
+
+
+def skip_idempotent_store(response):
+    """Mark a response (e.g. a failure page) so it is not stored for replay."""
+    response.idempotent_store = False
+    return response
+
+
+def idempotent(key_func):
+    """
+    Decorator that makes a view return the same response for repeated keys.
+
+    Args:
+        key_func: Called with the request; returns the idempotency key string,
+            or None to run the view without idempotency
+
+    Responses are stored unless the view raised, returned a redirect or a 5xx
+    status, or marked the response with skip_idempotent_store(); in those
+    cases the key is released so the request can be retried.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            key = key_func(request)
+            if not key:
+                return view_func(request, *args, **kwargs)
+            key = f"{view_func.__name__}:{key}"[:255]
+
+            cached = _cache_get(key)
+            if cached is not None:
+                return _replay(cached)
+
+            claimed, stored = _claim(key)
+            if stored is not None:
+                _cache_put(key, *stored)
+                return _replay(stored)
+            if not claimed:
+                logger.warning(f"Duplicate request for idempotency key {key} while the first is running")
+                return JsonResponse(
+                    {'status': 'error', 'message': 'This request is already being processed'},
+                    status=409,
+                )
+
+            try:
+                response = view_func(request, *args, **kwargs)
+            except Exception:
+                IdempotencyKey.objects.filter(key=key, status_code__isnull=True).delete()
+                raise
+
+            # Only plain responses are stored: redirects carry their target in
+            # headers and streaming bodies cannot be read twice
+            if response.status_code >= 500 or 300 <= response.status_code < 400 \
+                    or not getattr(response, 'idempotent_store', True) \
+                    or getattr(response, 'streaming', False):
+                IdempotencyKey.objects.filter(key=key, status_code__isnull=True).delete()
+                return response
+
+            content_type = response.get('Content-Type', '')
+            IdempotencyKey.objects.filter(key=key).update(
+                status_code=response.status_code,
+                content_type=content_type,
+                body=response.content,
+            )
+            _cache_put(key, timezone.now() + _ttl(), response.status_code, content_type, response.content)
+            return response
+        return _wrapped_view
+    return decorator
+
+
+def clear_expired_keys():
+    """Delete expired keys; returns the number of rows removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
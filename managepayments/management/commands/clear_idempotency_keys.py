@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from managepayments.idempotency import clear_expired_keys
+
+
+class Command(BaseCommand):
+    help = 'Delete expired idempotency keys for payment and order requests'
+
+    def handle(self, *args, **options):
+        deleted = clear_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
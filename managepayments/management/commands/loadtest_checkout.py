@@ -0,0 +1,334 @@
+import http.cookiejar
+import json
+import math
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from dashboard.models import InventoryItem
+from managepayments.models import IdempotencyKey, OrderOutbox
+from shop.models import Order, ShopUser
+from shop.rollups import rebuild_order_days
+
+METHODS = ('cash', 'upi', 'card')
+STEPS = ('login', 'create_payment', 'payment_page', 'confirm')
+USER_PREFIX = 'loadtest-user-'
+PASSWORD = 'loadtest-password'
+SUCCESS_MARKER = b'Payment Successful'
+
+
+class _ClientSession:
+    """Drives the views in-process with the Django test client."""
+
+    def __init__(self):
+        # localhost is in ALLOWED_HOSTS; the client's default testserver is not
+        self.client = Client(HTTP_HOST='localhost')
+
+    def request(self, method, path, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            if method == 'POST':
+                response = self.client.post(path, data or {})
+            else:
+                response = self.client.get(path, data or {})
+        return response.status_code, response.content, len(queries)
+
+    def close(self):
+        connection.close()
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class _HttpSession:
+    """Drives a running server over HTTP with its own cookie jar."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect()
+        )
+
+    def _csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, method, path, data=None):
+        url = self.base_url + path
+        body = None
+        headers = {'Referer': self.base_url + '/'}
+        if method == 'POST':
+            data = dict(data or {}, csrfmiddlewaretoken=self._csrf_token())
+            body = urllib.parse.urlencode(data).encode()
+            headers['X-CSRFToken'] = self._csrf_token()
+        elif data:
+            url += ('&' if '?' in url else '?') + urllib.parse.urlencode(data)
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request, timeout=30) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as e:
+            # Redirects surface here because they are not followed
+            return e.code, e.read(), None
+
+    def close(self):
+        pass
+
+
+def _percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _local_path(url):
+    """Strip scheme and host from an absolute URL returned by the views."""
+    parts = urllib.parse.urlsplit(url)
+    return parts.path + (f"?{parts.query}" if parts.query else '')
+
+
+class Command(BaseCommand):
+    help = (
+        'Simulate a lunch rush: concurrent users log in and check out with cash, UPI and card, '
+        'reporting throughput, per-step latency percentiles and database queries. Runs the views '
+        'in-process with the test client, or against a running server with --base-url.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to keep placing orders')
+        parser.add_argument('--methods', default=','.join(METHODS),
+                            help='Comma-separated payment methods to cycle through (cash, upi, card)')
+        parser.add_argument('--base-url', default=None,
+                            help='Drive a running server (e.g. http://localhost:8000) instead of the '
+                                 'in-process test client; query counts are not available then')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the orders, accounts and inventory changes of the load test instead '
+                                 'of undoing them')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['duration'] <= 0:
+            raise CommandError('--users and --duration must be positive')
+        methods = [method.strip() for method in options['methods'].split(',') if method.strip()]
+        unknown = set(methods) - set(METHODS)
+        if not methods or unknown:
+            raise CommandError(f"--methods must be chosen from {', '.join(METHODS)}")
+
+        users = self._ensure_users(options['users'])
+        cart = self._cart()
+        cart_data = json.dumps(cart)
+        # The checkouts draw the cart items down; put them back afterwards
+        stock = dict(
+            InventoryItem.objects.filter(name__in=[line['name'] for line in cart]).values_list('pk', 'quantity')
+        )
+
+        latencies = defaultdict(list)
+        query_counts = defaultdict(list)
+        flows = defaultdict(int)
+        failures = defaultdict(int)
+        order_ids = []
+        errors = []
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(len(users))
+        deadline = [None]
+
+        def worker(index, user_name):
+            local_latencies = defaultdict(list)
+            local_queries = defaultdict(list)
+            local_flows = defaultdict(int)
+            local_failures = defaultdict(int)
+            local_orders = []
+            local_errors = []
+            session = _HttpSession(options['base_url']) if options['base_url'] else _ClientSession()
+
+            def step(name, method, path, data=None):
+                started = time.perf_counter()
+                status, content, queries = session.request(method, path, data)
+                local_latencies[name].append((time.perf_counter() - started) * 1000)
+                if queries is not None:
+                    local_queries[name].append(queries)
+                return status, content
+
+            try:
+                start_barrier.wait()
+                iteration = index
+                while time.perf_counter() < deadline[0]:
+                    method = methods[iteration % len(methods)]
+                    iteration += 1
+                    try:
+                        order_id = self._checkout(session, step, user_name, method, cart_data)
+                        local_orders.append(order_id)
+                        local_flows[method] += 1
+                    except Exception as e:
+                        local_failures[method] += 1
+                        local_errors.append(f"{method}: {e}")
+            finally:
+                session.close()
+                with lock:
+                    for name, values in local_latencies.items():
+                        latencies[name].extend(values)
+                    for name, values in local_queries.items():
+                        query_counts[name].extend(values)
+                    for method, count in local_flows.items():
+                        flows[method] += count
+                    for method, count in local_failures.items():
+                        failures[method] += count
+                    order_ids.extend(local_orders)
+                    errors.extend(local_errors)
+
+        threads = [
+            threading.Thread(target=worker, args=(index, user_name))
+            for index, user_name in enumerate(users)
+        ]
+        started = time.perf_counter()
+        deadline[0] = started + options['duration']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self._report(options, elapsed, methods, latencies, query_counts, flows, failures, errors)
+
+        if not options['keep']:
+            self._clean_up(users, order_ids, stock)
+
+    def _clean_up(self, users, order_ids, stock):
+        """
+        Undo the load test: its orders, accounts, idempotency keys and stock.
+
+        Inventory is restored to the quantities read before the run, so sales
+        made by real users of the same items meanwhile are undone as well;
+        run load tests against a copy of the database.
+        """
+        orders = Order.objects.filter(order_id__in=order_ids)
+        span = orders.aggregate(first=Min('date_created'), last=Max('date_created'))
+        OrderOutbox.objects.filter(order_id__in=order_ids).delete()
+        deleted, _ = orders.delete()
+        # Take the deleted orders back out of the daily sales
+        rebuild_order_days(span['first'], span['last'])
+
+        accounts = ShopUser.objects.filter(name__in=users)
+        # Stored responses are keyed "<view>:<student id>:<order id>"
+        account_ids = [str(pk) for pk in accounts.values_list('pk', flat=True)]
+        keys, _ = IdempotencyKey.objects.filter(key__regex=rf"^\w+:({'|'.join(account_ids)}):").delete()
+        accounts.delete()
+
+        for pk, quantity in stock.items():
+            InventoryItem.objects.filter(pk=pk).update(quantity=quantity)
+        self.stdout.write(f"Cleaned up {len(order_ids)} load-test orders ({deleted} rows), {len(users)} users "
+                          f"and {keys} idempotency keys; restored stock of {len(stock)} items")
+
+    def _ensure_users(self, count):
+        """Create (or reuse) one shop account per simulated user."""
+        names = [f"{USER_PREFIX}{index}" for index in range(count)]
+        existing = set(ShopUser.objects.filter(name__in=names).values_list('name', flat=True))
+        missing = [name for name in names if name not in existing]
+        if missing:
+            password = make_password(PASSWORD)
+            ShopUser.objects.bulk_create([
+                ShopUser(name=name, email=f"{name}@loadtest.invalid", phone='0000000000', password=password)
+                for name in missing
+            ])
+        return names
+
+    def _cart(self):
+        """A three-line cart drawn from stocked inventory, like a typical order."""
+        names = list(
+            InventoryItem.objects.filter(quantity__gt=0).order_by('id').values_list('name', flat=True)[:3]
+        )
+        if not names:
+            raise CommandError('No stocked inventory items to order; add some from the dashboard first')
+        return [{'name': name, 'price': 40, 'quantity': 1 + position % 2} for position, name in enumerate(names)]
+
+    def _checkout(self, session, step, user_name, method, cart_data):
+        """Run one checkout; returns the order ID or raises on any failed step."""
+        if isinstance(session, _HttpSession):
+            # Pick up the CSRF cookie the login form sets
+            session.request('GET', '/shop/login/')
+        status, _ = step('login', 'POST', '/shop/login/', {'name': user_name, 'password': PASSWORD})
+        if status != 302:
+            raise RuntimeError(f"login returned {status}")
+
+        data = {
+            'name': user_name,
+            'student_id': user_name,
+            'payment_method': method,
+            'cart_data': cart_data,
+        }
+        status, content = step('create_payment', 'POST', '/managepayments/create-payment/', data)
+        payload = json.loads(content) if status == 200 else {}
+        if payload.get('status') != 'success':
+            raise RuntimeError(f"create_payment returned {status}: {payload.get('message', '')}")
+        order_id = payload['order_id']
+        redirect_path = _local_path(payload['redirect_url'])
+
+        if method == 'cash':
+            # Cash skips the payment page and goes straight to the callback
+            status, content = step('confirm', 'GET', redirect_path)
+        elif method == 'upi':
+            step('payment_page', 'GET', redirect_path)
+            status, content = step('confirm', 'GET', '/managepayments/process-upi-payment/',
+                                   {'order_id': order_id})
+        else:
+            step('payment_page', 'GET', redirect_path)
+            status, content = step('confirm', 'GET', '/managepayments/payment-callback/', {
+                'razorpay_order_id': f"order_{order_id}",
+                'razorpay_payment_id': f"pay_{order_id}",
+                'status': 'success',
+                'order_id': order_id,
+                'payment_method': method,
+            })
+        if status != 200 or SUCCESS_MARKER not in content:
+            raise RuntimeError(f"confirm returned {status} without a success page")
+        return order_id
+
+    def _report(self, options, elapsed, methods, latencies, query_counts, flows, failures, errors):
+        completed = sum(flows.values())
+        requests = sum(len(values) for values in latencies.values())
+
+        self.stdout.write(f"Target: {options['base_url'] or 'in-process test client'} "
+                          f"(database: {connection.vendor})")
+        self.stdout.write(f"Users: {options['users']}, duration {elapsed:.1f}s, methods {', '.join(methods)}")
+        self.stdout.write(f"Checkouts: {completed} completed, {sum(failures.values())} failed "
+                          f"({completed / elapsed:.1f} checkouts/s, {requests / elapsed:.1f} requests/s)")
+        for method in methods:
+            self.stdout.write(f"  {method}: {flows[method]} completed, {failures[method]} failed")
+
+        self.stdout.write('')
+        self.stdout.write(f"{'step':<16}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+                          f"{'max ms':>10}{'queries':>10}")
+        for name in STEPS:
+            values = sorted(latencies.get(name, []))
+            if not values:
+                continue
+            queries = query_counts.get(name)
+            queries_text = f"{sum(queries) / len(queries):.1f}" if queries else 'n/a'
+            self.stdout.write(
+                f"{name:<16}{len(values):>8}{_percentile(values, 0.50):>10.1f}"
+                f"{_percentile(values, 0.95):>10.1f}{_percentile(values, 0.99):>10.1f}"
+                f"{values[-1]:>10.1f}{queries_text:>10}"
+            )
+
+        for error in errors[:5]:
+            self.stderr.write(f"Checkout failed: {error}")
+        if errors:
+            self.stdout.write(self.style.ERROR(f"{len(errors)} checkouts failed"))
+        else:
+            self.stdout.write(self.style.SUCCESS('All checkouts succeeded'))
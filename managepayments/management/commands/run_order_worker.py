@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from managepayments.models import OrderOutbox
+from managepayments.outbox import DEFAULT_MAX_ATTEMPTS, drain_outbox
+
+
+class Command(BaseCommand):
+    help = 'Drain the order outbox: shop mirror writes, delivery records and inventory decrements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Entries processed per batch')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                            help='Failures after which an entry is parked as failed')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Move failed entries back to pending before starting')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = OrderOutbox.objects.filter(status='failed').update(status='pending', attempts=0)
+            self.stdout.write(f"Requeued {requeued} failed entries")
+
+        self.stdout.write(self.style.SUCCESS('Order worker started'))
+        try:
+            while True:
+                close_old_connections()
+                processed, examined = drain_outbox(options['batch_size'], options['max_attempts'])
+                if processed:
+                    self.stdout.write(f"Processed {processed} of {examined} outbox entries")
+
+                # Keep going while there is a backlog, otherwise wait for more
+                if examined < options['batch_size']:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Order worker stopped')
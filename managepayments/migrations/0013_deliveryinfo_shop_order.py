@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_delivery_to_shop_orders(apps, schema_editor):
+    """Point each delivery record at the shop order with the same order_id."""
+    DeliveryInfo = apps.get_model('managepayments', 'DeliveryInfo')
+    ShopOrder = apps.get_model('shop', 'Order')
+
+    deliveries = list(DeliveryInfo.objects.select_related('order'))
+    shop_ids = dict(
+        ShopOrder.objects.filter(order_id__in=[delivery.order.order_id for delivery in deliveries])
+        .values_list('order_id', 'id')
+    )
+
+    orphans = []
+    for delivery in deliveries:
+        delivery.shop_order_id = shop_ids.get(delivery.order.order_id)
+        if delivery.shop_order_id is None:
+            orphans.append(delivery.id)
+    DeliveryInfo.objects.bulk_update(deliveries, ['shop_order'])
+    DeliveryInfo.objects.filter(id__in=orphans).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managepayments', '0012_orderoutbox'),
+        ('shop', '0012_merge_managepayments_orders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryinfo',
+            name='shop_order',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='delivery_info', to='shop.order'),
+        ),
+        migrations.RunPython(link_delivery_to_shop_orders, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='deliveryinfo',
+            name='order',
+        ),
+        migrations.RenameField(
+            model_name='deliveryinfo',
+            old_name='shop_order',
+            new_name='order',
+        ),
+        migrations.AlterField(
+            model_name='deliveryinfo',
+            name='order',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_info', to='shop.order'),
+        ),
+    ]
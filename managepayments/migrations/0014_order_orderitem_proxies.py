@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:24
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('managepayments', '0013_deliveryinfo_shop_order'),
+        ('shop', '0012_merge_managepayments_orders'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='OrderItem',
+        ),
+        migrations.DeleteModel(
+            name='Order',
+        ),
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('shop.orderitem',),
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('shop.order',),
+        ),
+    ]
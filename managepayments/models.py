@@ -1,28 +1,52 @@
 from django.db import models
 
-class Order(models.Model):
-    order_id = models.CharField(max_length=20, unique=True)
-    student_id = models.CharField(max_length=50)
-    date = models.DateTimeField(auto_now_add=True)
-    user_id = models.IntegerField(null=True, blank=True)
-    name = models.CharField(max_length=100, blank=True, null=True)
-    payment_method = models.CharField(max_length=20, blank=True, null=True)
-    
-    def __str__(self):
-        return f"Order {self.order_id} - {self.student_id}"
+from shop.models import Order as ShopOrder
+from shop.models import OrderItem as ShopOrderItem
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    name = models.CharField(max_length=100)
-    price = models.DecimalField(max_digits=10, decimal_places=2)
-    quantity = models.PositiveIntegerField()
-    
-    def __str__(self):
-        return f"{self.quantity} x {self.name}"
+
+class ReadOnlyModelError(Exception):
+    """Raised when saving or deleting through a read-only compatibility proxy."""
+
+
+class Order(ShopOrder):
+    """
+    Read-only compatibility view of the canonical shop order table.
+
+    Orders used to be stored twice, here and in shop. They now live only in
+    shop.Order; this proxy keeps the managepayments name and its `date`
+    attribute working for receipts and older code. Write through
+    managepayments.services.write_order instead.
+    """
+
+    class Meta:
+        proxy = True
+
+    @property
+    def date(self):
+        return self.date_created
+
+    def save(self, *args, **kwargs):
+        raise ReadOnlyModelError("managepayments.Order is read-only; write to shop.Order")
+
+    def delete(self, *args, **kwargs):
+        raise ReadOnlyModelError("managepayments.Order is read-only; delete through shop.Order")
+
+
+class OrderItem(ShopOrderItem):
+    """Read-only compatibility view of the canonical shop order item table."""
+
+    class Meta:
+        proxy = True
+
+    def save(self, *args, **kwargs):
+        raise ReadOnlyModelError("managepayments.OrderItem is read-only; write to shop.OrderItem")
+
+    def delete(self, *args, **kwargs):
+        raise ReadOnlyModelError("managepayments.OrderItem is read-only; delete through shop.OrderItem")
 
 
 class DeliveryInfo(models.Model):
-    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='delivery_info')
+    order = models.OneToOneField(ShopOrder, on_delete=models.CASCADE, related_name='delivery_info')
     floor_number = models.CharField(max_length=10)
     classroom = models.CharField(max_length=100)
     delivery_time = models.CharField(max_length=20)
@@ -61,4 +85,58 @@ class DeliveryStatus(models.Model):
     
     class Meta:
         verbose_name = "Delivery status"
-        verbose_name_plural = "Delivery status"
\ No newline at end of file
+        verbose_name_plural = "Delivery status"
+
+
+class OrderOutbox(models.Model):
+    """
+    Post-order work recorded in the same transaction as the order itself.
+
+    The checkout request commits the order and one outbox row; the side
+    effects (delivery record, inventory decrement) are applied once the
+    order commits, or by the run_order_worker management command, and the
+    row is marked done in the same transaction, so retries never apply
+    them twice.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    order_id = models.CharField(max_length=50, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Outbox {self.order_id} - {self.status}"
+
+    class Meta:
+        verbose_name = "Order outbox entry"
+        verbose_name_plural = "Order outbox"
+        indexes = [
+            models.Index(fields=['status', 'id'], name='outbox_status_id_idx'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored response for a request that must take effect only once.
+
+    A row is claimed (status_code empty) before the view runs and completed
+    with the response afterwards; replays of the same key return the stored
+    response until expires_at. See managepayments.idempotency.
+    """
+    key = models.CharField(max_length=255, unique=True)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    body = models.BinaryField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Idempotency key {self.key}"
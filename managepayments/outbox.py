@@ -0,0 +1,106 @@
+"""
+Outbox processing for post-order side effects.
+
+Each OrderOutbox row describes one committed order. Processing an entry
+claims it with a conditional UPDATE and applies its side effects inside the
+same transaction:
+
+1. Create the classroom delivery record, if any
+2. Decrement inventory for the cart
+
+If any step fails the whole transaction rolls back, the entry returns to
+pending and the error is recorded; a retry starts from a clean slate, so no
+side effect is ever applied twice. The claim also keeps two workers from
+processing the same entry.
+"""
+import logging
+import traceback
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from managepayments.models import DeliveryInfo, OrderOutbox
+from managepayments.services import decrement_inventory_for_cart
+from shop.models import Order
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+
+def _create_delivery_record(payload):
+    """Attach classroom delivery details to the order."""
+    delivery_info = payload.get('delivery_info')
+    if not delivery_info:
+        return None
+    order = Order.objects.get(order_id=payload['order_id'])
+    delivery, _ = DeliveryInfo.objects.get_or_create(
+        order=order,
+        defaults={
+            'floor_number': delivery_info.get('floor_number'),
+            'classroom': delivery_info.get('classroom'),
+            'delivery_time': delivery_info.get('delivery_time'),
+            'delivery_notes': delivery_info.get('delivery_notes', ''),
+        },
+    )
+    return delivery
+
+
+def process_outbox_entry(entry_id, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Apply the side effects for one outbox entry.
+
+    Args:
+        entry_id: Primary key of the OrderOutbox row
+        max_attempts: Failures after which the entry is parked as failed
+
+    Returns:
+        True if the entry was processed by this call, False if it was already
+        claimed elsewhere or failed
+    """
+    try:
+        with transaction.atomic():
+            # Claiming is the first write in the transaction, so a concurrent
+            # worker blocks here and then sees the entry is no longer pending
+            claimed = OrderOutbox.objects.filter(id=entry_id, status='pending').update(
+                status='done', processed_at=timezone.now(), attempts=F('attempts') + 1
+            )
+            if not claimed:
+                return False
+
+            payload = OrderOutbox.objects.values_list('payload', flat=True).get(id=entry_id)
+            _create_delivery_record(payload)
+            decrement_inventory_for_cart(payload['items'])
+
+        logger.info(f"Processed outbox entry {entry_id} for order {payload['order_id']}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Error processing outbox entry {entry_id}: {str(e)}\n{traceback.format_exc()}")
+        # The claim was rolled back with everything else; record the attempt
+        OrderOutbox.objects.filter(id=entry_id, status='pending').update(
+            attempts=F('attempts') + 1, last_error=str(e)
+        )
+        OrderOutbox.objects.filter(id=entry_id, status='pending', attempts__gte=max_attempts).update(
+            status='failed'
+        )
+        return False
+
+
+def drain_outbox(batch_size=50, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Process one batch of pending outbox entries, oldest first.
+
+    Args:
+        batch_size: Maximum number of entries to process
+        max_attempts: Failures after which an entry is parked as failed
+
+    Returns:
+        Tuple of (entries processed, entries examined)
+    """
+    entry_ids = list(
+        OrderOutbox.objects.filter(status='pending').order_by('id').values_list('id', flat=True)[:batch_size]
+    )
+    processed = sum(1 for entry_id in entry_ids if process_outbox_entry(entry_id, max_attempts))
+    return processed, len(entry_ids)
@@ -1,15 +1,18 @@
 from rest_framework import serializers
-from django.utils import timezone
 # Import the Order model from the correct app
 from managepayments.models import Order
+from shop.models import ShopUser
 
 class OrderSerializer(serializers.ModelSerializer):
+    # Orders are stored in shop.Order, which names this field date_created
+    date = serializers.DateTimeField(source='date_created', read_only=True)
+    # Orders link to their student by foreign key; the API keeps the id
+    user_id = serializers.PrimaryKeyRelatedField(
+        source='user', queryset=ShopUser.objects.all(), required=False, allow_null=True
+    )
+
     class Meta:
         model = Order
         fields = ['id', 'order_id', 'student_id', 'date', 'user_id']
-        
-    def create(self, validated_data):
-        # Make sure the order has a date if not provided
-        if 'date' not in validated_data:
-            validated_data['date'] = timezone.now()
-        return super().create(validated_data)
\ No newline at end of file
+        # Allocated on the server when the client does not send one
+        extra_kwargs = {'order_id': {'required': False}}
\ No newline at end of file
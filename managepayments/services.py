@@ -0,0 +1,139 @@
+"""
+Order-writing services shared by every checkout path.
+
+The checkout views (process_payment, payment_callback, process_upi_payment and
+the save_order API) all persist the same shape of data. write_order commits
+the canonical shop order, its items and an outbox entry in one transaction;
+everything else that follows an order (the delivery record and the inventory
+decrement) is applied from the outbox by managepayments.outbox, right after
+the order commits or, with ORDER_OUTBOX_INLINE off, in the run_order_worker
+command.
+"""
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from managepayments.models import OrderOutbox
+from shop.models import Order, OrderItem, ShopUser
+from shop.rollups import record_order
+from shop.totals import totals_for_lines
+from shop.order_events import notify_order_change
+from shop.user_cache import bump_order_owner
+
+logger = logging.getLogger(__name__)
+
+
+def _cart_line(item):
+    """Normalise a cart entry into the (name, price, quantity) stored on items."""
+    return item['name'], Decimal(str(item['price'])), int(item['quantity'])
+
+
+def write_order(order_id, student_id, name, payment_method, cart_items,
+                user_id=None, status=None, delivery_info=None):
+    """
+    Write an order, its items and its outbox entry in one transaction.
+
+    The order row, one bulk_create for the items and the outbox row cost three
+    INSERTs for a cart of any size. The order's total_amount and item_count
+    are computed from the cart and stored with it, and the order is added to
+    the daily sales rollups. Nothing is written if any step fails. The
+    student's cached history is invalidated afterwards.
+
+    Args:
+        order_id: Public order identifier (unique)
+        student_id: Student ID entered at checkout
+        name: Customer name
+        payment_method: Payment method code (cash, upi, card, classroom_delivery, ...)
+        cart_items: List of dictionaries with name, price and quantity
+        user_id: Logged-in ShopUser id; when omitted the order is linked to
+            the student whose account name matches name or student_id
+        status: Initial order status; the model default is used when omitted
+        delivery_info: Optional dictionary of classroom delivery details
+
+    Returns:
+        The shop Order
+    """
+    lines = [_cart_line(item) for item in cart_items]
+    if user_id is None:
+        user_id = ShopUser.id_for_name(name) or ShopUser.id_for_name(student_id)
+    total_amount, item_count = totals_for_lines((price, quantity) for _, price, quantity in lines)
+
+    order_fields = {
+        'order_id': order_id,
+        'student_id': student_id,
+        'user_id': user_id,
+        'name': name,
+        'payment_method': payment_method,
+        'total_amount': total_amount,
+        'item_count': item_count,
+    }
+    if status:
+        order_fields['status'] = status
+
+    with transaction.atomic():
+        order = Order.objects.create(**order_fields)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, name=item_name, price=price, quantity=quantity)
+            for item_name, price, quantity in lines
+        ])
+        record_order(order, lines, delivery=bool(delivery_info))
+
+        # Everything the worker needs, so it never has to re-read the cart
+        entry = OrderOutbox.objects.create(
+            order_id=order_id,
+            payload={
+                'order_id': order_id,
+                'student_id': student_id,
+                'items': [
+                    {'name': item_name, 'price': str(price), 'quantity': quantity}
+                    for item_name, price, quantity in lines
+                ],
+                'delivery_info': delivery_info or None,
+            },
+        )
+
+        if getattr(settings, 'ORDER_OUTBOX_INLINE', True):
+            from managepayments.outbox import process_outbox_entry
+            transaction.on_commit(lambda: process_outbox_entry(entry.id))
+
+    bump_order_owner(user_id, name or student_id)
+    notify_order_change()
+    logger.info(f"Saved order {order_id} with {len(lines)} items")
+    return order
+
+
+def decrement_inventory_for_cart(cart_items):
+    """
+    Decrement inventory for every cart line in one atomic batch.
+
+    Cart names are resolved against the in-memory inventory name index, then
+    all matched lines go through the stock engine. Short lines are partially
+    filled so quantities never go below zero. Errors propagate to the caller.
+
+    Args:
+        cart_items: List of dictionaries containing item details (name, quantity)
+
+    Returns:
+        List of dashboard.stock.StockLine results
+    """
+    from dashboard.inventory_index import get_inventory_index
+    from dashboard.stock import decrement_stock
+
+    # Resolve the whole cart in one pass against the name index
+    matches = get_inventory_index().match_cart(item['name'] for item in cart_items)
+
+    quantities = []
+    for item in cart_items:
+        match = matches.get(item['name'])
+        if match:
+            logger.info(f"Found {match.strategy} match for '{item['name']}': {match.name}")
+            quantities.append((match.id, int(item['quantity'])))
+        else:
+            logger.warning(f"No inventory item found for '{item['name']}'")
+
+    lines = decrement_stock(quantities, partial=True)
+    for line in lines:
+        logger.info(f"Updated inventory item {line.item_id}: -{line.filled}, {line.remaining} remaining")
+    return lines
@@ -1,3 +1,435 @@
-from django.test import TestCase
+import itertools
+import json
+import re
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.http import HttpResponseRedirect, JsonResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from cafeteria_management_system.query_budget import MENU, QueryBudgetMixin
+from dashboard.models import InventoryItem
+from managepayments import idempotency
+from managepayments.idempotency import idempotent, skip_idempotent_store
+from managepayments.models import (
+    DeliveryInfo, IdempotencyKey, Order, OrderItem, OrderOutbox, ReadOnlyModelError,
+)
+from managepayments.outbox import drain_outbox, process_outbox_entry
+from managepayments.services import write_order
+from managepayments.views import _process_payment_key, _session_order_key
+from shop.models import ShopUser
+
+
+class CheckoutQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Checkout paths must cost the same number of queries for any cart size."""
+
+    def setUp(self):
+        self.user = self.create_shop_user()
+        self.login_shop_user(self.user)
+        self.seed_orders(5, user=self.user)
+        self.cart = [{'name': MENU[0][0], 'price': float(MENU[0][1]), 'quantity': 1}]
+        self.submissions = itertools.count()
+        self.reset_process_state()
+
+    def grow_cart(self):
+        self.cart = [
+            {'name': name, 'price': float(price), 'quantity': 2}
+            for name, price in MENU * 4
+        ]
+
+    def create_payment(self, payment_method):
+        response = self.client.post(reverse('managepayments:create_payment'), {
+            'name': self.user.name,
+            'student_id': self.user.name,
+            'payment_method': payment_method,
+            'cart_data': json.dumps(self.cart),
+            'floor_number': '2',
+            'classroom': 'B204',
+            'delivery_time': '12:30',
+        })
+        return response.json()
+
+    def test_checkout_page(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('managepayments:checkout')))
+
+    def test_cash_checkout(self):
+        def checkout():
+            payment = self.create_payment('cash')
+            response = self.client.get(payment['redirect_url'])
+            self.assertContains(response, 'Payment Successful')
+        self.assertQueryBudget(21, checkout, grow=self.grow_cart)
+
+    def test_card_checkout(self):
+        def checkout():
+            payment = self.create_payment('card')
+            self.client.get(payment['redirect_url'])
+            response = self.client.get(reverse('managepayments:payment_callback'), {
+                'status': 'success',
+                'order_id': payment['order_id'],
+                'razorpay_order_id': 'order_test',
+                'razorpay_payment_id': f"pay_{payment['order_id']}",
+            })
+            self.assertContains(response, 'Payment Successful')
+        self.assertQueryBudget(22, checkout, grow=self.grow_cart)
+
+    def test_classroom_delivery_checkout(self):
+        def checkout():
+            payment = self.create_payment('classroom_delivery')
+            response = self.client.get(reverse('managepayments:payment_callback'), {
+                'status': 'success',
+                'order_id': payment['order_id'],
+                'razorpay_order_id': 'order_test',
+                'razorpay_payment_id': f"pay_{payment['order_id']}",
+            })
+            self.assertContains(response, 'Payment Successful')
+        self.assertQueryBudget(21, checkout, grow=self.grow_cart)
+
+    def test_upi_checkout(self):
+        def checkout():
+            payment = self.create_payment('upi')
+            self.client.get(payment['redirect_url'])
+            response = self.client.get(reverse('managepayments:process_upi_payment'),
+                                       {'order_id': payment['order_id']})
+            self.assertContains(response, 'Payment Successful')
+        self.assertQueryBudget(22, checkout, grow=self.grow_cart)
+
+    def test_callback_replay(self):
+        payment = self.create_payment('cash')
+        self.client.get(payment['redirect_url'])
+        # A refreshed callback is answered from the idempotency store
+        response = self.assertQueryBudget(1, lambda: self.client.get(payment['redirect_url']))
+        self.assertEqual(response['Idempotent-Replay'], 'true')
+
+    def test_process_payment(self):
+        def submit():
+            response = self.client.post(reverse('managepayments:process_payment'), {
+                'name': self.user.name,
+                'student_id': self.user.name,
+                'payment_method': 'cash',
+                'order_id': f"submission-{next(self.submissions)}",
+                'cart_data': json.dumps(self.cart),
+            })
+            self.assertEqual(response.json()['status'], 'success')
+        self.assertQueryBudget(14, submit, grow=self.grow_cart)
+
+
+class OrderOutboxTests(QueryBudgetMixin, TestCase):
+    """Post-order side effects are applied once, after the order commits."""
+
+    def setUp(self):
+        self.reset_process_state()
+        self.seed_inventory()
+        self.cart = [{'name': MENU[0][0], 'price': float(MENU[0][1]), 'quantity': 2}]
+        self.delivery = {'floor_number': '2', 'classroom': 'B204', 'delivery_time': '12:30'}
+
+    def write_queued_order(self, order_id='CMS-100001'):
+        # The inline dispatch is dropped, leaving the entry for the worker
+        with self.captureOnCommitCallbacks(execute=False):
+            write_order(order_id, 'asha', 'asha', 'classroom_delivery', self.cart, delivery_info=self.delivery)
+        return OrderOutbox.objects.get(order_id=order_id)
+
+    def stock(self):
+        return InventoryItem.objects.get(name=MENU[0][0]).quantity
+
+    def test_classroom_checkout_applies_side_effects(self):
+        user = self.create_shop_user()
+        self.login_shop_user(user)
+        payment = self.client.post(reverse('managepayments:create_payment'), {
+            'name': user.name,
+            'student_id': user.name,
+            'payment_method': 'classroom_delivery',
+            'cart_data': json.dumps(self.cart),
+            **self.delivery,
+        }).json()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('managepayments:payment_callback'), {
+                'status': 'success',
+                'order_id': payment['order_id'],
+                'razorpay_order_id': 'order_test',
+                'razorpay_payment_id': f"pay_{payment['order_id']}",
+            })
+        self.assertContains(response, 'Payment Successful')
+
+        delivery = DeliveryInfo.objects.get(order__order_id=payment['order_id'])
+        self.assertEqual((delivery.floor_number, delivery.classroom), ('2', 'B204'))
+        self.assertEqual(self.stock(), 998)
+        self.assertEqual(OrderOutbox.objects.get(order_id=payment['order_id']).status, 'done')
+
+    @override_settings(ORDER_OUTBOX_INLINE=False)
+    def test_worker_mode_leaves_entry_pending(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            write_order('CMS-100001', 'asha', 'asha', 'cash', self.cart)
+        self.assertEqual(OrderOutbox.objects.get().status, 'pending')
+        self.assertEqual(self.stock(), 1000)
+        self.assertEqual(drain_outbox(), (1, 1))
+        self.assertEqual(self.stock(), 998)
+
+    def test_entry_is_claimed_once(self):
+        entry = self.write_queued_order()
+        self.assertTrue(process_outbox_entry(entry.id))
+        self.assertFalse(process_outbox_entry(entry.id))
+
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ('done', 1))
+        self.assertEqual(DeliveryInfo.objects.filter(order__order_id=entry.order_id).count(), 1)
+        self.assertEqual(self.stock(), 998)
+
+    def test_failures_retry_then_park(self):
+        entry = self.write_queued_order()
+        with mock.patch('managepayments.outbox.decrement_inventory_for_cart',
+                        side_effect=RuntimeError('inventory unavailable')):
+            self.assertFalse(process_outbox_entry(entry.id, max_attempts=2))
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts, entry.last_error),
+                             ('pending', 1, 'inventory unavailable'))
+            # The delivery record created before the failure was rolled back
+            self.assertFalse(DeliveryInfo.objects.exists())
+
+            self.assertFalse(process_outbox_entry(entry.id, max_attempts=2))
+            entry.refresh_from_db()
+            self.assertEqual((entry.status, entry.attempts), ('failed', 2))
+
+        self.assertFalse(process_outbox_entry(entry.id))
+        self.assertEqual(self.stock(), 1000)
+
+
+class OrderHistoryQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Order history and receipts must not query once per order or item."""
+
+    def setUp(self):
+        self.user = self.create_shop_user()
+        self.login_shop_user(self.user)
+        self.orders = self.seed_orders(5, user=self.user)
+
+    def grow_user_orders(self):
+        self.seed_orders(20, user=self.user)
+
+    def get_history(self, **params):
+        """Fetch a history page and read the whole stream inside the call."""
+        response = self.client.get(reverse('managepayments:get_order_history'), params)
+        if response.streaming:
+            return response.status_code, json.loads(b''.join(response.streaming_content))
+        return response.status_code, response.json()
+
+    def test_order_history_api(self):
+        status_code, data = self.assertQueryBudget(3, self.get_history, grow=self.grow_user_orders)
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(data['orders']), 25)
+        self.assertIsNone(data['next_cursor'])
+        self.assertEqual(len(data['orders'][0]['items']), 3)
+
+    def test_order_history_api_deleted_user(self):
+        self.get_history()
+        # The identity is still in the session, but the account is gone
+        self.user.delete()
+        self.assertEqual(self.get_history()[0], 401)
+
+    def test_order_history_api_pages(self):
+        self.grow_user_orders()
+        seen = []
+        cursor = None
+        while True:
+            with self.assertMaxQueries(3):
+                params = {'limit': 10, 'cursor': cursor} if cursor else {'limit': 10}
+                status_code, data = self.get_history(**params)
+            self.assertEqual(status_code, 200)
+            seen.extend(order['orderId'] for order in data['orders'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_order_history_api_requires_login(self):
+        self.seed_orders(3)
+        self.client.session.flush()
+        self.client.cookies.clear()
+        self.assertEqual(self.get_history()[0], 401)
+        self.assertEqual(self.get_history(scope='all')[0], 403)
+
+    def test_order_history_api_admin_scope(self):
+        self.seed_orders(12)
+        self.login_manager()
+        status_code, data = self.assertQueryBudget(4, lambda: self.get_history(scope='all', limit=10))
+        self.assertEqual(status_code, 200)
+        self.assertEqual(len(data['orders']), 10)
+        self.assertIsNotNone(data['next_cursor'])
+
+    def test_download_receipt(self):
+        order_id = self.orders[0].order_id
+        # The session read identifies the student owning the order
+        response = self.assertQueryBudget(
+            3, lambda: self.client.get(reverse('managepayments:download_receipt'), {'order_id': order_id})
+        )
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_download_receipt_of_another_student(self):
+        url = reverse('managepayments:download_receipt')
+        other = self.seed_orders(1, user=self.create_shop_user('ravi'))[0].order_id
+        self.assertRedirects(self.client.get(url, {'order_id': other}), reverse('shop:shop_login'),
+                             fetch_redirect_response=False)
+
+        self.client.logout()
+        self.assertRedirects(self.client.get(url, {'order_id': other}), reverse('shop:shop_login'),
+                             fetch_redirect_response=False)
+
+        self.login_manager()
+        self.assertEqual(self.client.get(url, {'order_id': other})['Content-Type'], 'application/pdf')
+
+
+class OrderProxyTests(QueryBudgetMixin, TestCase):
+    """The managepayments order models only read the shop tables."""
+
+    def test_proxies_are_read_only(self):
+        self.seed_orders(1)
+        order = Order.objects.get()
+        item = OrderItem.objects.filter(order_id=order.pk).first()
+        for write in [order.save, order.delete, item.save, item.delete]:
+            with self.assertRaises(ReadOnlyModelError):
+                write()
+        self.assertEqual(order.date, order.date_created)
+
+
+class IdempotencyTests(QueryBudgetMixin, TestCase):
+    """Repeated keys are answered once; failures and expiry release them."""
+
+    def setUp(self):
+        self.reset_process_state()
+        self.calls = 0
+
+    def view(self, response=None, error=None):
+        @idempotent(lambda request: request.GET.get('key'))
+        def submit(request):
+            self.calls += 1
+            if error:
+                raise error
+            return response or JsonResponse({'call': self.calls})
+        return submit
+
+    def request(self, key='k1'):
+        return RequestFactory().get('/', {'key': key})
+
+    def request_with_session(self, shop_user_id=None, save=True):
+        request = RequestFactory().post('/', {'order_id': 'CMS-1'})
+        request.session = SessionStore()
+        request.shop_user = ShopUser(id=shop_user_id) if shop_user_id else None
+        if save:
+            request.session.save()
+        return request
+
+    def test_order_key_is_scoped_to_the_caller(self):
+        self.assertEqual(_session_order_key(self.request_with_session(7), 'CMS-1'), '7:CMS-1')
+        first, second = self.request_with_session(), self.request_with_session()
+        self.assertNotEqual(_session_order_key(first, 'CMS-1'), _session_order_key(second, 'CMS-1'))
+        self.assertTrue(_session_order_key(first, 'CMS-1').startswith('session:'))
+        # No user and no session: nothing to scope the key to
+        self.assertIsNone(_session_order_key(self.request_with_session(save=False), 'CMS-1'))
+        self.assertIsNone(_process_payment_key(self.request_with_session(save=False)))
+
+    def test_replay(self):
+        view = self.view()
+        self.assertEqual(view(self.request()).content, b'{"call": 1}')
+        response = view(self.request())
+        self.assertEqual((response.content, response['Idempotent-Replay']), (b'{"call": 1}', 'true'))
+        # A process with a cold cache replays from the stored row
+        self.reset_process_state()
+        self.assertEqual(view(self.request()).content, b'{"call": 1}')
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_key_runs_again(self):
+        view = self.view()
+        view(self.request())
+        later = timezone.now() + idempotency._ttl() + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(view(self.request()).content, b'{"call": 2}')
+        self.assertEqual(IdempotencyKey.objects.get().expires_at, later + idempotency._ttl())
+
+    def test_in_flight_claim(self):
+        IdempotencyKey.objects.create(key='submit:k1', expires_at=timezone.now() + idempotency._ttl())
+        response = self.view()(self.request())
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.calls, 0)
+
+        # A claim held past CLAIM_TIMEOUT belongs to a request that died
+        later = timezone.now() + idempotency.CLAIM_TIMEOUT + timedelta(seconds=1)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            self.assertEqual(self.view()(self.request()).status_code, 200)
+        self.assertEqual(self.calls, 1)
+
+    def test_error_releases_key(self):
+        failures = [
+            self.view(response=JsonResponse({}, status=500)),
+            self.view(response=skip_idempotent_store(JsonResponse({'status': 'error'}))),
+            self.view(response=HttpResponseRedirect('/')),
+        ]
+        for view in failures:
+            view(self.request())
+            self.assertFalse(IdempotencyKey.objects.exists())
+        with self.assertRaises(ValueError):
+            self.view(error=ValueError('payment gateway down'))(self.request())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        # The retry is not answered with the failure
+        self.assertEqual(self.view()(self.request()).status_code, 200)
+        self.assertEqual(self.calls, 5)
+
+
+class LoadtestCheckoutTests(QueryBudgetMixin, TransactionTestCase):
+    """loadtest_checkout places orders and then undoes everything it changed."""
+
+    def test_run_and_clean_up(self):
+        self.seed_inventory()
+        stock = dict(InventoryItem.objects.values_list('name', 'quantity'))
+
+        output = StringIO()
+        # One user, so SQLite never sees two writers at once
+        call_command('loadtest_checkout', '--users', '1', '--duration', '0.5',
+                     stdout=output, stderr=StringIO())
+        self.assertIn('All checkouts succeeded', output.getvalue())
+        completed = int(re.search(r'Checkouts: (\d+) completed', output.getvalue()).group(1))
+        self.assertGreater(completed, 0)
+
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(ShopUser.objects.exists())
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(dict(InventoryItem.objects.values_list('name', 'quantity')), stock)
+
+
+class DeliveryShopOrderMigrationTests(TransactionTestCase):
+    """Migration 0013 moves deliveries to shop orders and drops orphans."""
+
+    before = [('managepayments', '0012_orderoutbox'), ('shop', '0012_merge_managepayments_orders')]
+    after = [('managepayments', '0013_deliveryinfo_shop_order')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_links_deliveries_and_deletes_orphans(self):
+        apps = self.migrate(self.before)
+        OldOrder = apps.get_model('managepayments', 'Order')
+        OldDelivery = apps.get_model('managepayments', 'DeliveryInfo')
+        ShopOrder = apps.get_model('shop', 'Order')
+
+        shop_order = ShopOrder.objects.create(order_id='CMS-000001', student_id='asha')
+        for order_id in ['CMS-000001', 'CMS-000002']:
+            OldDelivery.objects.create(
+                order=OldOrder.objects.create(order_id=order_id, student_id='asha'),
+                floor_number='1', classroom='A101', delivery_time='12:30',
+            )
+
+        apps = self.migrate(self.after)
+        deliveries = apps.get_model('managepayments', 'DeliveryInfo').objects.all()
+        self.assertEqual(list(deliveries.values_list('order_id', flat=True)), [shop_order.id])
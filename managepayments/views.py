@@ -1,9 +1,11 @@
 from django.shortcuts import render, redirect
-from django.http import JsonResponse, HttpRequest
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, HttpRequest, StreamingHttpResponse
+import itertools
 import json
 import logging
 import traceback
-from django.utils import timezone
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
@@ -13,9 +15,14 @@ from shop.models import OrderItem as ShopOrderItem
 
 # Resolve import conflicts by using aliases for functions with the same name
 from shop.views import save_order as shop_save_order
-# Import models from current app for dual-database architecture
+# Read-only compatibility views over the canonical shop order tables
 from managepayments.models import Order, OrderItem
 from managepayments.serializers import OrderSerializer
+from managepayments.services import write_order
+from managepayments.idempotency import idempotent, skip_idempotent_store
+from shop.order_ids import allocate_order_id
+from shop.pagination import InvalidCursor, encode_cursor, keyset_queryset, page_size
+from shop.user_cache import user_cache_key
 
 # Add these imports at the top
 import io
@@ -47,105 +54,47 @@ def checkout_view(request):
     Passes the current user's name to the template.
     """
     # Check if user is logged in, redirect to login if not
-    if not request.session.get('shop_user_id'):
+    if not request.shop_user:
         return redirect('shop:shop_login')
     
-    # Get current user's name to display in checkout page
-    user_id = request.session.get('shop_user_id')
-    try:
-        from shop.models import ShopUser
-        shop_user = ShopUser.objects.get(id=user_id)
-        user_name = shop_user.name
-    except Exception as e:
-        # Log error but continue with empty name rather than failing
-        logger.error(f"Error getting user name: {str(e)}")
-        user_name = ""
-    
-    # Render checkout template with user name context
-    return render(request, 'managepayments/checkout.html', {'user_name': user_name})
+    # Render checkout template with the current user's name; it comes from
+    # the session, so the page needs no user query
+    return render(request, 'managepayments/checkout.html', {'user_name': request.shop_user.name})
 
-def update_inventory_after_order(cart_items):
+def _session_order_key(request, order_id):
     """
-    Update inventory quantities after an order is placed.
-    Uses multiple matching strategies to find inventory items by name:
-    1. Exact match (case-insensitive)
-    2. Partial match (item name contains search term)
-    3. Reverse match (search term contains item name)
-    
-    Args:
-        cart_items: List of dictionaries containing item details (name, quantity)
-    
-    Returns:
-        Boolean indicating success or failure of inventory update
+    Idempotency key for an order, scoped to the caller.
+
+    Logged-in students are keyed by their account and anyone else by their
+    session, so a client is never answered with another client's stored
+    response. Without either there is nothing to scope the key to, and the
+    request runs without idempotency.
     """
-    try:
-        from dashboard.models import InventoryItem
-        
-        # Log all available inventory items for debugging purposes
-        all_items = InventoryItem.objects.all()
-        logger.info(f"Available inventory items: {', '.join(item.name for item in all_items)}")
-        
-        for item in cart_items:
-            name = item['name']
-            quantity = int(item['quantity'])
-            
-            logger.info(f"Updating inventory for '{name}', quantity: {quantity}")
-            
-            # Strategy 1: Find inventory item by exact name (case-insensitive)
-            inventory_items = InventoryItem.objects.filter(name__iexact=name)
-            
-            if inventory_items.exists():
-                logger.info(f"Found exact match for '{name}'")
-            else:
-                logger.info(f"No exact match for '{name}', trying partial match")
-                
-            # Strategy 2: If no direct match, try partial match (item contains search name)
-            if not inventory_items.exists():
-                inventory_items = InventoryItem.objects.filter(name__icontains=name)
-                
-                if inventory_items.exists():
-                    logger.info(f"Found partial match for '{name}': {inventory_items.first().name}")
-                else:
-                    logger.info(f"No partial match for '{name}', trying reverse match")
-            
-            # Strategy 3: Try reverse match (search name contains item name)
-            if not inventory_items.exists():
-                found = False
-                for inv_item in InventoryItem.objects.all():
-                    if inv_item.name.lower() in name.lower():
-                        inventory_item = inv_item
-                        found = True
-                        logger.info(f"Found reverse match for '{name}': {inv_item.name}")
-                        break
-                else:
-                    found = False
-            else:
-                inventory_item = inventory_items.first()
-                found = True
-            
-            # Update inventory quantity if a matching item was found
-            if found:
-                original_quantity = inventory_item.quantity
-                # Ensure quantity never goes below zero
-                inventory_item.quantity = max(0, original_quantity - quantity)
-                inventory_item.save()
-                logger.info(f"Updated inventory for '{inventory_item.name}': {original_quantity} → {inventory_item.quantity}")
-            else:
-                logger.warning(f"No inventory item found for '{name}'")
-                
-        return True
-    except Exception as e:
-        # Log error but don't crash the order process
-        logger.error(f"Error updating inventory: {str(e)}")
-        return False
+    if not order_id:
+        return None
+    if request.shop_user:
+        return f"{request.shop_user.id}:{order_id}"
+    if request.session.session_key:
+        return f"session:{request.session.session_key}:{order_id}"
+    return None
+
+
+def _process_payment_key(request):
+    if request.method != 'POST':
+        return None
+    return _session_order_key(request, request.POST.get('order_id'))
+
 
+@idempotent(_process_payment_key)
 def process_payment(request):
     """
-    Process payment submission and save order to both databases.
+    Process payment submission and save the order.
     
     Handles form submission containing order details and payment information.
-    Creates records in both managepayments and shop databases for consistency.
-    Updates inventory quantities after successful order processing.
+    Commits the order with an outbox entry; the order worker then updates
+    inventory quantities. The order ID is allocated on the server; the
+    order_id posted by the browser only identifies the submission, so
+    resubmitting it returns the first response instead of a second order.
     
     Returns JSON response indicating success or failure.
     """
@@ -160,107 +109,67 @@ def process_payment(request):
             
             # Validate all required fields are present
             if not all([name, student_id, payment_method, order_id, cart_data]):
-                return JsonResponse({'status': 'error', 'message': 'Missing required data'})
+                return skip_idempotent_store(JsonResponse({'status': 'error', 'message': 'Missing required data'}))
             
             # Parse JSON cart data into Python structure
             cart_items = json.loads(cart_data)
             
-            # Get user ID from session for verification and association
-            user_id = request.session.get('shop_user_id')
-            
             # Security check: verify submitted name matches logged-in user's name
             # This prevents placing orders on behalf of another person
-            try:
-                from shop.models import ShopUser
-                shop_user = ShopUser.objects.get(id=user_id)
-                if shop_user.name != name:
-                    logger.error(f"Name mismatch: submitted '{name}' but logged in as '{shop_user.name}'")
-                    return JsonResponse({
-                        'status': 'error', 
-                        'message': 'You can only place orders with your own account name.'
-                    })
-            except Exception as e:
-                logger.error(f"Error verifying user name: {str(e)}")
-                return JsonResponse({'status': 'error', 'message': 'User authentication error'})
+            shop_user = request.shop_user
+            if not shop_user:
+                logger.error("Order submitted without a logged-in user")
+                return skip_idempotent_store(JsonResponse({'status': 'error', 'message': 'User authentication error'}))
+            if shop_user.name != name:
+                logger.error(f"Name mismatch: submitted '{name}' but logged in as '{shop_user.name}'")
+                return skip_idempotent_store(JsonResponse({
+                    'status': 'error', 
+                    'message': 'You can only place orders with your own account name.'
+                }))
+            user_id = shop_user.id
             
-            # Save order to both databases for data consistency
+            # Save the order; side effects are queued in the order outbox
             try:
-                # Create order in managepayments app database
-                logger.info(f"Creating order in managepayments database: {order_id} for student {student_id}")
-                order = Order.objects.create(
+                order_id = allocate_order_id()
+                logger.info(f"Creating order {order_id} for student {student_id}")
+                write_order(
                     order_id=order_id,
                     student_id=student_id,
-                    user_id=user_id,
                     name=name,
                     payment_method=payment_method,
+                    cart_items=cart_items,
+                    user_id=user_id,
                 )
                 
-                # Create order in shop app database - dual database architecture
-                logger.info(f"Creating order in shop database: {order_id}")
-                shop_order = ShopOrder.objects.create(
-                    order_id=order_id,
-                    student_id=student_id,
-                    name=name,
-                    payment_method=payment_method,
-                    # Shop model uses date_created with default=timezone.now
-                )
-                
-                # Create individual order items in managepayments database
-                for item in cart_items:
-                    OrderItem.objects.create(
-                        order=order,
-                        name=item['name'],
-                        price=float(item['price']),
-                        quantity=int(item['quantity'])
-                    )
-                    
-                    # Also create items in shop app database for consistency
-                    ShopOrderItem.objects.create(
-                        order=shop_order,
-                        name=item['name'],
-                        price=float(item['price']),
-                        quantity=int(item['quantity'])
-                    )
-                
-                logger.info(f"Successfully saved order {order_id} to both databases with {len(cart_items)} items")
-                
-                # Update inventory quantities after successful order
-                try:
-                    update_inventory_after_order(cart_items)
-                    logger.info(f"Inventory updated for order {order_id}")
-                except Exception as e:
-                    # Log error but don't fail the order if inventory update fails
-                    logger.error(f"Error updating inventory: {str(e)}")
-                
                 # Return success response with order ID
                 return JsonResponse({'status': 'success', 'order_id': order_id})
             
             except Exception as e:
                 # Log detailed error for database operations
                 logger.error(f"Error saving order to database: {str(e)}\n{traceback.format_exc()}")
-                return JsonResponse({
+                return skip_idempotent_store(JsonResponse({
                     'status': 'error', 
                     'message': f'Failed to save order to database: {str(e)}'
-                })
+                }))
                 
         except json.JSONDecodeError:
             # Handle malformed JSON data in cart
             logger.error("Invalid JSON data in request")
-            return JsonResponse({'status': 'error', 'message': 'Invalid cart data format'})
+            return skip_idempotent_store(JsonResponse({'status': 'error', 'message': 'Invalid cart data format'}))
         except Exception as e:
             # Catch any other unexpected errors
             logger.error(f"Error processing payment: {str(e)}\n{traceback.format_exc()}")
-            return JsonResponse({'status': 'error', 'message': str(e)})
+            return skip_idempotent_store(JsonResponse({'status': 'error', 'message': str(e)}))
             
     # Return error for non-POST requests
-    return JsonResponse({'status': 'error', 'message': 'Invalid request method'})
+    return skip_idempotent_store(JsonResponse({'status': 'error', 'message': 'Invalid request method'}))
 
 def payment_confirmation(request):
     """
     Render payment confirmation page after successful order.
     Requires user to be logged in - redirects to login if no session exists.
     """
-    if not request.session.get('shop_user_id'):
+    if not request.shop_user:
         return redirect('shop:shop_login')
     return render(request, 'managepayments/confirmation.html')
 
@@ -269,8 +178,8 @@ def save_order(request):
     """
     API endpoint to save order to the database.
     
-    Creates order records in both managepayments and shop databases.
-    Uses Django REST Framework serializers for validation.
+    Creates the order record and queues its side effects in the order
+    outbox. Uses Django REST Framework serializers for validation.
     
     Request data should include order details and an array of items.
     Returns serialized order data if successful, errors otherwise.
@@ -283,38 +192,18 @@ def save_order(request):
         serializer = OrderSerializer(data=request.data)
         
         if serializer.is_valid():
-            # Save the order in managepayments model first
-            order = serializer.save()
-            
-            # Also save to shop model for dual-database architecture
-            shop_order = ShopOrder.objects.create(
-                order_id=request.data['order_id'],
-                student_id=request.data['student_id'],
+            # Save the order and its items in one transaction
+            order = write_order(
+                order_id=serializer.validated_data.get('order_id') or allocate_order_id(),
+                student_id=serializer.validated_data['student_id'],
                 name=request.data.get('name', ''),
                 payment_method=request.data.get('payment_method', ''),
+                cart_items=request.data.get('items', []),
+                user_id=getattr(serializer.validated_data.get('user'), 'id', None),
             )
             
-            # Create order items for both database models if items are provided
-            if 'items' in request.data:
-                for item_data in request.data['items']:
-                    # Create in managepayments model
-                    OrderItem.objects.create(
-                        order=order,
-                        name=item_data['name'],
-                        price=item_data['price'],
-                        quantity=item_data['quantity']
-                    )
-                    
-                    # Create in shop model for consistency
-                    ShopOrderItem.objects.create(
-                        order=shop_order,
-                        name=item_data['name'],
-                        price=item_data['price'],
-                        quantity=item_data['quantity']
-                    )
-            
-            logger.info(f"Order saved to both databases with ID: {order.id}")
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            logger.info(f"Order saved with ID: {order.id}")
+            return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
         
         # Log validation errors in detail for debugging
         logger.error(f"Order validation errors: {serializer.errors}")
@@ -329,7 +218,7 @@ def update_inventory(request):
     """
     API endpoint to update inventory quantity for an item after purchase.
     
-    Uses multiple matching strategies to find the correct inventory item:
+    Uses the inventory name index to find the correct inventory item:
     1. Exact match (case-insensitive)
     2. Partial match (item name contains search term)
     3. Reverse match (search term contains item name)
@@ -346,54 +235,29 @@ def update_inventory(request):
         if not item_name or quantity <= 0:
             return Response({'error': 'Invalid item data'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Import model from dashboard app
-        from dashboard.models import InventoryItem
-        
-        # Strategy 1: Find the item by exact name (case-insensitive)
-        inventory_items = InventoryItem.objects.filter(name__iexact=item_name)
+        # Import name index and stock engine from dashboard app
+        from dashboard.inventory_index import get_inventory_index
+        from dashboard.stock import decrement_stock
         
-        # Strategy 2: If no exact match, try partial match
-        if not inventory_items.exists():
-            inventory_items = InventoryItem.objects.filter(name__icontains=item_name)
-            
-            # Strategy 3: If still no match, try the reverse match
-            if not inventory_items.exists():
-                found = False
-                for inv_item in InventoryItem.objects.all():
-                    if inv_item.name.lower() in item_name.lower():
-                        inventory_item = inv_item
-                        found = True
-                        break
-                else:
-                    found = False
-            else:
-                inventory_item = inventory_items.first()
-                found = True
-        else:
-            inventory_item = inventory_items.first()
-            found = True
+        match = get_inventory_index().match(item_name)
+        line = decrement_stock([(match.id, quantity)])[0] if match else None
         
         # Handle case where no matching item was found
-        if not found:
+        if line is None or line.remaining is None:
             logger.warning(f"No inventory item found for '{item_name}'")
             return Response(
                 {'error': f'No inventory item found for {item_name}'}, 
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Update inventory quantity, ensuring it never goes below zero
-        original_quantity = inventory_item.quantity
-        inventory_item.quantity = max(0, original_quantity - quantity)
-        inventory_item.save()
-        
-        logger.info(f"Updated inventory for '{inventory_item.name}': {original_quantity} -> {inventory_item.quantity}")
+        logger.info(f"Updated inventory for '{match.name}': {line.remaining + line.filled} -> {line.remaining}")
         
         # Return detailed response about the inventory update
         return Response({
-            'item': inventory_item.name,
-            'previous': original_quantity,
-            'purchased': quantity,
-            'remaining': inventory_item.quantity
+            'item': match.name,
+            'previous': line.remaining + line.filled,
+            'purchased': line.filled,
+            'remaining': line.remaining
         })
         
     except Exception as e:
@@ -404,65 +268,135 @@ def update_inventory(request):
 
 
 
-@api_view(['GET'])
-def get_order_history(request):
+# Order history page sizes. Students page through their own orders; managers
+# can list every order with ?scope=all, in larger but still capped pages.
+ORDER_HISTORY_PAGE_SIZE = 50
+ORDER_HISTORY_MAX_PAGE_SIZE = 200
+ORDER_HISTORY_ADMIN_MAX_PAGE_SIZE = 1000
+# Orders read from the database cursor (and items fetched) per batch
+ORDER_HISTORY_CHUNK_SIZE = 100
+
+
+def _stream_order_history(orders, limit, chunk_size=ORDER_HISTORY_CHUNK_SIZE):
     """
-    API endpoint to retrieve order history for the current user.
-    
-    If user is logged in, returns only their orders.
-    Otherwise returns all orders (for testing/demo purposes).
-    Formats response for frontend consumption with nested items.
-    Returns empty list on error to prevent UI disruption.
+    Yield one page of orders as a JSON document, a batch at a time.
+
+    Orders are read with .iterator() so only one batch is held in memory, and
+    each batch's items are loaded with a single query. The queryset must be in
+    keyset order and hold at most limit + 1 rows; an extra row means there is a
+    next page.
+
+    Yields:
+        Pieces of {"orders": [...], "next_cursor": ...}
     """
+    rows = orders.values('id', 'order_id', 'student_id', 'date_created').iterator(chunk_size=chunk_size)
+    emitted = 0
+    last = None
+    has_more = False
+
     try:
-        # Get the user ID from the session to filter orders
-        user_id = request.session.get('shop_user_id')
-        
-        # Filter orders by user ID if available, otherwise return all orders
-        if user_id:
-            orders = Order.objects.filter(user_id=user_id).order_by('-date_created')
-        else:
-            # Get all orders (for demo/testing purposes)
-            orders = Order.objects.all().order_by('-date_created')
-        
-        # Initialize empty list to store formatted order data
-        data = []
-        
-        for order in orders:
-            # Get all items for this order using related name 'items'
-            # The hasattr check prevents errors if the relation doesn't exist
-            order_items = order.items.all() if hasattr(order, 'items') else []
-            
-            # Format items into a list of dictionaries for the response
-            items_data = []
-            for item in order_items:
-                items_data.append({
-                    'name': item.name,
-                    'price': float(item.price),  # Convert Decimal to float for JSON serialization
-                    'quantity': item.quantity
+        yield '{"orders": ['
+        while not has_more:
+            batch = list(itertools.islice(rows, chunk_size))
+            if not batch:
+                break
+            if emitted + len(batch) > limit:
+                batch = batch[:limit - emitted]
+                has_more = True
+                if not batch:
+                    break
+
+            # Items for the whole batch in one query
+            items_by_order = {order['id']: [] for order in batch}
+            item_rows = (
+                ShopOrderItem.objects.filter(order_id__in=items_by_order)
+                .order_by('order_id', 'id')
+                .values_list('order_id', 'name', 'price', 'quantity')
+            )
+            for order_pk, name, price, quantity in item_rows:
+                items_by_order[order_pk].append({
+                    'name': name,
+                    'price': float(price),  # Convert Decimal to float for JSON serialization
+                    'quantity': quantity
                 })
-            
-            # Build complete order object with metadata and items
-            order_data = {
-                'orderId': order.order_id,
-                'studentId': order.student_id,
-                # Convert Django datetime to Unix timestamp (milliseconds) for JavaScript
-                # The hasattr check handles edge cases where date_created might be missing
-                'date': int(order.date_created.timestamp() * 1000) if hasattr(order, 'date_created') else int(timezone.now().timestamp() * 1000),
-                'items': items_data
-            }
-            
-            # Add this formatted order to the response array
-            data.append(order_data)
-        
-        # Return all orders as JSON response
-        return Response(data)
-        
+
+            for order in batch:
+                order_data = {
+                    'orderId': order['order_id'],
+                    'studentId': order['student_id'],
+                    # Unix timestamp in milliseconds for JavaScript
+                    'date': int(order['date_created'].timestamp() * 1000),
+                    'items': items_by_order[order['id']]
+                }
+                yield (',' if emitted else '') + json.dumps(order_data)
+                emitted += 1
+            last = batch[-1]
+
+        next_cursor = encode_cursor(last['date_created'], last['id']) if has_more else None
+        yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
+
     except Exception as e:
-        # Log the error but return empty list instead of error response
-        # This prevents UI disruption when the backend has issues
-        logger.error(f"Error retrieving order history: {str(e)}\n{traceback.format_exc()}")
-        return Response([])
+        # Headers are already sent, so the error cannot become a 500; log it
+        # and end the stream, leaving the client with invalid JSON
+        logger.error(f"Error streaming order history: {str(e)}\n{traceback.format_exc()}")
+        raise
+
+
+def _cache_stream(pieces, key):
+    """Pass a stream through and cache its full body once it completes."""
+    body = []
+    for piece in pieces:
+        body.append(piece)
+        yield piece
+    cache.set(key, ''.join(body), settings.USER_CACHE_TIMEOUT)
+
+
+@api_view(['GET'])
+def get_order_history(request):
+    """
+    API endpoint to retrieve one page of order history, newest first.
+
+    Logged-in students get their own orders. Managers can pass scope=all to
+    list every order; anyone else gets 401 (or 403 for scope=all).
+
+    Query parameters:
+        cursor: next_cursor from the previous page; omit for the first page
+        limit: Orders per page (default 50, at most 200, or 1000 for scope=all)
+        scope: 'all' for the manager view of every order
+
+    The response is streamed as {"orders": [...], "next_cursor": ...} with
+    next_cursor null on the last page, so memory stays flat for large pages.
+    A student's pages are cached until one of their orders changes.
+    """
+    if request.GET.get('scope') == 'all':
+        if not request.user.is_authenticated or not request.session.get('is_manager'):
+            return Response({'error': 'Manager login required'}, status=status.HTTP_403_FORBIDDEN)
+        orders = ShopOrder.objects.all()
+        maximum = ORDER_HISTORY_ADMIN_MAX_PAGE_SIZE
+    else:
+        if not request.shop_user:
+            return Response({'error': 'Not authenticated'}, status=status.HTTP_401_UNAUTHORIZED)
+        user_id = request.shop_user.id
+        orders = ShopOrder.objects.filter(user_id=user_id)
+        maximum = ORDER_HISTORY_MAX_PAGE_SIZE
+
+    limit = page_size(request.GET.get('limit'), default=ORDER_HISTORY_PAGE_SIZE, maximum=maximum)
+    try:
+        orders = keyset_queryset(orders, request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    pieces = _stream_order_history(orders[:limit + 1], limit)
+    if request.GET.get('scope') != 'all':
+        # Student pages are bounded by ORDER_HISTORY_MAX_PAGE_SIZE, so the
+        # finished body is small enough to keep
+        cache_key = user_cache_key(user_id, f"payments-order-history:{request.GET.get('cursor')}:{limit}")
+        body = cache.get(cache_key)
+        if body is not None:
+            return HttpResponse(body, content_type='application/json')
+        pieces = _cache_stream(pieces, cache_key)
+
+    return StreamingHttpResponse(pieces, content_type='application/json')
     
 # this feature allows users to download a PDF receipt for their completed order
 # It generates a PDF with order details and returns it as a downloadable file.
@@ -478,9 +412,18 @@ def download_receipt(request):
     if not order_id:
         return redirect('shop:shop_login')
     
+    # Order IDs are sequential and easy to guess, so students only get
+    # receipts for their own orders; managers can download any
+    if request.session.get('is_manager') and request.user.is_authenticated:
+        orders = Order.objects.all()
+    elif request.shop_user:
+        orders = Order.objects.filter(user_id=request.shop_user.id)
+    else:
+        return redirect('shop:shop_login')
+    
     try:
         # Get order details from the database
-        order = Order.objects.get(order_id=order_id)
+        order = orders.get(order_id=order_id)
         order_items = OrderItem.objects.filter(order=order)
         
         # Create a file-like buffer to receive PDF data
@@ -511,10 +454,8 @@ def download_receipt(request):
         data = [["Item", "Quantity", "Price", "Total"]]
         
         # Add order items to the table
-        total = 0
         for item in order_items:
             subtotal = item.price * item.quantity
-            total += subtotal
             data.append([
                 item.name,
                 str(item.quantity),
@@ -523,7 +464,7 @@ def download_receipt(request):
             ])
         
         # Add total row
-        data.append(["", "", "Grand Total:", f"₹{total:.2f}"])
+        data.append(["", "", "Grand Total:", f"₹{order.total_amount:.2f}"])
         
         # Create the table
         table = Table(data, colWidths=[200, 100, 100, 100])
@@ -581,13 +522,15 @@ def create_mock_payment(request):
         name = request.POST.get('name')
         student_id = request.POST.get('student_id')
         payment_method = request.POST.get('payment_method')
-        order_id = request.POST.get('order_id')
         cart_data = request.POST.get('cart_data')
         
         # Check if we have all required data
-        if not all([name, student_id, payment_method, order_id, cart_data]):
+        if not all([name, student_id, payment_method, cart_data]):
             return JsonResponse({'status': 'error', 'message': 'Missing required data'})
         
+        # Order IDs are allocated on the server so two checkouts never share one
+        order_id = allocate_order_id()
+        
         # Get delivery info for classroom delivery
         delivery_info = None
         if payment_method == 'classroom_delivery':
@@ -637,6 +580,7 @@ def create_mock_payment(request):
             
             return JsonResponse({
                 'status': 'success',
+                'order_id': order_id,
                 'redirect_url': success_url
             })
         
@@ -661,6 +605,7 @@ def create_mock_payment(request):
             # Return the UPI payment URL for redirection
             return JsonResponse({
                 'status': 'success',
+                'order_id': order_id,
                 'redirect_url': upi_payment_url
             })
             
@@ -673,6 +618,7 @@ def create_mock_payment(request):
             
             return JsonResponse({
                 'status': 'success',
+                'order_id': order_id,
                 'redirect_url': mock_razorpay_url
             })
             
@@ -723,9 +669,22 @@ def show_mock_razorpay(request):
 
 
 
+def _payment_callback_key(request):
+    if request.GET.get('status') != 'success':
+        return None
+    order_id = request.GET.get('order_id') or request.GET.get('razorpay_payment_id')
+    return _session_order_key(request, order_id)
+
+
 @csrf_exempt
+@idempotent(_payment_callback_key)
 def payment_callback(request):
-    """Handle the callback from mock Razorpay payment"""
+    """
+    Handle the callback from mock Razorpay payment.
+
+    The callback is keyed on the order ID, so a refreshed or retried callback
+    replays the original success page instead of creating the order again.
+    """
     # Get data from request
     razorpay_order_id = request.GET.get('razorpay_order_id')
     razorpay_payment_id = request.GET.get('razorpay_payment_id')
@@ -751,86 +710,32 @@ def payment_callback(request):
             # Parse cart items
             cart_items = json.loads(cart_data)
             
-            # Get user ID from session
-            user_id = request.session.get('shop_user_id')
+            # The logged-in student, if any
+            user_id = request.shop_user.id if request.shop_user else None
             
-            # Create order in managepayments app database
-            logger.info(f"Creating order in managepayments database: {order_id} for student {student_id}")
-            order = Order.objects.create(
-                order_id=order_id,
-                student_id=student_id,
-                user_id=user_id,
-                name=name,
-                payment_method=payment_method,
-            )
+            # Save delivery info only for classroom delivery orders
+            if payment_method != 'classroom_delivery':
+                delivery_info = None
             
-            # Create order in shop app database - dual database architecture
-            logger.info(f"Creating order in shop database: {order_id}")
-            shop_order = ShopOrder.objects.create(
+            # Create the order; status is set to in progress so that it can be
+            # changed manually later. The delivery record and inventory are
+            # applied by the order worker from the outbox.
+            logger.info(f"Creating order {order_id} for student {student_id}")
+            order = write_order(
                 order_id=order_id,
                 student_id=student_id,
                 name=name,
                 payment_method=payment_method,
+                cart_items=cart_items,
+                user_id=user_id,
+                status='in_progress',
+                delivery_info=delivery_info,
             )
             
-            # Add payment details (mock)
+            # Attach the payment reference for display on the success page
             order.payment_id = razorpay_payment_id
-            shop_order.payment_id = razorpay_payment_id
             
-            # Set status to in progress so that it can be changed manually later
-            order.status = 'in_progress'
-            shop_order.status = 'in_progress'
-            
-            # Save delivery info for classroom delivery
-            if delivery_info and payment_method == 'classroom_delivery':
-                try:
-                    # Try creating a DeliveryInfo object (if the model exists)
-                    from managepayments.models import DeliveryInfo
-                    delivery = DeliveryInfo.objects.create(
-                        order=order,
-                        floor_number=delivery_info.get('floor_number'),
-                        classroom=delivery_info.get('classroom'),
-                        delivery_time=delivery_info.get('delivery_time'),
-                        delivery_notes=delivery_info.get('delivery_notes', '')
-                    )
-                    logger.info(f"Created delivery info record for order {order_id}")
-                except ImportError:
-                    # If no DeliveryInfo model exists, store as JSON in the order
-                    logger.info("DeliveryInfo model not found, storing as JSON")
-                    # Store as JSON in notes field (assuming Order has a notes field)
-                    order.notes = json.dumps(delivery_info)
-                    shop_order.notes = json.dumps(delivery_info)
-                    
-            # Save the updated orders
-            order.save()
-            shop_order.save()
-            
-            # Create individual order items in managepayments database
-            for item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    name=item['name'],
-                    price=float(item['price']),
-                    quantity=int(item['quantity'])
-                )
-                
-                # Also create items in shop app database for consistency
-                ShopOrderItem.objects.create(
-                    order=shop_order,
-                    name=item['name'],
-                    price=float(item['price']),
-                    quantity=int(item['quantity'])
-                )
-                
-            logger.info(f"Order saved to both databases with ID: {order.id}")
-            
-            # Update inventory quantities after successful order
-            try:
-                update_inventory_after_order(cart_items)
-                logger.info(f"Inventory updated for order {order_id}")
-            except Exception as e:
-                # Log error but don't fail the order if inventory update fails
-                logger.error(f"Error updating inventory: {str(e)}")
+            logger.info(f"Order saved with ID: {order.id}")
             
             # Calculate total amount for display
             total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
@@ -845,10 +750,14 @@ def payment_callback(request):
             
         except Exception as e:
             logger.error(f"Error processing payment callback: {str(e)}\n{traceback.format_exc()}")
-            return render(request, 'managepayments/payment_failure.html', {'error': str(e)})
+            return skip_idempotent_store(
+                render(request, 'managepayments/payment_failure.html', {'error': str(e)})
+            )
     else:
         # Payment failed or invalid data
-        return render(request, 'managepayments/payment_failure.html', {'error': 'Invalid payment data'})
+        return skip_idempotent_store(
+            render(request, 'managepayments/payment_failure.html', {'error': 'Invalid payment data'})
+        )
 
 
 
@@ -971,8 +880,19 @@ def show_upi_payment(request):
 
 
 
+def _process_upi_payment_key(request):
+    order_id = request.GET.get('order_id') or request.session.get('payment_data', {}).get('order_id')
+    return _session_order_key(request, order_id)
+
+
+@idempotent(_process_upi_payment_key)
 def process_upi_payment(request):
-    """Process UPI payment after user confirms they've completed the payment"""
+    """
+    Process UPI payment after user confirms they've completed the payment.
+
+    Keyed on the order ID like payment_callback, so a repeated confirmation
+    replays the original success page.
+    """
     try:
         # Get payment data from session
         payment_data = request.session.get('payment_data', {})
@@ -989,66 +909,27 @@ def process_upi_payment(request):
         # Parse cart items
         cart_items = json.loads(cart_data)
         
-        # Get user ID from session
-        user_id = request.session.get('shop_user_id')
-        
-        # Create order in managepayments app database
-        logger.info(f"Creating UPI order in managepayments database: {order_id} for student {student_id}")
-        order = Order.objects.create(
-            order_id=order_id,
-            student_id=student_id,
-            user_id=user_id,
-            name=name,
-            payment_method=payment_method,
-        )
+        # The logged-in student, if any
+        user_id = request.shop_user.id if request.shop_user else None
         
-        # Create order in shop app database - dual database architecture
-        logger.info(f"Creating UPI order in shop database: {order_id}")
-        shop_order = ShopOrder.objects.create(
+        # Create the order; status is set to in progress so that it can be
+        # changed manually later. Inventory is applied by the order worker
+        # from the outbox.
+        logger.info(f"Creating UPI order {order_id} for student {student_id}")
+        order = write_order(
             order_id=order_id,
             student_id=student_id,
             name=name,
             payment_method=payment_method,
+            cart_items=cart_items,
+            user_id=user_id,
+            status='in_progress',
         )
         
-        # Add mock payment ID
-        mock_payment_id = f"upi_{uuid.uuid4().hex[:10]}"
-        order.payment_id = mock_payment_id
-        shop_order.payment_id = mock_payment_id
+        # Attach a mock payment reference for display on the success page
+        order.payment_id = f"upi_{uuid.uuid4().hex[:10]}"
         
-        # Set status to in progress so that it can be changed manually later
-        order.status = 'in_progress'
-        shop_order.status = 'in_progress'
-        
-        # Save the updated orders
-        order.save()
-        shop_order.save()
-        
-        # Create individual order items in managepayments database
-        for item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                name=item['name'],
-                price=float(item['price']),
-                quantity=int(item['quantity'])
-            )
-            
-            # Also create items in shop app database for consistency
-            ShopOrderItem.objects.create(
-                order=shop_order,
-                name=item['name'],
-                price=float(item['price']),
-                quantity=int(item['quantity'])
-            )
-            
-        logger.info(f"UPI order saved to both databases with ID: {order.id}")
-        
-        # Update inventory quantities after successful order
-        try:
-            update_inventory_after_order(cart_items)
-            logger.info(f"Inventory updated for UPI order {order_id}")
-        except Exception as e:
-            logger.error(f"Error updating inventory: {str(e)}")
+        logger.info(f"UPI order saved with ID: {order.id}")
         
         # Calculate total amount for display
         total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
@@ -1063,7 +944,9 @@ def process_upi_payment(request):
         
     except Exception as e:
         logger.error(f"Error processing UPI payment: {str(e)}\n{traceback.format_exc()}")
-        return render(request, 'managepayments/payment_failure.html', {'error': str(e)})
+        return skip_idempotent_store(
+            render(request, 'managepayments/payment_failure.html', {'error': str(e)})
+        )
     
 
 
@@ -1,7 +1,19 @@
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.shortcuts import redirect
 from functools import wraps
 
 def manager_required(view_func):
+    if iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async_view(request, *args, **kwargs):
+            # Same check; the user and session load synchronously
+            user = await request.auser()
+            is_manager = await sync_to_async(request.session.get)('is_manager')
+            if not user.is_authenticated or not is_manager:
+                return redirect('managers:login')
+            return await view_func(request, *args, **kwargs)
+        return _wrapped_async_view
+
     @wraps(view_func)
     def _wrapped_view(request, *args, **kwargs):
         # Check if user is logged in and is a manager
@@ -1,3 +1,53 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from cafeteria_management_system.query_budget import QueryBudgetMixin
+from dashboard.models import InventoryItem
+from dashboard.stock import decrement_stock
+
+
+class ManagerQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Manager login and the inventory dashboard stay within a fixed query budget."""
+
+    def setUp(self):
+        self.seed_inventory()
+
+    def grow_inventory(self):
+        self.seed_inventory()
+
+    def test_login_page(self):
+        self.assertQueryBudget(0, lambda: self.client.get(reverse('managers:login')))
+
+    def test_login(self):
+        self.login_manager()
+        self.client.logout()
+        self.assertQueryBudget(8, lambda: self.client.post(
+            reverse('managers:login'), {'username': 'manager', 'password': 'manager-password'}
+        ))
+
+    def test_management_page(self):
+        self.login_manager()
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('dashboard:management')))
+
+    def test_inventory_items(self):
+        self.login_manager()
+        self.assertQueryBudget(
+            3, lambda: self.client.get(reverse('dashboard:get_items')), grow=self.grow_inventory
+        )
+
+    def test_public_inventory_items(self):
+        self.assertQueryBudget(
+            2, lambda: self.client.get(reverse('dashboard:get_public_items')), grow=self.grow_inventory
+        )
+
+    def test_public_inventory_items_not_modified(self):
+        url = reverse('dashboard:get_public_items')
+        etag = self.client.get(url)['ETag']
+        with self.assertMaxQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Checkout decrements stock with update(), which must still move the ETag
+        item = InventoryItem.objects.first()
+        decrement_stock([(item.id, 1)])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
@@ -1,5 +1,9 @@
 from django.contrib import admin
+from django.db.models import Max, Min
 from .models import Order, OrderItem, ShopUser
+from .rollups import rebuild_order_days
+from .totals import refresh_totals
+from .user_cache import bump_order_owner
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -7,10 +11,31 @@ class OrderItemInline(admin.TabularInline):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ['order_id', 'student_id', 'date_created', 'total']
+    list_display = ['order_id', 'student_id', 'date_created', 'item_count', 'total_amount']
     search_fields = ['order_id', 'student_id']
+    readonly_fields = ['total_amount', 'item_count']
+    # A search box instead of a select listing every student
+    raw_id_fields = ['user']
     inlines = [OrderItemInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Items may have been edited inline; keep the stored totals in step
+        refresh_totals(Order.objects.filter(pk=form.instance.pk))
+        bump_order_owner(form.instance.user_id, form.instance.name or form.instance.student_id)
+        # The status, date or items may have changed; recompute the daily
+        # sales of the day the order was on and the day it is on now
+        rebuild_order_days(form.initial.get('date_created'), form.instance.date_created)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_order_days(obj.date_created)
+
+    def delete_queryset(self, request, queryset):
+        span = queryset.aggregate(first=Min('date_created'), last=Max('date_created'))
+        super().delete_queryset(request, queryset)
+        rebuild_order_days(span['first'], span['last'])
+
 
 @admin.register(ShopUser)
 class ShopUserAdmin(admin.ModelAdmin):
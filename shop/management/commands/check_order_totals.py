@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import Order
+from shop.rollups import rebuild_order_days
+from shop.totals import mismatched_totals, refresh_totals
+
+
+class Command(BaseCommand):
+    help = (
+        'Verify the stored total_amount and item_count of every order against sums of its '
+        'items computed in the database, optionally recomputing the ones that disagree and the '
+        'daily sales rollups of the days they were placed on.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recompute mismatched totals from the items')
+        parser.add_argument('--show', type=int, default=10, help='Number of mismatched orders to list')
+
+    def handle(self, *args, **options):
+        mismatched = []
+        placed = []
+        for row in mismatched_totals(Order.objects.all()):
+            mismatched.append(row['id'])
+            placed.append(row['date_created'])
+            if len(mismatched) <= options['show']:
+                self.stdout.write(
+                    f"{row['order_id']}: stored {row['total_amount']} for {row['item_count']} items, "
+                    f"items sum to {row['items_total']} for {row['items_count']}"
+                )
+
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('All order totals match their items'))
+            return
+
+        if options['fix']:
+            # Fix in slices to keep the id list in each UPDATE bounded
+            for start in range(0, len(mismatched), 1000):
+                refresh_totals(Order.objects.filter(id__in=mismatched[start:start + 1000]))
+            # The rollups summed the stale totals
+            rebuild_order_days(*placed)
+            self.stdout.write(self.style.SUCCESS(
+                f"Recomputed totals for {len(mismatched)} orders and the rollups of their days"
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f"{len(mismatched)} orders have stale totals; run with --fix to recompute them"
+            ))
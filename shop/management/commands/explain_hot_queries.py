@@ -0,0 +1,173 @@
+import re
+from collections import namedtuple
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from managepayments.models import DeliveryInfo
+from shop.models import DailySales, Order, OrderItem, ShopUser
+from shop.pagination import encode_cursor, keyset_queryset
+
+# A query the application runs on a hot path. build takes the sample values
+# and returns the queryset; scans names the tables the query may read in
+# full because it returns all of their rows. Every query's ordering must come
+# from an index, including those allowed a scan.
+HotQuery = namedtuple('HotQuery', 'label build scans')
+
+HOT_QUERIES = [
+    HotQuery(
+        'student order history page',
+        lambda sample: keyset_queryset(Order.objects.filter(user_id=sample['user_id']), sample['cursor'])[:51],
+        (),
+    ),
+    HotQuery(
+        'all orders history page',
+        lambda sample: keyset_queryset(Order.objects.all(), sample['cursor'])[:1001],
+        (),
+    ),
+    HotQuery(
+        'items for a page of orders',
+        lambda sample: OrderItem.objects.filter(order_id__in=sample['order_pks']).order_by('order_id', 'id'),
+        (),
+    ),
+    HotQuery(
+        'export today',
+        lambda sample: Order.objects.filter(
+            date_created__gte=sample['day_start'], date_created__lt=sample['day_start'] + timedelta(days=1)
+        ),
+        (),
+    ),
+    HotQuery(
+        'export last 7 days',
+        lambda sample: Order.objects.filter(
+            date_created__gte=sample['day_start'] - timedelta(days=7),
+            date_created__lt=sample['day_start'] + timedelta(days=1),
+        ),
+        (),
+    ),
+    HotQuery(
+        'export summary from daily sales',
+        lambda sample: DailySales.objects.filter(date__gte=sample['today'] - timedelta(days=30))
+        .values('payment_method').annotate(orders=Sum('order_count')).order_by(),
+        (),
+    ),
+    HotQuery(
+        'orders by status',
+        lambda sample: Order.objects.filter(
+            status='pending', date_created__gte=sample['day_start']
+        ).order_by('-date_created'),
+        (),
+    ),
+    HotQuery(
+        'order owner lookup',
+        lambda sample: ShopUser.objects.alias(name_lower=Lower('name')).filter(
+            name_lower=Lower(Value(sample['name']))
+        ).values_list('id', flat=True)[:1],
+        (),
+    ),
+    HotQuery(
+        'transactions page by status',
+        lambda sample: keyset_queryset(Order.objects.filter(status='pending'), sample['cursor'])[:51],
+        (),
+    ),
+    HotQuery(
+        'transactions change feed',
+        lambda sample: Order.objects.filter(updated_at__gte=sample['day_start']).exclude(
+            updated_at=sample['day_start'], id__lte=0
+        ).order_by('updated_at', 'id')[:201],
+        (),
+    ),
+    HotQuery(
+        'delivery orders',
+        # Walks order_date_id_idx newest first and looks each order's
+        # delivery up by its unique order_id, so nothing is sorted in memory
+        lambda sample: DeliveryInfo.objects.select_related('order', 'status').order_by('-order__date_created'),
+        (),
+    ),
+]
+
+# Plan lines that read a whole table, and ones that sort rows in memory
+SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?!CONSTANT ROW)(\w+)\b(?! USING)'),
+    'postgresql': re.compile(r'\bSeq Scan on (\w+)'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b', re.MULTILINE),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Run EXPLAIN on every hot-path order query and flag the ones that scan a whole table '
+        'or sort in memory, so index coverage is checked rather than assumed. Supports SQLite '
+        'and PostgreSQL; on PostgreSQL sequential scans are disabled while planning, so a '
+        'small development database still reports whether an index could serve the query.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+        parser.add_argument('--sql', action='store_true', help='Print the SQL of each query')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor not in SCAN_PATTERNS:
+            raise CommandError(f"EXPLAIN audit supports SQLite and PostgreSQL, not {connection.vendor}")
+
+        sample = self._sample(options['database'])
+        problems = 0
+        for query in HOT_QUERIES:
+            queryset = query.build(sample).using(options['database'])
+            plan = self._explain(connection, queryset)
+
+            scanned = [table for table in SCAN_PATTERNS[connection.vendor].findall(plan)
+                       if table not in query.scans]
+            sorts = bool(SORT_PATTERNS[connection.vendor].search(plan))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(query.label))
+            if options['sql']:
+                self.stdout.write(f"  {queryset.query}")
+            for line in plan.splitlines():
+                self.stdout.write(f"    {line}")
+
+            if scanned or sorts:
+                problems += 1
+                if scanned:
+                    self.stdout.write(self.style.ERROR(f"  FULL SCAN of {', '.join(scanned)}"))
+                if sorts:
+                    self.stdout.write(self.style.ERROR('  SORT not served by an index'))
+            else:
+                self.stdout.write(self.style.SUCCESS('  OK'))
+
+        if problems:
+            raise CommandError(f"{problems} of {len(HOT_QUERIES)} hot queries are not covered by an index")
+        self.stdout.write(self.style.SUCCESS(f"All {len(HOT_QUERIES)} hot queries use indexes"))
+
+    def _sample(self, database):
+        """Parameter values for the queries, taken from real rows when there are any."""
+        now = timezone.now()
+        recent = list(Order.objects.using(database).order_by('-date_created', '-id')[:20])
+        order = recent[0] if recent else None
+        return {
+            'name': order.student_id if order else 'student',
+            'user_id': order.user_id if order and order.user_id is not None else 0,
+            # A cursor exercises the keyset predicate as well as the ordering
+            'cursor': encode_cursor(order.date_created if order else now, order.id if order else 0),
+            'order_pks': [row.id for row in recent] or [0],
+            'now': now,
+            'day_start': timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0),
+            'today': timezone.localdate(now),
+        }
+
+    def _explain(self, connection, queryset):
+        with transaction.atomic(using=connection.alias):
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    # Scoped to this transaction; makes the planner pick an
+                    # index whenever one can serve the query
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -0,0 +1,271 @@
+import bisect
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from dashboard.models import InventoryItem
+from managepayments.models import DeliveryInfo, DeliveryStatus
+from shop.models import Order, OrderItem, ShopUser
+from shop.rollups import rebuild_rollups
+from shop.totals import totals_for_lines
+from shop.user_cache import bump_user_version
+
+# The menu on the shop page, most popular first; popularity follows a Zipf skew
+MENU = [
+    ('Samosa', 25, 'snacks'),
+    ('Veg Biryani', 90, 'meals'),
+    ('Coca Cola', 25, 'beverages'),
+    ('Kachori', 25, 'snacks'),
+    ('Lays', 25, 'snacks'),
+    ('Gulab Jamun', 25, 'desserts'),
+    ('Thumbs Up', 25, 'beverages'),
+    ('Sprite', 25, 'beverages'),
+    ('Chocolate Brownie', 25, 'desserts'),
+    ('Cake', 25, 'desserts'),
+    ('Monster', 25, 'beverages'),
+    ('Chocolava Cake', 25, 'desserts'),
+]
+MENU_SKEW = 1.1
+
+PAYMENT_MIX = [('upi', 0.50), ('cash', 0.30), ('card', 0.12), ('classroom_delivery', 0.08)]
+LINES_PER_ORDER = [(1, 0.45), (2, 0.35), (3, 0.15), (4, 0.05)]
+QUANTITY_MIX = [(1, 0.80), (2, 0.17), (3, 0.03)]
+# Historic orders mostly completed; today's are still being served
+PAST_STATUS_MIX = [('successful', 0.93), ('cancelled', 0.04), ('pending', 0.03)]
+TODAY_STATUS_MIX = [('in_progress', 0.6), ('pending', 0.3), ('successful', 0.1)]
+
+# Meal windows in IST as (weight, mean hour, standard deviation in hours);
+# the lunch rush dominates
+MEAL_PEAKS = [(0.15, 8.75, 0.5), (0.55, 12.75, 0.6), (0.25, 16.0, 0.75)]
+OPEN_HOURS = (8.0, 19.5)
+
+# Relative volume by weekday (Monday first) and by month (campus calendar)
+WEEKDAY_FACTOR = [1.0, 1.0, 1.0, 1.0, 0.9, 0.35, 0.1]
+MONTH_FACTOR = {5: 0.3, 6: 0.3, 12: 0.6}
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Krishna', 'Meera', 'Nikhil',
+    'Pooja', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Saanvi', 'Sai', 'Sneha', 'Tanvi', 'Vihaan',
+]
+LAST_NAMES = [
+    'Agarwal', 'Bhat', 'Chopra', 'Das', 'Gupta', 'Iyer', 'Joshi', 'Kumar', 'Menon', 'Nair',
+    'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Varma', 'Yadav',
+]
+CLASSROOMS = ['A101', 'A204', 'B103', 'B305', 'C110', 'C212', 'D001', 'Library', 'Seminar Hall']
+
+# Seeded rows are recognisable so --clear can remove them again. Seeded orders
+# use their own ID prefix: the live CMS-XXXXXX space only has a million IDs
+# and is handed out by shop.order_ids.
+STUDENT_PREFIX = 'seed-'
+ORDER_PREFIX = 'SEED-'
+
+
+def _cumulative(mix):
+    """Split a [(value, weight), ...] mix into values and cumulative weights."""
+    values = [value for value, _ in mix]
+    return values, list(itertools.accumulate(weight for _, weight in mix))
+
+
+class Command(BaseCommand):
+    help = (
+        'Fill the database with realistic synthetic students, orders, items, deliveries and '
+        'inventory for benchmarks. Orders follow meal-time peaks, a skewed menu popularity and '
+        'the campus payment mix; everything is written with batched bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='Number of student accounts')
+        parser.add_argument('--days', type=int, default=30, help='Days of order history ending today')
+        parser.add_argument('--orders-per-student', type=float, default=0.3,
+                            help='Average orders per student on a regular weekday')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Orders written per transaction')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for reproducible data')
+        parser.add_argument('--password', default='password', help='Password for every seeded student')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete previously seeded students and orders first')
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--students, --days and --batch-size must be positive')
+
+        self.rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        if options['clear']:
+            self._clear()
+
+        self._seed_inventory()
+        students = self._seed_students(options['students'], options['password'])
+        totals = self._seed_orders(students, options)
+
+        # Orders are bulk inserted, so the daily sales rollups of the seeded
+        # days are recomputed; --clear may have emptied any earlier day
+        today = timezone.localdate()
+        sales_rows, item_rows = rebuild_rollups(
+            None if options['clear'] else today - timedelta(days=options['days'] - 1), today
+        )
+        self.stdout.write(f"Rebuilt {sales_rows} daily sales and {item_rows} daily item sales rows")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(students)} students, {totals['orders']} orders, {totals['items']} items and "
+            f"{totals['deliveries']} deliveries in {elapsed:.1f}s "
+            f"({totals['orders'] / max(elapsed, 0.001):.0f} orders/s)"
+        ))
+
+    def _clear(self):
+        deleted, _ = Order.objects.filter(order_id__startswith=ORDER_PREFIX).delete()
+        self.stdout.write(f"Deleted {deleted} seeded order rows")
+        deleted, _ = ShopUser.objects.filter(name__startswith=STUDENT_PREFIX).delete()
+        self.stdout.write(f"Deleted {deleted} seeded students")
+
+    def _seed_inventory(self):
+        existing = set(InventoryItem.objects.filter(
+            name__in=[name for name, _, _ in MENU]
+        ).values_list('name', flat=True))
+        InventoryItem.objects.bulk_create([
+            InventoryItem(name=name, quantity=self.rng.randint(50, 500), category=category)
+            for name, _, category in MENU if name not in existing
+        ])
+
+    def _seed_students(self, count, password):
+        """Create seeded student accounts, reusing ones from earlier runs."""
+        names = [
+            f"{STUDENT_PREFIX}{FIRST_NAMES[index % len(FIRST_NAMES)].lower()}."
+            f"{LAST_NAMES[index % len(LAST_NAMES)].lower()}.{index:06d}"
+            for index in range(count)
+        ]
+        existing = set(ShopUser.objects.filter(name__in=names).values_list('name', flat=True))
+        # Hash once; every seeded student shares the password
+        hashed = make_password(password)
+        ShopUser.objects.bulk_create([
+            ShopUser(name=name, email=f"{name}@students.example.com",
+                     phone=f"9{self.rng.randint(0, 999999999):09d}", password=hashed)
+            for name in names if name not in existing
+        ], batch_size=5000)
+        return list(ShopUser.objects.filter(name__in=names).order_by('id').values_list('id', 'name'))
+
+    def _order_times(self, day, count, ist):
+        """Draw count order times on day from the meal-peak mixture, in order."""
+        weights = [weight for weight, _, _ in MEAL_PEAKS]
+        times = []
+        for _ in range(count):
+            if self.rng.random() < 0.05:
+                hour = self.rng.uniform(*OPEN_HOURS)
+            else:
+                _, mean, deviation = self.rng.choices(MEAL_PEAKS, weights=weights)[0]
+                hour = min(max(self.rng.gauss(mean, deviation), OPEN_HOURS[0]), OPEN_HOURS[1])
+            times.append(hour)
+        times.sort()
+        midnight = ist.localize(datetime.combine(day, datetime.min.time()))
+        return [midnight + timedelta(hours=hour) for hour in times]
+
+    def _seed_orders(self, students, options):
+        ist = pytz.timezone('Asia/Kolkata')
+        today = timezone.localtime(timezone.now(), ist).date()
+        now = timezone.now()
+
+        # Some students eat at the cafeteria far more often than others
+        activity = list(itertools.accumulate(self.rng.paretovariate(1.5) for _ in students))
+        menu_weights = list(itertools.accumulate(1 / (rank + 1) ** MENU_SKEW for rank in range(len(MENU))))
+        payments, payment_weights = _cumulative(PAYMENT_MIX)
+        line_counts, line_weights = _cumulative(LINES_PER_ORDER)
+        quantities, quantity_weights = _cumulative(QUANTITY_MIX)
+
+        last = Order.objects.filter(order_id__startswith=ORDER_PREFIX).order_by('-order_id').first()
+        sequence = itertools.count(int(last.order_id[len(ORDER_PREFIX):]) + 1 if last else 1)
+
+        totals = {'orders': 0, 'items': 0, 'deliveries': 0}
+        batch = []
+        for offset in range(options['days'] - 1, -1, -1):
+            day = today - timedelta(days=offset)
+            volume = (len(students) * options['orders_per_student']
+                      * WEEKDAY_FACTOR[day.weekday()] * MONTH_FACTOR.get(day.month, 1.0))
+            count = max(0, round(self.rng.gauss(volume, volume * 0.1)))
+            status_values, status_weights = _cumulative(PAST_STATUS_MIX if offset else TODAY_STATUS_MIX)
+
+            for created in self._order_times(day, count, ist):
+                if created > now:
+                    break
+                user_id, name = students[bisect.bisect_left(activity, self.rng.random() * activity[-1])]
+                payment_method = self.rng.choices(payments, cum_weights=payment_weights)[0]
+                lines = self.rng.choices(line_counts, cum_weights=line_weights)[0]
+                picks = {
+                    bisect.bisect_left(menu_weights, self.rng.random() * menu_weights[-1])
+                    for _ in range(lines)
+                }
+                items = [
+                    (MENU[pick][0], MENU[pick][1], self.rng.choices(quantities, cum_weights=quantity_weights)[0])
+                    for pick in sorted(picks)
+                ]
+                total_amount, item_count = totals_for_lines((price, quantity) for _, price, quantity in items)
+                batch.append({
+                    'order': Order(
+                        order_id=f"{ORDER_PREFIX}{next(sequence):08d}",
+                        student_id=name,
+                        user_id=user_id,
+                        name=name,
+                        payment_method=payment_method,
+                        status=self.rng.choices(status_values, cum_weights=status_weights)[0],
+                        date_created=created,
+                        total_amount=total_amount,
+                        item_count=item_count,
+                    ),
+                    'items': items,
+                })
+                if len(batch) >= options['batch_size']:
+                    self._write_batch(batch, totals)
+                    batch = []
+            if options['verbosity'] > 1:
+                self.stdout.write(f"  {day}: {count} orders ({totals['orders']} written)")
+
+        if batch:
+            self._write_batch(batch, totals)
+        return totals
+
+    def _write_batch(self, batch, totals):
+        """Write one batch of orders with their items and delivery records."""
+        with transaction.atomic():
+            orders = Order.objects.bulk_create([entry['order'] for entry in batch])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, name=name, price=price, quantity=quantity)
+                for order, entry in zip(orders, batch)
+                for name, price, quantity in entry['items']
+            ], batch_size=5000)
+
+            deliveries = DeliveryInfo.objects.bulk_create([
+                DeliveryInfo(
+                    order=order,
+                    floor_number=str(self.rng.randint(0, 4)),
+                    classroom=self.rng.choice(CLASSROOMS),
+                    delivery_time=(order.date_created + timedelta(minutes=20)).astimezone(
+                        pytz.timezone('Asia/Kolkata')).strftime('%H:%M'),
+                )
+                for order in orders if order.payment_method == 'classroom_delivery'
+            ])
+            DeliveryStatus.objects.bulk_create([
+                DeliveryStatus(
+                    delivery_info=delivery,
+                    is_successful=delivery.order.status == 'successful',
+                    delivered_at=(delivery.order.date_created + timedelta(minutes=25)
+                                  if delivery.order.status == 'successful' else None),
+                    delivered_by='Counter staff' if delivery.order.status == 'successful' else None,
+                    status={'successful': 'delivered', 'cancelled': 'failed'}.get(delivery.order.status, 'pending'),
+                )
+                for delivery in deliveries
+            ])
+
+        # Students with new orders must not be served cached history
+        for user_id in {order.user_id for order in orders}:
+            bump_user_version(user_id)
+
+        totals['orders'] += len(orders)
+        totals['items'] += sum(len(entry['items']) for entry in batch)
+        totals['deliveries'] += len(deliveries)
@@ -0,0 +1,91 @@
+import re
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from shop.models import OrderIdSequence
+from shop.order_ids import OrderIdAllocator
+
+# The pattern sms_parsing.sms_reader uses to find order IDs in messages
+SMS_ORDER_ID = re.compile(r'^[cC][mM][sS]-(\d{6})$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Allocate order IDs from many threads at once and verify every ID is unique. '
+        'Uses a throwaway sequence row, so real order IDs are not consumed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent allocating threads')
+        parser.add_argument('--allocations', type=int, default=2000, help='IDs allocated by each thread')
+        parser.add_argument('--block-size', type=int, default=100, help='IDs reserved per database round trip')
+        parser.add_argument('--shared', action='store_true',
+                            help='Share one allocator between all threads (one worker process) instead '
+                                 'of one allocator per thread (one per worker process)')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['allocations'] < 1 or options['block_size'] < 1:
+            raise CommandError('--threads, --allocations and --block-size must be positive')
+
+        total = options['threads'] * options['allocations']
+        if total > 10 ** 6:
+            raise CommandError('More than 1,000,000 IDs would wrap the six-digit CMS- format')
+
+        sequence_name = f"stress-{uuid.uuid4().hex[:8]}"
+        shared = OrderIdAllocator(options['block_size'], sequence_name)
+        allocators = [
+            shared if options['shared'] else OrderIdAllocator(options['block_size'], sequence_name)
+            for _ in range(options['threads'])
+        ]
+
+        results = [None] * options['threads']
+        errors = []
+        lock = threading.Lock()
+        start_barrier = threading.Barrier(options['threads'])
+
+        def worker(index):
+            allocator = allocators[index]
+            allocated = []
+            try:
+                start_barrier.wait()
+                for _ in range(options['allocations']):
+                    allocated.append(allocator.allocate())
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            finally:
+                connection.close()
+                results[index] = allocated
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        OrderIdSequence.objects.filter(name=sequence_name).delete()
+
+        all_ids = [order_id for allocated in results for order_id in allocated]
+        duplicates = len(all_ids) - len(set(all_ids))
+        malformed = sum(1 for order_id in all_ids if not SMS_ORDER_ID.match(order_id))
+        blocks = shared.blocks_reserved if options['shared'] else sum(a.blocks_reserved for a in allocators)
+
+        self.stdout.write(f"Database: {connections['default'].vendor}")
+        self.stdout.write(f"Allocators: {'1 shared' if options['shared'] else options['threads']}, "
+                          f"block size {options['block_size']}")
+        self.stdout.write(f"Allocated: {len(all_ids)} of {total} IDs, {len(errors)} errors")
+        self.stdout.write(f"Blocks reserved: {blocks} ({blocks / max(len(all_ids), 1):.3f} round trips per ID)")
+        self.stdout.write(f"Elapsed: {elapsed:.2f}s ({len(all_ids) / elapsed:.0f} allocations/s)")
+        for error in errors[:5]:
+            self.stderr.write(f"Allocation failed: {error}")
+
+        if duplicates or malformed or errors:
+            self.stdout.write(self.style.ERROR(f"Duplicates: {duplicates}, malformed: {malformed}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Duplicates: 0, malformed: 0'))
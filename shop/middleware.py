@@ -0,0 +1,85 @@
+"""
+The logged-in student as request.shop_user.
+
+Student views used to load ShopUser from the session's shop_user_id on every
+request, some of them more than once. ShopUserMiddleware sets a lazy
+request.shop_user instead, loaded at most once per request and only when a
+view touches it. The student's id, name and email are kept in the session
+at login, so a user built from them needs no query at all. Any other field
+is loaded from the database the first time it is read.
+
+The cached identity carries the account's version from shop.user_cache,
+which moves on whenever the ShopUser row is saved or deleted. A session
+whose identity is out of date loads the row again, so renames and email
+changes are picked up and a deleted student is logged out. Updates made
+with QuerySet.update() send no signal and are not seen until the student
+logs in again.
+
+request.shop_user is falsy when no student is logged in, so views check it
+with `if not request.shop_user`.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.functional import SimpleLazyObject
+
+from .models import ShopUser
+from .user_cache import get_identity_version
+
+# Session key for the cached identity, and the fields it holds
+SESSION_KEY = 'shop_user'
+IDENTITY_FIELDS = ('id', 'name', 'email')
+
+
+def session_identity(user, version):
+    """The identity cached in the session for a user at an account version."""
+    identity = {field: getattr(user, field) for field in IDENTITY_FIELDS}
+    identity['version'] = version
+    return identity
+
+
+def remember_shop_user(request, user):
+    """Log a student in, caching their identity in the session."""
+    request.session['shop_user_id'] = user.id
+    request.session[SESSION_KEY] = session_identity(user, get_identity_version(user.id))
+    request.shop_user = user
+
+
+def get_shop_user(request):
+    """
+    Return the logged-in student for a request.
+
+    Returns:
+        A ShopUser with at least its identity fields loaded, or None if no
+        student is logged in or their account no longer exists
+    """
+    user_id = request.session.get('shop_user_id')
+    if not user_id:
+        return None
+
+    # Read before the row, so a change made while it loads is not missed
+    version = get_identity_version(user_id)
+    identity = request.session.get(SESSION_KEY)
+    if identity and identity.get('id') == user_id and (version is None or identity.get('version') == version):
+        # The remaining fields are deferred and load on first access
+        return ShopUser.from_db(DEFAULT_DB_ALIAS, IDENTITY_FIELDS, [identity[field] for field in IDENTITY_FIELDS])
+
+    # The account changed, or the session predates the cached identity:
+    # load once, then remember
+    user = ShopUser.objects.filter(id=user_id).first()
+    if user is None:
+        # Deleted: log the session out rather than query on every request
+        request.session.pop('shop_user_id', None)
+        request.session.pop(SESSION_KEY, None)
+        return None
+    request.session[SESSION_KEY] = session_identity(user, version)
+    return user
+
+
+class ShopUserMiddleware:
+    """Set a lazy request.shop_user; must come after SessionMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.shop_user = SimpleLazyObject(lambda: get_shop_user(request))
+        return self.get_response(request)
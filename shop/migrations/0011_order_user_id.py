@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_order_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='user_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
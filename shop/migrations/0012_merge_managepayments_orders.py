@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:20
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def merge_managepayments_orders(apps, schema_editor):
+    """
+    Fold managepayments orders into the canonical shop order table.
+
+    Orders present in both stores keep their shop row and pick up the user id
+    recorded by managepayments. Orders only in managepayments are copied over
+    together with their items.
+    """
+    ShopOrder = apps.get_model('shop', 'Order')
+    ShopOrderItem = apps.get_model('shop', 'OrderItem')
+    PaymentOrder = apps.get_model('managepayments', 'Order')
+    PaymentOrderItem = apps.get_model('managepayments', 'OrderItem')
+
+    last_id = 0
+    while True:
+        batch = list(PaymentOrder.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        existing = {
+            order.order_id: order
+            for order in ShopOrder.objects.filter(order_id__in=[order.order_id for order in batch])
+        }
+
+        # Carry the user id over to orders already mirrored in shop
+        to_update = []
+        for order in batch:
+            shop_order = existing.get(order.order_id)
+            if shop_order is not None and shop_order.user_id is None and order.user_id is not None:
+                shop_order.user_id = order.user_id
+                to_update.append(shop_order)
+        ShopOrder.objects.bulk_update(to_update, ['user_id'])
+
+        # Copy orders that were never mirrored, then their items
+        missing = [order for order in batch if order.order_id not in existing]
+        ShopOrder.objects.bulk_create([
+            ShopOrder(
+                order_id=order.order_id,
+                student_id=order.student_id,
+                date_created=order.date,
+                user_id=order.user_id,
+                name=order.name,
+                payment_method=order.payment_method,
+            )
+            for order in missing
+        ])
+        if missing:
+            created = dict(
+                ShopOrder.objects.filter(order_id__in=[order.order_id for order in missing])
+                .values_list('order_id', 'id')
+            )
+            ShopOrderItem.objects.bulk_create([
+                ShopOrderItem(
+                    order_id=created[item.order.order_id],
+                    name=item.name,
+                    price=item.price,
+                    quantity=item.quantity,
+                )
+                for item in PaymentOrderItem.objects.filter(order__in=missing).select_related('order')
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_order_user_id'),
+        ('managepayments', '0012_orderoutbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_managepayments_orders, migrations.RunPython.noop),
+    ]
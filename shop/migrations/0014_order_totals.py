@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:30
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 5000
+
+
+def backfill_order_totals(apps, schema_editor):
+    """
+    Store total_amount and item_count for existing orders from their items.
+
+    Orders are updated in id ranges so a large table is not rewritten in
+    one statement.
+    """
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+
+    item_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    total = item_totals.annotate(total=Sum(F('price') * F('quantity'))).values('total')
+    count = item_totals.annotate(count=Sum('quantity')).values('count')
+
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        Order.objects.filter(id__gte=ids[0], id__lte=ids[-1]).update(
+            total_amount=Coalesce(Subquery(total), Value(Decimal('0')),
+                                  output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+            item_count=Coalesce(Subquery(count), Value(0), output_field=models.IntegerField()),
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_orderidsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
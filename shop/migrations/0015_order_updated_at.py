@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_at(apps, schema_editor):
+    """Existing orders were last changed, as far as we know, when created."""
+    Order = apps.get_model('shop', 'Order')
+    Order.objects.update(updated_at=F('date_created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_order_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_order_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-date_created', '-id'], name='order_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['student_id', '-date_created', '-id'], name='order_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', '-date_created', '-id'], name='order_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(django.db.models.functions.text.Lower('name'), models.OrderBy(models.F('date_created'), descending=True), models.OrderBy(models.F('id'), descending=True), name='order_name_lower_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', '-date_created'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopuser',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='shopuser_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, Lower
+
+BATCH_SIZE = 5000
+
+
+def backfill_order_users(apps, schema_editor):
+    """
+    Link existing orders to the ShopUser who placed them.
+
+    Orders written without a login only carry the student's name and
+    student_id; they are matched to an account by name, then by student_id,
+    case-insensitively. Ids of students who no longer exist are cleared
+    first, so the foreign key added next can be enforced. Orders are updated
+    in id ranges, each in its own transaction, so a large table is neither
+    rewritten in one statement nor locked until the whole backfill is done.
+    An interrupted run can simply be started again.
+    """
+    Order = apps.get_model('shop', 'Order')
+    ShopUser = apps.get_model('shop', 'ShopUser')
+
+    users = ShopUser.objects.alias(name_lower=Lower('name')).values('id')
+    by_name = users.filter(name_lower=Lower(OuterRef('name')))[:1]
+    by_student_id = users.filter(name_lower=Lower(OuterRef('student_id')))[:1]
+
+    last_id = 0
+    while True:
+        ids = list(Order.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BATCH_SIZE])
+        if not ids:
+            break
+        batch = Order.objects.filter(id__gte=ids[0], id__lte=ids[-1])
+        with transaction.atomic():
+            batch.filter(user_id__isnull=False).exclude(user_id__in=ShopUser.objects.values('id')).update(user_id=None)
+            batch.filter(user_id__isnull=True).update(user_id=Coalesce(Subquery(by_name), Subquery(by_student_id)))
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    # Each batch commits on its own; see backfill_order_users
+    atomic = False
+
+    dependencies = [
+        ('shop', '0016_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Turn Order.user_id into a foreign key to ShopUser.
+
+    The column keeps its name and data, so in the database this only adds
+    the constraint; the model field is renamed from user_id to user.
+    Histories are read by user now, so the student_id and name indexes go.
+    """
+
+    dependencies = [
+        ('shop', '0017_backfill_order_users'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_student_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='order',
+            name='order_name_lower_date_idx',
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='order',
+                    name='user_id',
+                    field=models.ForeignKey(blank=True, db_column='user_id', db_index=False, null=True,
+                                            on_delete=django.db.models.deletion.SET_NULL,
+                                            related_name='orders', to='shop.shopuser'),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='order',
+                    name='order_user_date_idx',
+                ),
+                migrations.RemoveField(
+                    model_name='order',
+                    name='user_id',
+                ),
+                migrations.AddField(
+                    model_name='order',
+                    name='user',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True,
+                                            on_delete=django.db.models.deletion.SET_NULL,
+                                            related_name='orders', to='shop.shopuser'),
+                ),
+                migrations.AddIndex(
+                    model_name='order',
+                    index=models.Index(fields=['user', '-date_created', '-id'], name='order_user_date_idx'),
+                ),
+            ],
+        ),
+    ]
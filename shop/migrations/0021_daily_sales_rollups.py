@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:17
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    """
+    Compute the rollups of every day that already has orders.
+
+    The same queries as shop.rollups.rebuild_rollups, over the historical
+    models, so later changes to the app code cannot change this migration.
+    """
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    DailySales = apps.get_model('shop', 'DailySales')
+    DailyItemSales = apps.get_model('shop', 'DailyItemSales')
+
+    # TruncDate groups by the local date of the current time zone
+    sales = (
+        Order.objects.order_by()
+        .annotate(day=TruncDate('date_created'), method=Coalesce('payment_method', Value('')))
+        .values('day', 'method', 'status')
+        .annotate(
+            order_count=Count('id'),
+            item_count=Sum('item_count'),
+            delivery_count=Count('id', filter=Q(delivery_info__isnull=False)
+                                 | Q(payment_method__icontains='classroom_delivery')),
+            revenue=Sum('total_amount'),
+        )
+    )
+    # Rows are created in order of first sale, which reports use to break ties
+    items = (
+        OrderItem.objects.annotate(day=TruncDate('order__date_created'))
+        .values('day', 'name', 'order__status')
+        # revenue first: once annotated, quantity names the sum
+        .annotate(revenue=Sum(F('price') * F('quantity'),
+                              output_field=models.DecimalField(max_digits=12, decimal_places=2)),
+                  quantity=Sum('quantity'), first_id=Min('id'))
+        .order_by('first_id')
+    )
+
+    DailySales.objects.bulk_create([
+        DailySales(date=row['day'], payment_method=row['method'], status=row['status'],
+                   order_count=row['order_count'], item_count=row['item_count'],
+                   delivery_count=row['delivery_count'], revenue=row['revenue'])
+        for row in sales
+    ], batch_size=1000)
+    DailyItemSales.objects.bulk_create([
+        DailyItemSales(date=row['day'], name=row['name'], status=row['order__status'],
+                       quantity=row['quantity'], revenue=row['revenue'])
+        for row in items
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_order_changes_index'),
+        # Delivery counts follow DeliveryInfo.order to the shop orders
+        ('managepayments', '0013_deliveryinfo_shop_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('name', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('successful', 'Successful'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily item sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'name', 'status'), name='dailyitemsales_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('payment_method', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in_progress', 'In Progress'), ('successful', 'Successful'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('delivery_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'constraints': [models.UniqueConstraint(fields=('date', 'payment_method', 'status'), name='dailysales_key')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
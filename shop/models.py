@@ -1,7 +1,13 @@
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 
+from .user_cache import bump_identity_version
+
 class Order(models.Model):
 
     ORDER_STATUS_CHOICES = [
@@ -15,19 +21,42 @@ class Order(models.Model):
     order_id = models.CharField(max_length=50, unique=True)
     student_id = models.CharField(max_length=50)
     date_created = models.DateTimeField(default=timezone.now)
+    # ShopUser who placed the order; history pages filter on it. Not indexed
+    # on its own: order_user_date_idx starts with the same column
+    user = models.ForeignKey('ShopUser', on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='orders', db_index=False)
     name = models.CharField(max_length=100, blank=True, null=True)  # Add this field
     payment_method = models.CharField(max_length=20, blank=True, null=True)  # Add this field
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
+    # Sum of price * quantity and of quantities over the items, stored when
+    # the order is written; see shop.totals
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    # Bumped on every save; queryset.update() callers set it explicitly.
+    # Polled endpoints derive their ETag from it (see
+    # cafeteria_management_system.conditional) and the transactions change
+    # feed follows it
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"Order {self.order_id} by {self.student_id}"
     
     @property
     def total(self):
-        return sum(item.price * item.quantity for item in self.items.all())
+        return self.total_amount
     
     class Meta:
         ordering = ['-date_created']
+        # One index per hot query, each ending in the (date_created, id)
+        # keyset order so pages are read straight off the index; see the
+        # explain_hot_queries command
+        indexes = [
+            models.Index(fields=['-date_created', '-id'], name='order_date_id_idx'),
+            models.Index(fields=['user', '-date_created', '-id'], name='order_user_date_idx'),
+            models.Index(fields=['status', '-date_created', '-id'], name='order_status_date_id_idx'),
+            # Change feed order; also serves Max(updated_at)
+            models.Index(fields=['updated_at', 'id'], name='order_updated_id_idx'),
+        ]
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
@@ -39,6 +68,70 @@ class OrderItem(models.Model):
         return f"{self.quantity} x {self.name} in Order {self.order.order_id}"
 
 
+class DailySales(models.Model):
+    """
+    Orders, items and revenue of one day, payment method and status.
+
+    Updated with every order write and status change; see shop.rollups.
+    """
+    # Local date (TIME_ZONE) the orders were placed on
+    date = models.DateField()
+    # Empty for orders without a payment method
+    payment_method = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    # Signed: a status change subtracts from one row before adding to another
+    order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    # Orders paid as classroom_delivery or with delivery details
+    delivery_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        # Also serves reads of a range of days
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'payment_method', 'status'], name='dailysales_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.payment_method or '-'} {self.status}: {self.order_count} orders"
+
+
+class DailyItemSales(models.Model):
+    """
+    Quantity and revenue of one menu item on one day, per order status.
+
+    Updated with every order write and status change; see shop.rollups.
+    """
+    date = models.DateField()
+    name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Order.ORDER_STATUS_CHOICES)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily item sales'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'name', 'status'], name='dailyitemsales_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.name} {self.status}: {self.quantity}"
+
+
+class OrderIdSequence(models.Model):
+    """
+    Counter behind server-allocated order IDs.
+
+    Workers reserve blocks of values from this row; see shop.order_ids.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} (next {self.next_value})"
+
+
 class ShopUser(models.Model):
     name = models.CharField(max_length=100, unique=True)
     email = models.EmailField(unique=True)
@@ -49,5 +142,28 @@ class ShopUser(models.Model):
     security_question2 = models.CharField(max_length=255, null=True, blank=True)
     security_answer2 = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Orders placed without a login are matched to their student by
+            # name, case-insensitively
+            models.Index(Lower('name'), name='shopuser_name_lower_idx'),
+        ]
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+    @classmethod
+    def id_for_name(cls, name):
+        """Return the id of the student with this name (any case), or None."""
+        if not name:
+            return None
+        return (
+            cls.objects.alias(name_lower=Lower('name')).filter(name_lower=Lower(Value(name)))
+            .values_list('id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=ShopUser)
+def _shop_user_changed(sender, instance, **kwargs):
+    """Sessions that cached the student's identity reload it, or log out if deleted."""
+    bump_identity_version(instance.pk)
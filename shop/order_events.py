@@ -0,0 +1,225 @@
+"""
+Order changes, as a pollable feed and as live events.
+
+Every write to an order moves Order.updated_at, so the orders changed since
+a point in time are one range read over the (updated_at, id) index.
+read_changes() pages through them; the transactions change feed serves it
+to clients that poll.
+
+OrderEventHub pushes the same changes to manager consoles connected to the
+live order stream. One poller task per process reads the changes and fans
+them out to every connected console, so the number of consoles does not
+change the database load. Code that writes an order calls
+notify_order_change(), which wakes the poller as soon as the write commits;
+writes made in another process (another web worker, the SMS reader, the
+order worker) are picked up within LIVE_ORDERS_POLL_INTERVAL seconds.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import Order
+
+logger = logging.getLogger(__name__)
+
+# Orders are stamped with updated_at before their transaction commits, so a
+# slow writer can commit a stamp older than changes a reader has already
+# seen. Feed positions never pass now minus this lag, so such an order is
+# still read later; readers see some changes twice.
+CHANGES_LAG = timedelta(seconds=5)
+
+# Fields of an order in feed responses and events
+ORDER_FIELDS = ('id', 'order_id', 'student_id', 'name', 'date_created', 'total_amount',
+                'status', 'payment_method')
+
+# Orders the hub remembers, to tell new orders and repeats from changes
+SEEN_LIMIT = 2000
+# Events a console may fall behind by before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 256
+# Orders read from the feed per query
+READ_PAGE_SIZE = 500
+
+
+def order_row(row):
+    """Format an order's ORDER_FIELDS values for a JSON response."""
+    return {
+        'order_id': row['order_id'],
+        'student_id': row['student_id'],
+        'name': row['name'],
+        'date': int(row['date_created'].timestamp() * 1000),
+        'total': float(row['total_amount']),
+        'status': row['status'],
+        'payment_method': row['payment_method'],
+    }
+
+
+def changes_floor():
+    """The newest feed position every write before it has committed at."""
+    return timezone.now() - CHANGES_LAG, 0
+
+
+def read_changes(since, limit):
+    """
+    Read the orders changed after a feed position, oldest change first.
+
+    Args:
+        since: Tuple of (updated_at, id) to read after
+        limit: Most orders to return
+
+    Returns:
+        Tuple of (rows, position, has_more): rows are dictionaries of
+        ORDER_FIELDS plus updated_at, position is where the next read starts
+        and has_more is True when the read stopped at limit
+    """
+    updated_at, pk = since
+    # A range rather than an OR, so the (updated_at, id) index seeks to it
+    rows = list(
+        Order.objects.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, id__lte=pk)
+        .order_by('updated_at', 'id')
+        .values(*ORDER_FIELDS, 'updated_at')[:limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Resume after the last change read, but never past the lag floor;
+    # changes after the floor may be read again
+    floor = changes_floor()
+    last = (rows[-1]['updated_at'], rows[-1]['id']) if rows else floor
+    return rows, max(since, min(last, floor)), has_more
+
+
+class OrderEventHub:
+    """
+    Fan order changes out to the live streams of this process.
+
+    Subscribers are asyncio queues on the server's event loop; each receives
+    (event, data) pairs where event is 'order_created', 'order_status' or
+    'order_updated' and data is an order_row(). A subscriber that falls too
+    far behind receives a single ('resync', None) instead.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._subscribers = set()
+        self._wake = None
+        self._task = None
+        self._seen = OrderedDict()
+        self._started = None
+
+    def subscribe(self):
+        """Return a new subscriber queue; call from the event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First subscriber, or the previous loop has gone away
+            self._reset(loop)
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None:
+            self._task = loop.create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue):
+        """Stop delivering to a queue; the poller stops with the last one."""
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._wake is not None:
+            self._wake.set()
+
+    def notify(self):
+        """Wake the poller now. Safe to call from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:
+            # The loop closed after the check above
+            pass
+
+    def _reset(self, loop):
+        self._loop = loop
+        self._subscribers = set()
+        self._wake = asyncio.Event()
+        self._task = None
+        self._seen.clear()
+        self._started = None
+
+    async def _run(self):
+        position = changes_floor()
+        self._started = position[0]
+        try:
+            while self._subscribers:
+                try:
+                    rows, position = await sync_to_async(self._read)(position)
+                except Exception:
+                    logger.exception("Reading order changes for live streams failed")
+                    rows = []
+                self._publish(self._events(rows))
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.LIVE_ORDERS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+        finally:
+            self._task = None
+
+    def _read(self, position):
+        # Runs outside any request, so drop connections the database closed
+        close_old_connections()
+        rows = []
+        while True:
+            page, position, has_more = read_changes(position, READ_PAGE_SIZE)
+            rows.extend(page)
+            if not has_more:
+                return rows, position
+            # A page reaching past the lag floor leaves the position at the
+            # floor, so reading again would return the same changes. The
+            # rest is read on a later poll, once the floor has moved on.
+            if (page[-1]['updated_at'], page[-1]['id']) > position:
+                return rows, position
+
+    def _events(self, rows):
+        events = []
+        for row in rows:
+            previous = self._seen.pop(row['order_id'], None)
+            self._seen[row['order_id']] = (row['updated_at'], row['status'])
+            if previous is not None and previous[0] == row['updated_at']:
+                # Read again because of the lag floor
+                continue
+            if previous is None and row['date_created'] >= self._started:
+                event = 'order_created'
+            elif previous is None or previous[1] != row['status']:
+                event = 'order_status'
+            else:
+                event = 'order_updated'
+            events.append((event, order_row(row)))
+
+        while len(self._seen) > SEEN_LIMIT:
+            self._seen.popitem(last=False)
+        return events
+
+    def _publish(self, events):
+        for queue in list(self._subscribers):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Replace the backlog with one resync request
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(('resync', None))
+                    break
+
+
+hub = OrderEventHub()
+
+
+def notify_order_change():
+    """Tell this process's live streams about an order write once it commits."""
+    transaction.on_commit(hub.notify)
@@ -0,0 +1,124 @@
+"""
+Server-side order ID allocation.
+
+Order IDs used to be generated in the browser as 'CMS-' plus six random
+digits, so two checkouts could pick the same ID and one of them failed on
+the order_id unique constraint. IDs now come from the OrderIdSequence row.
+
+Each worker process reserves a block of ORDER_ID_BLOCK_SIZE values with one
+UPDATE and hands them out from memory, so most allocations need no database
+round trip. Values left in a block when a process exits are simply never
+used.
+
+IDs keep the CMS-XXXXXX format that sms_parsing.sms_reader matches. The six
+digits are the counter modulo 1,000,000. When a block is reserved, numbers
+already taken by existing orders are skipped; that covers the random IDs
+issued before this allocator and the counter wrapping around. Once every
+number is taken, allocation raises OrderIdsExhausted instead of searching
+forever.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import Order, OrderIdSequence
+
+ORDER_ID_PREFIX = 'CMS-'
+ORDER_ID_DIGITS = 6
+ORDER_ID_SPACE = 10 ** ORDER_ID_DIGITS
+SEQUENCE_NAME = 'order_id'
+
+
+class OrderIdsExhausted(Exception):
+    """Raised when every CMS-XXXXXX order ID is taken by an existing order."""
+
+
+def format_order_id(value):
+    """Format a counter value as a CMS-XXXXXX order ID."""
+    return f"{ORDER_ID_PREFIX}{value % ORDER_ID_SPACE:0{ORDER_ID_DIGITS}d}"
+
+
+def reserve_block(size, sequence_name=SEQUENCE_NAME):
+    """
+    Reserve the next block of counter values.
+
+    The increment is the first write in the transaction, so concurrent
+    reservations serialize on the sequence row and never overlap.
+
+    Args:
+        size: Number of values to reserve
+        sequence_name: Name of the OrderIdSequence row
+
+    Returns:
+        range of reserved counter values
+    """
+    with transaction.atomic():
+        updated = OrderIdSequence.objects.filter(name=sequence_name).update(
+            next_value=F('next_value') + size
+        )
+        if not updated:
+            # First use: create the row, then retry the increment so two
+            # processes starting at once still get disjoint blocks
+            OrderIdSequence.objects.get_or_create(name=sequence_name)
+            OrderIdSequence.objects.filter(name=sequence_name).update(
+                next_value=F('next_value') + size
+            )
+        end = OrderIdSequence.objects.values_list('next_value', flat=True).get(name=sequence_name)
+    return range(end - size, end)
+
+
+class OrderIdAllocator:
+    """Hands out order IDs from blocks reserved in the database."""
+
+    def __init__(self, block_size=None, sequence_name=SEQUENCE_NAME):
+        self.block_size = block_size or getattr(settings, 'ORDER_ID_BLOCK_SIZE', 100)
+        self.sequence_name = sequence_name
+        self.blocks_reserved = 0
+        self._ids = deque()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        # A wrapped-around block can collide with IDs that are all taken, so
+        # keep reserving until at least one free ID turns up, but give up
+        # once a whole cycle of the counter has been tried
+        reserved = 0
+        while not self._ids:
+            if reserved >= ORDER_ID_SPACE:
+                raise OrderIdsExhausted(
+                    f"All {ORDER_ID_SPACE} {ORDER_ID_PREFIX} order IDs are taken by existing orders"
+                )
+            block = reserve_block(self.block_size, self.sequence_name)
+            reserved += len(block)
+            self.blocks_reserved += 1
+            candidates = [format_order_id(value) for value in block]
+            taken = set(Order.objects.filter(order_id__in=candidates).values_list('order_id', flat=True))
+            self._ids.extend(order_id for order_id in candidates if order_id not in taken)
+
+    def allocate(self):
+        """
+        Return the next unused order ID.
+
+        Raises:
+            OrderIdsExhausted: If no order ID is free
+        """
+        with self._lock:
+            if not self._ids:
+                self._refill()
+            return self._ids.popleft()
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def allocate_order_id():
+    """Allocate an order ID from the process-wide allocator."""
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = OrderIdAllocator()
+    return _allocator.allocate()
@@ -0,0 +1,101 @@
+"""
+Keyset (cursor) pagination over orders.
+
+Order history used to be returned in full, so response size and time grew
+with every order a student placed. Pages are now read newest first on
+(date_created, id): a cursor encodes the last row of the previous page and
+the next page starts strictly after it. Unlike OFFSET, each page costs the
+same however deep into the history it is, and orders placed while paging
+cannot shift rows between pages.
+"""
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor parameter cannot be decoded."""
+
+
+def encode_cursor(date_created, pk):
+    """Encode the position of an order as an opaque URL-safe cursor."""
+    raw = f"{date_created.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        Tuple of (date_created, id)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_text, pk = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(date_text), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a limit parameter, clamped to 1..maximum."""
+    try:
+        size = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def keyset_queryset(queryset, cursor=None):
+    """
+    Order a queryset newest first, starting after cursor if one is given.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    if cursor:
+        date_created, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date_created__lt=date_created) | Q(date_created=date_created, id__lt=pk))
+    return queryset.order_by('-date_created', '-id')
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, fields=None):
+    """
+    Read one page of orders, newest first.
+
+    Args:
+        queryset: Order queryset to page through
+        cursor: Cursor from the previous page, or None for the first page
+        limit: Number of orders per page
+        fields: Optional field names; rows are returned as values() dicts
+            (which must include id and date_created) instead of models
+
+    Returns:
+        Tuple of (rows, next cursor or None when this is the last page)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    queryset = keyset_queryset(queryset, cursor)
+    if fields:
+        queryset = queryset.values(*fields)
+
+    # One extra row tells whether another page exists
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    if fields:
+        return rows, encode_cursor(last['date_created'], last['id'])
+    return rows, encode_cursor(last.date_created, last.id)
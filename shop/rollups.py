@@ -0,0 +1,238 @@
+"""
+Daily sales rollups.
+
+DailySales holds the orders, items and revenue of each local day, payment
+method and status; DailyItemSales holds the quantity and revenue of each
+menu item per day and status. Both are updated in the transaction that
+writes an order (record_order) or changes its status (save_order_status),
+so a report for a day, a week or a month sums a few hundred rollup rows
+instead of reading every order in the period.
+
+A write costs two queries per table whatever the rows' state: an INSERT
+that skips rows which already exist creates any missing ones empty, then
+one UPDATE adds to every row the write touches. Rows are never read and
+written back, so concurrent writers cannot lose each other's changes, and
+a row created by one of them is simply skipped by the other's INSERT.
+
+Orders written any other way (bulk seeding, edits in the admin, deleting
+orders) are brought back in step with rebuild_rollups(), which recomputes
+whole days from the orders; the rebuild_rollups command runs it on demand.
+Migration 0021 backfilled the orders that existed when it ran.
+"""
+import operator
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import reduce
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyItemSales, DailySales, Order, OrderItem
+from .totals import TOTAL_FIELD
+
+# Fields that identify a row of each rollup table
+SALES_KEY = ('date', 'payment_method', 'status')
+ITEM_KEY = ('date', 'name', 'status')
+
+# Rows per INSERT when rebuilding
+REBUILD_BATCH_SIZE = 1000
+
+
+def is_delivery(payment_method, has_delivery_info):
+    """Whether an order counts as a classroom delivery in the rollups."""
+    return has_delivery_info or 'classroom_delivery' in (payment_method or '').lower()
+
+
+def _order_changes(order, lines, delivery, status, sign):
+    """An order's contribution to the rollups under a status, as (sales, items) changes."""
+    day = timezone.localdate(order.date_created)
+    sales = {(day, order.payment_method or '', status): {
+        'order_count': sign,
+        'item_count': sign * order.item_count,
+        'delivery_count': sign if delivery else 0,
+        'revenue': sign * Decimal(order.total_amount),
+    }}
+    items = defaultdict(lambda: {'quantity': 0, 'revenue': Decimal('0')})
+    for name, price, quantity in lines:
+        row = items[day, name, status]
+        row['quantity'] += sign * quantity
+        row['revenue'] += sign * Decimal(price) * quantity
+    return sales, dict(items)
+
+
+def _merge(changes, more):
+    for key, deltas in more.items():
+        if key in changes:
+            changes[key] = {field: value + deltas[field] for field, value in changes[key].items()}
+        else:
+            changes[key] = deltas
+    return changes
+
+
+def _add(model, key_fields, changes):
+    """
+    Add to rollup rows, creating the ones that do not exist yet.
+
+    Args:
+        model: DailySales or DailyItemSales
+        key_fields: Names of the fields that identify a row
+        changes: Dictionary mapping key tuples to {field: amount to add}
+    """
+    changes = {key: deltas for key, deltas in changes.items() if any(deltas.values())}
+    if not changes:
+        return
+    model.objects.bulk_create([model(**dict(zip(key_fields, key))) for key in changes], ignore_conflicts=True)
+
+    # One UPDATE for every row, each adding its own amounts
+    matches = {key: Q(**dict(zip(key_fields, key))) for key in changes}
+    model.objects.filter(reduce(operator.or_, matches.values())).update(**{
+        field: F(field) + Case(
+            *[When(match, then=Value(changes[key][field])) for key, match in matches.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+        for field in next(iter(changes.values()))
+    })
+
+
+def record_order(order, lines, delivery=False):
+    """
+    Add a new order to the rollups.
+
+    Call inside the transaction that writes the order, so both commit or
+    neither does.
+
+    Args:
+        order: The Order just created, with its stored totals
+        lines: Iterable of (name, price, quantity) for its items
+        delivery: True if the order was written with delivery details
+    """
+    sales, items = _order_changes(order, lines, is_delivery(order.payment_method, delivery), order.status, 1)
+    _add(DailySales, SALES_KEY, sales)
+    _add(DailyItemSales, ITEM_KEY, items)
+
+
+def record_status_change(order, old_status):
+    """
+    Move an order's figures in the rollups from old_status to its status.
+
+    Call inside the transaction that saves the new status. Costs one query
+    for the order's items and delivery record, then two per table.
+    """
+    if order.status == old_status:
+        return
+    rows = list(Order.objects.filter(pk=order.pk).values_list(
+        'delivery_info__id', 'items__name', 'items__price', 'items__quantity'
+    ))
+    delivery = is_delivery(order.payment_method, any(row[0] is not None for row in rows))
+    lines = [row[1:] for row in rows if row[1] is not None]
+
+    old_sales, old_items = _order_changes(order, lines, delivery, old_status, -1)
+    new_sales, new_items = _order_changes(order, lines, delivery, order.status, 1)
+    _add(DailySales, SALES_KEY, _merge(old_sales, new_sales))
+    _add(DailyItemSales, ITEM_KEY, _merge(old_items, new_items))
+
+
+def save_order_status(order):
+    """
+    Save an order whose status was changed, moving its rollups with it.
+
+    The order's stored status is read under a row lock, so two concurrent
+    changes cannot both move the order out of the same status.
+    """
+    with transaction.atomic():
+        old_status = Order.objects.select_for_update().values_list('status', flat=True).get(pk=order.pk)
+        order.save()
+        record_status_change(order, old_status)
+
+
+def day_start(day):
+    """The aware datetime a local date begins at."""
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def for_days(queryset, first=None, last=None):
+    """
+    Restrict a rollup queryset to a range of local dates.
+
+    Args:
+        queryset: DailySales or DailyItemSales rows
+        first: First date to include; None leaves the range open
+        last: Last date to include; None leaves the range open
+    """
+    if first is not None:
+        queryset = queryset.filter(date__gte=first)
+    if last is not None:
+        queryset = queryset.filter(date__lte=last)
+    return queryset
+
+
+def rebuild_rollups(first=None, last=None):
+    """
+    Recompute the rollups of a range of days from the orders.
+
+    The days' rows are deleted and written again in one transaction. Order
+    writes that commit while a rebuild runs may be missed or counted
+    twice, so rebuild days that are still taking orders at a quiet time.
+
+    Args:
+        first: First local date to rebuild; None starts at the first order
+        last: Last local date to rebuild; None ends at the last order
+
+    Returns:
+        Tuple of the DailySales and DailyItemSales rows written
+    """
+    orders = Order.objects.order_by()
+    if first is not None:
+        orders = orders.filter(date_created__gte=day_start(first))
+    if last is not None:
+        orders = orders.filter(date_created__lt=day_start(last + timedelta(days=1)))
+
+    # TruncDate groups by the local date of the current time zone
+    sales = (
+        orders.annotate(day=TruncDate('date_created'), method=Coalesce('payment_method', Value('')))
+        .values('day', 'method', 'status')
+        .annotate(
+            order_count=Count('id'),
+            item_count=Sum('item_count'),
+            delivery_count=Count('id', filter=Q(delivery_info__isnull=False)
+                                 | Q(payment_method__icontains='classroom_delivery')),
+            revenue=Sum('total_amount'),
+        )
+    )
+    # Rows are created in order of first sale, which reports use to break ties
+    items = (
+        OrderItem.objects.filter(order__in=orders.values('id'))
+        .annotate(day=TruncDate('order__date_created'))
+        .values('day', 'name', 'order__status')
+        # revenue first: once annotated, quantity names the sum
+        .annotate(revenue=Sum(F('price') * F('quantity'), output_field=TOTAL_FIELD),
+                  quantity=Sum('quantity'), first_id=Min('id'))
+        .order_by('first_id')
+    )
+
+    with transaction.atomic():
+        for model in (DailySales, DailyItemSales):
+            for_days(model.objects.all(), first, last).delete()
+        written_sales = DailySales.objects.bulk_create([
+            DailySales(date=row['day'], payment_method=row['method'], status=row['status'],
+                       order_count=row['order_count'], item_count=row['item_count'],
+                       delivery_count=row['delivery_count'], revenue=row['revenue'])
+            for row in sales
+        ], batch_size=REBUILD_BATCH_SIZE)
+        written_items = DailyItemSales.objects.bulk_create([
+            DailyItemSales(date=row['day'], name=row['name'], status=row['order__status'],
+                           quantity=row['quantity'], revenue=row['revenue'])
+            for row in items
+        ], batch_size=REBUILD_BATCH_SIZE)
+    return len(written_sales), len(written_items)
+
+
+def rebuild_order_days(*times):
+    """Rebuild the days some order times fall on, from the first to the last."""
+    days = [timezone.localdate(value) for value in times if value is not None]
+    if days:
+        rebuild_rollups(min(days), max(days))
@@ -1,5 +1,10 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Order, OrderItem
+from .models import Order, OrderItem, ShopUser
+from .totals import totals_for_lines
+from .order_events import notify_order_change
+from .rollups import record_order
+from .user_cache import bump_order_owner
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,12 +17,26 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['order_id', 'student_id', 'items']
+        # Allocated on the server when the client does not send one
+        extra_kwargs = {'order_id': {'required': False}}
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
+        if validated_data.get('user_id') is None:
+            # Not logged in: link the order to the student it names
+            validated_data['user_id'] = ShopUser.id_for_name(validated_data['student_id'])
+        validated_data['total_amount'], validated_data['item_count'] = totals_for_lines(
+            (item_data['price'], item_data['quantity']) for item_data in items_data
+        )
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, **item_data) for item_data in items_data
+            ])
+            record_order(order, [
+                (item_data['name'], item_data['price'], item_data['quantity']) for item_data in items_data
+            ])
         
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
-            
+        bump_order_owner(order.user_id, order.student_id)
+        notify_order_change()
         return order
\ No newline at end of file
@@ -30,7 +30,9 @@ AOS.init({
 // Global state variables
 let cart = [];
 let orderHistory = [];
+let orderHistoryHasMore = false; // Server has older orders than those loaded
 let inventoryData = {}; // Add this line to store inventory data
+let inventoryEtag = null; // ETag of inventoryData; refetches get 304 when unchanged
 
 /********************************************
  * DOM ELEMENT SELECTORS
@@ -73,15 +75,25 @@ function fetchInventoryData() {
   //console.log('Fetching inventory data from server...');
   
   //fetching data from the dashboard public API the stock qty
-  return fetch('/dashboard/api/public-items/')
+  // The server answers 304 when stock is unchanged since inventoryEtag
+  const headers = inventoryEtag ? { 'If-None-Match': inventoryEtag } : {};
+  return fetch('/dashboard/api/public-items/', { headers, cache: 'no-store' })
     .then(response => {
+      if (response.status === 304) {
+        return null;
+      }
       if (!response.ok) {
         throw new Error(`Server returned ${response.status}: ${response.statusText}`);
       }
+      inventoryEtag = response.headers.get('ETag');
       return response.json();
     })
     .then(data => {
       //console.log('Inventory data loaded:', data);
+      if (data === null) {
+        // Not modified: inventoryData is still current
+        return { items: Object.values(inventoryData) };
+      }
       
       // Convert array to object with name as key for easy lookup
       inventoryData = {};
@@ -360,6 +372,7 @@ function saveCartToStorage() {
  */
 function saveOrderHistoryToStorage() {
   localStorage.setItem('orderHistory', JSON.stringify(orderHistory));
+  localStorage.setItem('orderHistoryHasMore', JSON.stringify(orderHistoryHasMore));
 }
 
 /**
@@ -642,17 +655,6 @@ function formatDate(date) {
 
 
 
-/**
- * Generate a unique order ID
- * @returns {string} Order ID
- */
-function generateOrderId() {
-  return 'CMS-' + Math.floor(100000 + Math.random() * 900000);
-}
-// function generateOrderId() {
-//   return 'lrv-cms-' + Math.floor(100000 + Math.random() * 900000);
-// }
-
 function getCSRFToken() {
   const cookieValue = document.cookie
     .split('; ')
@@ -699,11 +701,8 @@ function processCheckout() {
         return;
       }
       
-      const orderId = generateOrderId();
-      
-      // Prepare order data
+      // Prepare order data; the server allocates the order ID
       const orderData = {
-        order_id: orderId,
         student_id: studentId.trim(),
         items: cart.map(item => ({
           name: item.name,
@@ -741,6 +740,7 @@ function processCheckout() {
       })
       .then(data => {
         //console.log("Order submitted successfully:", data);
+        const orderId = data.order_id;
         
         // Update inventory quantities
         return updateInventoryAfterCheckout()
@@ -799,18 +799,17 @@ function updateInventoryAfterCheckout() {
       return Promise.resolve(); // Skip if not found
     }
     
-    const newQuantity = Math.max(0, inventoryItem.quantity - item.quantity);
-    //console.log(`Updating "${item.name}" (ID: ${inventoryItem.id}): ${inventoryItem.quantity} → ${newQuantity}`);
-    
-    return fetch(`/dashboard/api/items/${inventoryItem.id}/update/`, {
-      method: 'PUT',
+    // Let the server decrement stock atomically instead of writing back a
+    // quantity computed here, which loses updates under concurrent checkouts
+    return fetch('/managepayments/api/update-inventory/', {
+      method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'X-CSRFToken': getCSRFToken()
       },
       body: JSON.stringify({
-        ...inventoryItem,
-        quantity: newQuantity
+        itemName: inventoryItem.name,
+        quantity: item.quantity
       }),
       credentials: 'same-origin'
     })
@@ -824,7 +823,7 @@ function updateInventoryAfterCheckout() {
       return response.json();
     })
     .then(data => {
-      //console.log(`Successfully updated inventory for "${item.name}": ${data.quantity} remaining`);
+      //console.log(`Successfully updated inventory for "${item.name}": ${data.remaining} remaining`);
       return data;
     });
   });
@@ -892,7 +891,7 @@ function updateOrderHistory() {
   });
 
   // Add "View More" button if there are more than 3 orders
-  if (orderHistory.length > 3) {
+  if (orderHistory.length > 3 || orderHistoryHasMore) {
     const viewMoreDiv = document.createElement('div');
     viewMoreDiv.className = 'view-more-container';
     viewMoreDiv.innerHTML = `
@@ -1131,14 +1130,25 @@ function loadOrderHistory() {
   //onsole.log('Loading order history from shop.models.Order database...');
   
   // First load from localStorage for immediate display
-  if (localStorage.getItem('orderHistory')) {
-    orderHistory = JSON.parse(localStorage.getItem('orderHistory'));
+  const storedHistory = localStorage.getItem('orderHistory');
+  if (storedHistory) {
+    orderHistory = JSON.parse(storedHistory);
+    orderHistoryHasMore = JSON.parse(localStorage.getItem('orderHistoryHasMore') || 'false');
     updateOrderHistory(); // Show cached data immediately
   }
   
-  // Then fetch from shop app's order endpoint
-  fetch('/shop/api/get-order-history/')
+  // Then fetch the most recent page from shop app's order endpoint; only
+  // three orders are shown here and the full history has its own page.
+  // Sending the ETag of the stored copy gets 304 when nothing changed.
+  const storedEtag = localStorage.getItem('orderHistoryEtag');
+  const headers = storedHistory && storedEtag ? { 'If-None-Match': storedEtag } : {};
+  let responseEtag = null;
+  fetch('/shop/api/get-order-history/?limit=3', { headers, cache: 'no-store' })
     .then(response => {
+      if (response.status === 304) {
+        return { orders: [] };  // localStorage data is current
+      }
+      responseEtag = response.headers.get('ETag');
       if (!response.ok) {
         console.warn(`Server returned ${response.status}: ${response.statusText}`);
         // Don't throw error, just continue using localStorage data
@@ -1150,13 +1160,14 @@ function loadOrderHistory() {
       //console.log('Order history from shop.models.Order:', data);
       
       // Check if data is valid and contains orders
-      if (!data || !Array.isArray(data) || data.length === 0) {
+      if (!data || !Array.isArray(data.orders) || data.orders.length === 0) {
         //console.log('No orders found in database, using localStorage data');
         return; // No server data, keep using localStorage
       }
+      orderHistoryHasMore = Boolean(data.next_cursor);
       
       // Create a new order history array from database data
-      const dbOrderHistory = data.map(serverOrder => {
+      const dbOrderHistory = data.orders.map(serverOrder => {
         try {
           // Convert date format if needed
           const serverDate = typeof serverOrder.date === 'number' 
@@ -1184,6 +1195,9 @@ function loadOrderHistory() {
         
         // Update localStorage with database data
         saveOrderHistoryToStorage();
+        if (responseEtag) {
+          localStorage.setItem('orderHistoryEtag', responseEtag);
+        }
         
         // Update the UI
         updateOrderHistory();
@@ -0,0 +1,613 @@
+import re
+from datetime import datetime, timedelta
+from importlib import import_module
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipIf
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from cafeteria_management_system.query_budget import MENU, QueryBudgetMixin
+from dashboard.models import InventoryItem
+from managepayments.models import DeliveryInfo
+from managepayments.services import write_order
+from shop.middleware import get_shop_user
+from shop.models import DailyItemSales, DailySales, Order, OrderIdSequence, OrderItem, ShopUser
+from shop.order_events import CHANGES_LAG, OrderEventHub
+from shop.order_ids import ORDER_ID_SPACE, OrderIdAllocator, OrderIdsExhausted, format_order_id, reserve_block
+from shop.user_cache import get_identity_version
+from shop.rollups import rebuild_rollups, save_order_status
+from shop.totals import mismatched_totals, refresh_totals
+from shop.views import _render_history_rows
+
+
+class ShopQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """The customer's order history must cost the same for 5 orders or 25."""
+
+    def setUp(self):
+        self.user = self.create_shop_user()
+        self.login_shop_user(self.user)
+        self.seed_orders(5, user=self.user)
+        self.reset_process_state()
+
+    def grow_user_orders(self):
+        self.seed_orders(20, user=self.user)
+
+    def test_cafe_page(self):
+        self.assertQueryBudget(1, lambda: self.client.get(reverse('shop:cafe')))
+
+    def test_order_history_api(self):
+        url = reverse('shop:get_order_history')
+        response = self.assertQueryBudget(
+            4, lambda: self.client.get(url, {'limit': 10}), grow=self.grow_user_orders
+        )
+        self.assertEqual(len(response.json()['orders']), 10)
+
+        # Walk every page: the same budget holds deep into the history and no
+        # order is skipped or repeated
+        seen = []
+        cursor = None
+        while True:
+            with self.assertMaxQueries(4):
+                page = self.client.get(url, {'limit': 10, **({'cursor': cursor} if cursor else {})}).json()
+            seen.extend(order['orderId'] for order in page['orders'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        dates = [order['date'] for order in self.client.get(url, {'limit': 100}).json()['orders']]
+        self.assertEqual(dates, sorted(dates, reverse=True))
+
+    def test_order_history_api_invalid_cursor(self):
+        response = self.client.get(reverse('shop:get_order_history'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_history_page(self):
+        self.grow_user_orders()
+        # Session, one page of orders and, on a cold cache, their items; the
+        # user comes from the session
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('shop:history'))
+        self.assertEqual(len(response.context['order_rows']), 20)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+        # The rendered page is cached, so only the session is read
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('shop:history'))
+        self.assertEqual(len(response.context['order_rows']), 20)
+
+    def test_order_history_more(self):
+        self.grow_user_orders()
+        response = self.client.get(reverse('shop:history'))
+        html = ''.join(response.context['order_rows'])
+        cursor = response.context['next_cursor']
+        while cursor:
+            with self.assertMaxQueries(3):
+                page = self.client.get(reverse('shop:history_more'), {'cursor': cursor}).json()
+            html += page['html']
+            cursor = page['next_cursor']
+        self.assertEqual(html.count('class="order-details-panel"'), 25)
+
+    def test_order_history_follows_status_changes(self):
+        order = Order.objects.filter(name=self.user.name).first()
+        self.client.get(reverse('shop:history'))
+
+        # The manager's status update invalidates the cached page, and the
+        # changed order's fragment is keyed by its new status
+        self.login_manager()
+        self.client.post(reverse('transactions:update_order_status', args=[order.order_id]),
+                         {'status': 'successful'}, content_type='application/json')
+        response = self.client.get(reverse('shop:history'))
+        self.assertContains(response, 'order-status status-successful', count=1)
+
+    def test_history_fragments_are_versioned(self):
+        orders = list(Order.objects.filter(name=self.user.name))
+        rows = _render_history_rows(orders)
+        with self.assertMaxQueries(0):
+            self.assertEqual(_render_history_rows(orders), rows)
+        # Rows cached by an earlier release are not served after a bump
+        with mock.patch('shop.views.HISTORY_FRAGMENT_VERSION', 2), self.assertMaxQueries(1):
+            self.assertEqual(len(_render_history_rows(orders)), 5)
+
+    def test_history_fragments_follow_total_changes(self):
+        order = Order.objects.filter(name=self.user.name).first()
+        _render_history_rows([order])
+        # An admin edit to the items changes the total but not the status
+        OrderItem.objects.filter(order=order).update(quantity=7)
+        refresh_totals(Order.objects.filter(pk=order.pk))
+        order.refresh_from_db()
+        [row] = _render_history_rows([order])
+        self.assertIn(f"{order.total_amount:.2f}", row)
+
+    def test_cached_history_api(self):
+        url = reverse('shop:get_order_history')
+        self.assertEqual(len(self.client.get(url).json()['orders']), 5)
+        # Only the session and the ETag aggregate are read for a cached page
+        with self.assertMaxQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()['orders']), 5)
+
+        # A poll with the current ETag is not even serialized
+        with self.assertMaxQueries(2):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        # A new order invalidates it
+        write_order('CMS-100002', self.user.name, self.user.name, 'cash',
+                    [{'name': 'Tea', 'price': 10, 'quantity': 1}], user_id=self.user.id)
+        self.assertEqual(len(self.client.get(url).json()['orders']), 6)
+
+    def test_cached_profile(self):
+        url = reverse('users:profile')
+        self.client.get(url)
+        with self.assertMaxQueries(1):
+            self.client.get(url)
+        self.client.post(url, {'user-name': 'Asha R', 'email': 'asha@example.com'})
+        self.assertEqual(self.client.get(url).context['profile'].name, 'Asha R')
+
+    def test_save_order(self):
+        cart = [{'name': MENU[0][0], 'price': str(MENU[0][1]), 'quantity': 1}]
+
+        def save():
+            response = self.client.post(reverse('shop:save_order'), {
+                'student_id': self.user.name,
+                'items': cart,
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+        def grow_cart():
+            cart[:] = [{'name': name, 'price': str(price), 'quantity': 2} for name, price in MENU]
+
+        self.assertQueryBudget(10, save, grow=grow_cart)
+
+
+class OrderTotalsTests(QueryBudgetMixin, TestCase):
+    """Stored order totals must match the items they were written with."""
+
+    def setUp(self):
+        self.reset_process_state()
+
+    def test_write_order_stores_totals(self):
+        order = write_order('CMS-100001', 'asha', 'asha', 'cash', [
+            {'name': 'Samosa', 'price': 15.5, 'quantity': 3},
+            {'name': 'Tea', 'price': '10.00', 'quantity': 2},
+        ])
+        order.refresh_from_db()
+        self.assertEqual(order.total_amount, Decimal('66.50'))
+        self.assertEqual(order.item_count, 5)
+        self.assertEqual(list(mismatched_totals(Order.objects.all())), [])
+
+    def test_seeded_orders_are_consistent(self):
+        self.seed_orders(10)
+        self.assertEqual(list(mismatched_totals(Order.objects.all())), [])
+
+    def test_check_order_totals_fixes_stale_rows(self):
+        order = self.seed_orders(3)[0]
+        OrderItem.objects.filter(order=order).update(quantity=7)
+
+        output = StringIO()
+        call_command('check_order_totals', stdout=output)
+        self.assertIn(order.order_id, output.getvalue())
+
+        call_command('check_order_totals', '--fix', stdout=StringIO())
+        order.refresh_from_db()
+        self.assertEqual(order.item_count, 21)
+        self.assertEqual(list(mismatched_totals(Order.objects.all())), [])
+
+        # The rollups of the order's day are recomputed with the new totals
+        sales = DailySales.objects.aggregate(items=Sum('item_count'), revenue=Sum('revenue'))
+        orders = Order.objects.aggregate(items=Sum('item_count'), revenue=Sum('total_amount'))
+        self.assertEqual(sales, orders)
+        self.assertEqual(DailyItemSales.objects.aggregate(Sum('quantity'))['quantity__sum'],
+                         OrderItem.objects.aggregate(Sum('quantity'))['quantity__sum'])
+
+
+class DailySalesRollupTests(QueryBudgetMixin, TestCase):
+    """The daily sales rollups follow order writes and status changes."""
+
+    def setUp(self):
+        self.reset_process_state()
+        self.today = timezone.localdate()
+
+    def snapshot(self):
+        sales = DailySales.objects.filter(order_count__gt=0).order_by('date', 'payment_method', 'status')
+        items = DailyItemSales.objects.filter(quantity__gt=0).order_by('date', 'name', 'status')
+        return (
+            list(sales.values_list('date', 'payment_method', 'status', 'order_count', 'item_count',
+                                   'delivery_count', 'revenue')),
+            list(items.values_list('date', 'name', 'status', 'quantity', 'revenue')),
+        )
+
+    def test_write_order_adds_to_rollups(self):
+        for order_id in ['CMS-100001', 'CMS-100002']:
+            write_order(order_id, 'asha', 'asha', 'cash', [
+                {'name': 'Samosa', 'price': '15.50', 'quantity': 3},
+                {'name': 'Tea', 'price': '10.00', 'quantity': 2},
+            ])
+        write_order('CMS-100003', 'ravi', 'ravi', 'classroom_delivery',
+                    [{'name': 'Tea', 'price': '10.00', 'quantity': 1}],
+                    delivery_info={'floor_number': '1', 'classroom': 'A101', 'delivery_time': '12:30'})
+
+        sales, items = self.snapshot()
+        self.assertEqual(sales, [
+            (self.today, 'cash', 'pending', 2, 10, 0, Decimal('133.00')),
+            (self.today, 'classroom_delivery', 'pending', 1, 1, 1, Decimal('10.00')),
+        ])
+        self.assertEqual(items, [
+            (self.today, 'Samosa', 'pending', 6, Decimal('93.00')),
+            (self.today, 'Tea', 'pending', 5, Decimal('50.00')),
+        ])
+
+    def test_status_change_moves_rollups(self):
+        order = write_order('CMS-100001', 'asha', 'asha', 'upi', [{'name': 'Tea', 'price': '10.00', 'quantity': 2}])
+        order.status = 'successful'
+        # Locked status read and save, the items, then two queries per table
+        with self.assertMaxQueries(9):
+            save_order_status(order)
+
+        sales, items = self.snapshot()
+        self.assertEqual(sales, [(self.today, 'upi', 'successful', 1, 2, 0, Decimal('20.00'))])
+        self.assertEqual(items, [(self.today, 'Tea', 'successful', 2, Decimal('20.00'))])
+        self.assertFalse(DailySales.objects.filter(status='pending', order_count__gt=0).exists())
+
+    def test_rebuild_matches_incremental(self):
+        self.seed_orders(6)
+        order = write_order('CMS-100001', 'asha', 'asha', 'cash', [{'name': 'Tea', 'price': '10.00', 'quantity': 1}])
+        order.status = 'cancelled'
+        save_order_status(order)
+        incremental = self.snapshot()
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+        # Rebuilding a range leaves the other days alone
+        self.assertEqual(rebuild_rollups(self.today, self.today)[0], len(incremental[0]))
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class HotQueryIndexTests(QueryBudgetMixin, TestCase):
+    """Every hot-path order query is served by an index."""
+
+    def test_explain_hot_queries(self):
+        user = self.create_shop_user()
+        self.seed_orders(5, user=user)
+        output = StringIO()
+        call_command('explain_hot_queries', stdout=output)
+        self.assertNotIn('FULL SCAN', output.getvalue())
+        self.assertNotIn('SORT not served', output.getvalue())
+
+    def test_history_follows_user_link(self):
+        user = self.create_shop_user('Asha')
+        self.seed_orders(2, user=user)
+        # Names on the order no longer decide whose history it is in
+        Order.objects.update(name='someone else', student_id='someone else')
+        self.login_shop_user(user)
+        self.assertEqual(len(self.client.get(reverse('shop:history')).context['order_rows']), 2)
+        self.assertEqual(len(self.client.get(reverse('shop:get_order_history')).json()['orders']), 2)
+
+    def test_orders_without_login_are_linked_by_name(self):
+        user = self.create_shop_user('Asha')
+        order = write_order('CMS-100003', 'ASHA', 'asha', 'cash', [{'name': 'Tea', 'price': 10, 'quantity': 1}])
+        self.assertEqual(order.user_id, user.id)
+
+
+class ShopUserMiddlewareTests(QueryBudgetMixin, TestCase):
+    """request.shop_user comes from the session without user queries."""
+
+    def setUp(self):
+        self.reset_process_state()
+        self.user = self.create_shop_user()
+        self.user.password = make_password('secret')
+        self.user.save()
+
+    def test_login_caches_identity(self):
+        self.client.post(reverse('shop:shop_login'), {'name': 'asha', 'password': 'secret'})
+        self.assertEqual(self.client.session['shop_user'], {
+            'id': self.user.id, 'name': 'asha', 'email': 'asha@example.com',
+            'version': get_identity_version(self.user.id),
+        })
+        # Only the session is read
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('managepayments:checkout'))
+        self.assertEqual(response.context['user_name'], 'asha')
+
+    def test_session_without_identity(self):
+        session = self.client.session
+        session['shop_user_id'] = self.user.id
+        session.save()
+
+        # The user is loaded once, then remembered for later requests
+        self.client.get(reverse('managepayments:checkout'))
+        self.assertEqual(self.client.session['shop_user']['name'], 'asha')
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('managepayments:checkout'))
+
+    def test_deferred_fields_load_on_access(self):
+        self.login_shop_user(self.user)
+        request = RequestFactory().get('/')
+        request.session = self.client.session
+        shop_user = get_shop_user(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(shop_user.name, 'asha')
+        with self.assertNumQueries(1):
+            self.assertEqual(shop_user.phone, '9999999999')
+
+    def test_missing_user(self):
+        self.login_shop_user(self.user)
+        session = self.client.session
+        del session['shop_user']
+        session.save()
+        self.user.delete()
+        self.assertRedirects(self.client.get(reverse('shop:history')), reverse('shop:shop_login'),
+                             fetch_redirect_response=False)
+
+    def test_deleted_user_with_cached_identity(self):
+        deletes = [
+            lambda user: user.delete(),
+            # The admin's bulk action deletes through the queryset
+            lambda user: ShopUser.objects.filter(pk=user.pk).delete(),
+        ]
+        for name, delete in zip(['ravi', 'meera'], deletes):
+            user = self.create_shop_user(name)
+            self.login_shop_user(user)
+            delete(user)
+            self.assertRedirects(self.client.get(reverse('shop:history')), reverse('shop:shop_login'),
+                                 fetch_redirect_response=False)
+            # The session is logged out, so later requests do not look the user up again
+            self.assertNotIn('shop_user_id', self.client.session)
+            self.assertNotIn('shop_user', self.client.session)
+
+    def test_changed_user_with_cached_identity(self):
+        self.login_shop_user(self.user)
+        self.client.get(reverse('managepayments:checkout'))
+
+        self.user.name = 'asha.k'
+        self.user.email = 'asha.k@example.com'
+        self.user.save()
+        # The changed user is loaded once, then only the session is read again
+        response = self.client.get(reverse('managepayments:checkout'))
+        self.assertEqual(response.context['user_name'], 'asha.k')
+        self.assertEqual(self.client.session['shop_user']['email'], 'asha.k@example.com')
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('managepayments:checkout'))
+
+
+class OrderIdAllocatorTests(QueryBudgetMixin, TestCase):
+    """Order IDs are unique across worker processes and skip taken numbers."""
+
+    def test_blocks_are_disjoint(self):
+        self.assertEqual(reserve_block(5, 'test'), range(0, 5))
+        self.assertEqual(reserve_block(3, 'test'), range(5, 8))
+        self.assertEqual(OrderIdSequence.objects.get(name='test').next_value, 8)
+
+    def test_allocators_never_share_ids(self):
+        # Each allocator stands in for a worker process with its own blocks
+        allocators = [OrderIdAllocator(block_size=4, sequence_name='test') for _ in range(3)]
+        ids = [allocator.allocate() for _ in range(10) for allocator in allocators]
+        self.assertEqual(len(set(ids)), 30)
+        self.assertEqual(ids[:3], ['CMS-000000', 'CMS-000004', 'CMS-000008'])
+
+        # The sequence advances by one block per refill, not per ID
+        self.assertEqual([allocator.blocks_reserved for allocator in allocators], [3, 3, 3])
+        self.assertEqual(OrderIdSequence.objects.get(name='test').next_value, 9 * 4)
+
+    def test_allocation_costs_no_queries_within_a_block(self):
+        allocator = OrderIdAllocator(block_size=5, sequence_name='test')
+        allocator.allocate()
+        with self.assertMaxQueries(0):
+            remaining = [allocator.allocate() for _ in range(4)]
+        self.assertEqual(remaining[-1], 'CMS-000004')
+
+    def test_skips_taken_ids(self):
+        for order_id in ['CMS-000001', 'CMS-000002', 'CMS-000004']:
+            write_order(order_id, 'asha', 'asha', 'cash', [{'name': 'Tea', 'price': 10, 'quantity': 1}])
+        allocator = OrderIdAllocator(block_size=3, sequence_name='test')
+        # The second block only holds CMS-000005 free
+        self.assertEqual([allocator.allocate() for _ in range(3)], ['CMS-000000', 'CMS-000003', 'CMS-000005'])
+        self.assertEqual(allocator.blocks_reserved, 2)
+
+    def test_wrapped_counter_keeps_six_digits(self):
+        OrderIdSequence.objects.create(name='test', next_value=ORDER_ID_SPACE - 1)
+        allocator = OrderIdAllocator(block_size=2, sequence_name='test')
+        self.assertEqual([allocator.allocate() for _ in range(2)], ['CMS-999999', 'CMS-000000'])
+
+    def test_exhausted_ids_raise(self):
+        # Shrink the ID space to four numbers, all of them taken
+        with mock.patch('shop.order_ids.ORDER_ID_SPACE', 4):
+            for value in range(4):
+                write_order(format_order_id(value), 'asha', 'asha', 'cash',
+                            [{'name': 'Tea', 'price': 10, 'quantity': 1}])
+            allocator = OrderIdAllocator(block_size=3, sequence_name='test')
+            with self.assertRaises(OrderIdsExhausted):
+                allocator.allocate()
+        # One full cycle of the counter is tried, then no more
+        self.assertEqual(allocator.blocks_reserved, 2)
+
+
+class ConcurrentOrderIdTests(TransactionTestCase):
+    """Allocators in concurrent threads never hand out the same ID."""
+
+    def stress(self, *options):
+        output = StringIO()
+        call_command('stress_order_ids', '--threads', '4', '--allocations', '50', '--block-size', '7',
+                     *options, stdout=output, stderr=StringIO())
+        self.assertIn('Allocated: 200 of 200 IDs, 0 errors', output.getvalue())
+        self.assertIn('Duplicates: 0, malformed: 0', output.getvalue())
+        # The throwaway sequence row is removed
+        self.assertFalse(OrderIdSequence.objects.exists())
+
+    def test_threads_sharing_an_allocator(self):
+        self.stress('--shared')
+
+    @skipIf(connection.vendor == 'sqlite', 'SQLite locks the table against concurrent writers')
+    def test_allocator_per_thread(self):
+        self.stress()
+
+
+class SeedCafeteriaTests(QueryBudgetMixin, TestCase):
+    """seed_cafeteria writes consistent orders and --clear removes only seeded rows."""
+
+    # A regular Wednesday evening, after the last meal window
+    NOW = datetime(2026, 3, 11, 20, 0, tzinfo=ZoneInfo('Asia/Kolkata'))
+
+    def seed(self, *options):
+        output = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            call_command('seed_cafeteria', '--days', '1', '--students', '5', '--orders-per-student', '4',
+                         '--password', 'x', *options, stdout=output)
+        counts = re.search(r'Seeded (\d+) students, (\d+) orders, (\d+) items and (\d+) deliveries',
+                           output.getvalue())
+        return [int(count) for count in counts.groups()]
+
+    def test_seed_and_clear(self):
+        kept = write_order('CMS-100001', 'asha', 'asha', 'cash', [{'name': 'Tea', 'price': 10, 'quantity': 1}])
+
+        students, orders, items, deliveries = self.seed('--seed', '1')
+        self.assertEqual(students, 5)
+        self.assertGreater(orders, 0)
+        seeded = Order.objects.filter(order_id__startswith='SEED-')
+        self.assertEqual(seeded.count(), orders)
+        self.assertEqual(OrderItem.objects.filter(order__in=seeded).count(), items)
+        self.assertEqual(DeliveryInfo.objects.filter(order__in=seeded).count(), deliveries)
+        self.assertEqual(ShopUser.objects.filter(name__startswith='seed-').count(), 5)
+        self.assertEqual(InventoryItem.objects.count(), 12)
+        self.assertFalse(seeded.filter(user__isnull=True).exists())
+        self.assertEqual(list(mismatched_totals(seeded)), [])
+        # The rollups hold the seeded orders besides the one written at checkout
+        self.assertEqual(DailySales.objects.aggregate(Sum('order_count'))['order_count__sum'], orders + 1)
+
+        # A second run reuses the students and continues the order IDs
+        _, more, _, _ = self.seed('--seed', '2')
+        self.assertEqual(seeded.count(), orders + more)
+        self.assertEqual(ShopUser.objects.filter(name__startswith='seed-').count(), 5)
+
+        students, orders, _, _ = self.seed('--seed', '3', '--clear')
+        self.assertEqual(seeded.count(), orders)
+        self.assertEqual(seeded.order_by('order_id').first().order_id, 'SEED-00000001')
+        self.assertTrue(Order.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(DailySales.objects.aggregate(Sum('order_count'))['order_count__sum'], orders + 1)
+
+    def test_rejects_bad_options(self):
+        with self.assertRaises(CommandError):
+            call_command('seed_cafeteria', '--days', '0', stdout=StringIO())
+
+
+class OrderUserBackfillMigrationTests(TransactionTestCase):
+    """Migration 0017 links orders to students and clears dangling ids."""
+
+    before = [('shop', '0016_order_indexes')]
+    after = [('shop', '0017_backfill_order_users')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        apps = self.migrate(self.before)
+        ShopUser = apps.get_model('shop', 'ShopUser')
+        Order = apps.get_model('shop', 'Order')
+        asha = ShopUser.objects.create(name='Asha', email='asha@example.com', phone='1')
+        ravi = ShopUser.objects.create(name='ravi', email='ravi@example.com', phone='2')
+
+        expected = {}
+        for order_id, name, student_id, user_id, linked in [
+            ('CMS-000001', 'ASHA', 'someone', None, asha.id),     # by name, any case
+            ('CMS-000002', 'Guest', 'Ravi', None, ravi.id),       # by student_id
+            ('CMS-000003', 'ravi', 'asha', None, ravi.id),        # the name wins
+            ('CMS-000004', 'asha', 'asha', 999, asha.id),         # dangling id cleared, then matched
+            ('CMS-000005', 'nobody', 'nobody', 998, None),        # dangling id cleared
+            ('CMS-000006', 'ravi', 'ravi', asha.id, asha.id),     # existing links are kept
+            ('CMS-000007', 'nobody', 'nobody', None, None),
+        ]:
+            order = Order.objects.create(order_id=order_id, name=name, student_id=student_id, user_id=user_id)
+            expected[order.id] = linked
+
+        # Small batches, so several id ranges are committed one by one
+        migration = import_module('shop.migrations.0017_backfill_order_users')
+        with mock.patch.object(migration, 'BATCH_SIZE', 3):
+            apps = self.migrate(self.after)
+        orders = apps.get_model('shop', 'Order').objects.all()
+        self.assertEqual(dict(orders.values_list('id', 'user_id')), expected)
+
+
+class DailySalesBackfillMigrationTests(TransactionTestCase):
+    """Migration 0021 computes the rollups of the existing orders."""
+
+    before = [('shop', '0020_order_changes_index'), ('managepayments', '0013_deliveryinfo_shop_order')]
+    after = [('shop', '0021_daily_sales_rollups')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_backfill(self):
+        apps = self.migrate(self.before)
+        Order = apps.get_model('shop', 'Order')
+        OrderItem = apps.get_model('shop', 'OrderItem')
+        DeliveryInfo = apps.get_model('managepayments', 'DeliveryInfo')
+        for order_id, payment_method, status in [
+            ('CMS-000001', 'cash', 'successful'),
+            ('CMS-000002', 'cash', 'successful'),
+            ('CMS-000003', 'classroom_delivery', 'pending'),
+        ]:
+            order = Order.objects.create(order_id=order_id, student_id='asha', payment_method=payment_method,
+                                         status=status, total_amount=Decimal('55.00'), item_count=3)
+            OrderItem.objects.create(order=order, name='Samosa', price=Decimal('15.00'), quantity=1)
+            OrderItem.objects.create(order=order, name='Tea', price=Decimal('20.00'), quantity=2)
+        DeliveryInfo.objects.create(order=order, floor_number='1', classroom='A101', delivery_time='12:30')
+
+        apps = self.migrate(self.after)
+        sales = apps.get_model('shop', 'DailySales').objects.values_list(
+            'payment_method', 'status', 'order_count', 'item_count', 'delivery_count', 'revenue')
+        self.assertEqual(sorted(sales), [
+            ('cash', 'successful', 2, 6, 0, Decimal('110.00')),
+            ('classroom_delivery', 'pending', 1, 3, 1, Decimal('55.00')),
+        ])
+        items = apps.get_model('shop', 'DailyItemSales').objects.values_list('name', 'status', 'quantity', 'revenue')
+        self.assertEqual(sorted(items), [
+            ('Samosa', 'pending', 1, Decimal('15.00')),
+            ('Samosa', 'successful', 2, Decimal('30.00')),
+            ('Tea', 'pending', 2, Decimal('40.00')),
+            ('Tea', 'successful', 4, Decimal('80.00')),
+        ])
+
+
+class OrderEventHubTests(QueryBudgetMixin, TestCase):
+    """The live order poller reads each change once per poll."""
+
+    def test_read_stops_at_the_lag_floor(self):
+        start = (timezone.now() - timedelta(minutes=1), 0)
+        self.seed_orders(12)
+        hub = OrderEventHub()
+        # Every change is newer than the lag floor, so the position cannot
+        # pass the first page; reading on would repeat it
+        with mock.patch('shop.order_events.READ_PAGE_SIZE', 5), self.assertMaxQueries(1):
+            rows, position = hub._read(start)
+        self.assertEqual(len(rows), 5)
+        self.assertLess(position, (rows[-1]['updated_at'], rows[-1]['id']))
+
+        # Once the floor has passed them, the changes are read page by page
+        later = timezone.now() + CHANGES_LAG + timedelta(seconds=1)
+        with mock.patch('shop.order_events.READ_PAGE_SIZE', 5), \
+                mock.patch('django.utils.timezone.now', return_value=later):
+            rows, position = hub._read(start)
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(len({row['id'] for row in rows}), 12)
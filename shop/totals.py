@@ -0,0 +1,92 @@
+"""
+Stored order totals.
+
+Order.total_amount and Order.item_count are written together with the
+order's items (see managepayments.services.write_order), so list views,
+exports and receipts read one column instead of summing items per order.
+The helpers here compute the same figures from the items in the database,
+to recompute the columns after items change and to verify that they agree.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import OrderItem
+
+TOTAL_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+def totals_for_lines(lines):
+    """
+    Compute the stored totals for an order's lines.
+
+    Args:
+        lines: Iterable of (price, quantity) pairs
+
+    Returns:
+        Tuple of (total_amount as Decimal, item_count)
+    """
+    total_amount = Decimal('0.00')
+    item_count = 0
+    for price, quantity in lines:
+        total_amount += Decimal(str(price)) * int(quantity)
+        item_count += int(quantity)
+    return total_amount.quantize(Decimal('0.01')), item_count
+
+
+def with_item_totals(queryset):
+    """Annotate orders with items_total and items_count summed from their items."""
+    return queryset.annotate(
+        items_total=Coalesce(Sum(F('items__price') * F('items__quantity')), Value(Decimal('0')),
+                             output_field=TOTAL_FIELD),
+        items_count=Coalesce(Sum('items__quantity'), Value(0), output_field=IntegerField()),
+    )
+
+
+def refresh_totals(queryset):
+    """
+    Recompute the stored totals of the given orders from their items.
+
+    Runs as a single UPDATE with correlated subqueries.
+
+    Returns:
+        Number of orders updated
+    """
+    item_totals = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    return queryset.order_by().update(
+        total_amount=Coalesce(
+            Subquery(item_totals.annotate(total=Sum(F('price') * F('quantity'))).values('total')),
+            Value(Decimal('0')),
+            output_field=TOTAL_FIELD,
+        ),
+        item_count=Coalesce(
+            Subquery(item_totals.annotate(count=Sum('quantity')).values('count')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+        updated_at=timezone.now(),
+    )
+
+
+def mismatched_totals(queryset, chunk_size=2000):
+    """
+    Yield orders whose stored totals disagree with their items.
+
+    The sums are computed in the database; rows are streamed so any number
+    of orders can be checked.
+
+    Yields:
+        Dictionaries with id, order_id, date_created, the stored
+        total_amount and item_count, and the items_total and items_count
+        from the items
+    """
+    rows = (
+        with_item_totals(queryset.order_by('id'))
+        .values('id', 'order_id', 'date_created', 'total_amount', 'item_count', 'items_total', 'items_count')
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        if row['total_amount'] != row['items_total'] or row['item_count'] != row['items_count']:
+            yield row
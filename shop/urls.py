@@ -12,6 +12,7 @@ urlpatterns = [
     path('register/', views.register_view, name='shop_register'),
     path('logout/', views.logout_view, name='shop_logout'),
     path('history/', views.order_history_view, name='history'),
+    path('history/more/', views.order_history_more, name='history_more'),
     path('forgot-password/', views.forgot_password, name='forgot_password'),
     path('security-questions/', views.security_questions, name='security_questions'),
     path('reset-password/', views.reset_password, name='reset_password'),
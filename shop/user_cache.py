@@ -0,0 +1,125 @@
+"""
+Per-user cache for order history and profile reads.
+
+Every cached value for a student lives under a key that contains the
+student's version counter. Creating an order or changing its status bumps
+the counter, so all of the student's cached reads become unreachable at once
+and the next request rebuilds them; nothing relies on a TTL being short
+enough. Old entries simply age out of the cache.
+
+The counter starts from the current time rather than 1, so if the cache
+evicts it the new counter cannot collide with entries written under an
+older one. Only get, add, set and incr are used, which the local memory,
+file and Redis backends all support. With the local memory backend each
+process has its own cache, so bumps made in one process (for example the
+SMS reader) are not seen by another. USER_CACHE_TIMEOUT then defaults to 30
+seconds, which bounds how stale another worker's reads can be; use a shared
+backend in production to keep them for a day.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _version_key(user_id):
+    return f"shop:user-version:{user_id}"
+
+
+def _identity_version_key(user_id):
+    return f"shop:identity-version:{user_id}"
+
+
+def _new_version():
+    return time.time_ns() // 1000
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No counter yet (or evicted); any fresh one is newer than old keys
+        cache.add(key, _new_version(), timeout=None)
+
+
+def get_user_version(user_id):
+    """Return the current cache version for a user, starting one if needed."""
+    return _get_version(_version_key(user_id))
+
+
+def bump_user_version(user_id):
+    """Invalidate everything cached for a user."""
+    if user_id is None:
+        return
+    _bump_version(_version_key(user_id))
+
+
+def get_identity_version(user_id):
+    """
+    Return the version of a user's account row, or None if it never changed.
+
+    Sessions store it with the identity they cache at login (see
+    shop.middleware) and reload the identity once it has moved on. No
+    counter is started here: a student whose account is never edited costs
+    one cache read per request and nothing else. If the counter is evicted
+    the sessions keep their identity until the account changes again.
+    """
+    return cache.get(_identity_version_key(user_id))
+
+
+def bump_identity_version(user_id):
+    """Make sessions reload a user's identity; called when the ShopUser is saved or deleted."""
+    if user_id is None:
+        return
+    _bump_version(_identity_version_key(user_id))
+
+
+def bump_order_owner(user_id=None, name=None):
+    """
+    Invalidate the cached reads of the student an order belongs to.
+
+    Orders are linked to their ShopUser when written; one that could not be
+    linked is resolved by name, in case the student registered since.
+
+    Args:
+        user_id: Order.user_id, if set
+        name: Order name or student_id, used when user_id is missing
+    """
+    if user_id is None and name:
+        from shop.models import ShopUser
+        user_id = ShopUser.id_for_name(name)
+    bump_user_version(user_id)
+
+
+def user_cache_key(user_id, name):
+    """Cache key for a named value of a user at their current version."""
+    return f"shop:user:{user_id}:{get_user_version(user_id)}:{name}"
+
+
+def cached_for_user(user_id, name, build, timeout=None):
+    """
+    Return a cached value for a user, building and storing it on a miss.
+
+    Args:
+        user_id: ShopUser id the value belongs to
+        name: Name of the value, unique per user (include any parameters)
+        build: Callable returning the value; exceptions propagate uncached
+        timeout: Seconds to keep the value; defaults to USER_CACHE_TIMEOUT
+
+    Returns:
+        The cached or freshly built value
+    """
+    key = user_cache_key(user_id, name)
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.USER_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
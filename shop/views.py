@@ -4,10 +4,19 @@ from rest_framework.response import Response
 from rest_framework import status
 from .serializers import OrderSerializer
 import logging
-from .models import Order
+from .models import Order, OrderItem
 from django.shortcuts import render, redirect
+from .middleware import remember_shop_user
 from .models import ShopUser
+from .order_ids import allocate_order_id
+from .pagination import InvalidCursor, keyset_page, page_size
+from .user_cache import cached_for_user
+from cafeteria_management_system.conditional import conditional_on
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.safestring import mark_safe
 from django.contrib import messages
 from django.contrib.auth.hashers import make_password
 # Keep this comprehensive import
@@ -19,7 +28,7 @@ import pytz
 logger = logging.getLogger(__name__)
 
 def cafe(request):
-    if not request.session.get('shop_user_id'):
+    if not request.shop_user:
         return redirect('shop:shop_login')  # <-- add 'shop:' namespace
     return render(request, 'shop/cafe.html')
 
@@ -28,7 +37,8 @@ def save_order(request):
     logger.info(f"Received order data: {request.data}")
     serializer = OrderSerializer(data=request.data)
     if serializer.is_valid():
-        order = serializer.save()
+        order_id = serializer.validated_data.get('order_id') or allocate_order_id()
+        order = serializer.save(order_id=order_id, user_id=request.shop_user.id if request.shop_user else None)
         logger.info(f"Order saved with ID: {order.id}")
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     logger.error(f"Order validation errors: {serializer.errors}")
@@ -36,46 +46,82 @@ def save_order(request):
 
 
 
+def _order_history_rows(request):
+    """The orders behind the logged-in user's history, for conditional GETs."""
+    if not request.shop_user:
+        return Order.objects.none()
+    return Order.objects.filter(user_id=request.shop_user.id)
+
+
+def _order_history_vary(request):
+    user_id = request.shop_user.id if request.shop_user else None
+    return f"{user_id}:{request.GET.get('cursor')}:{request.GET.get('limit')}"
+
+
+@conditional_on(_order_history_rows, vary_func=_order_history_vary)
 @api_view(['GET'])
 def get_order_history(request):
-    """Get order history from the database"""
+    """
+    Get one page of the current user's order history, newest first.
+
+    Query parameters:
+        cursor: next_cursor from the previous page; omit for the first page
+        limit: Orders per page (default 20, at most 100)
+
+    Returns orders and a next_cursor that is null on the last page. Every page
+    costs the same two queries however long the history is, and pages are
+    cached until one of the user's orders changes. A poll whose If-None-Match
+    still matches gets 304 after one aggregate query.
+    """
     # Check if user is logged in
-    if not request.session.get('shop_user_id'):
+    shop_user = request.shop_user
+    if not shop_user:
         return Response({"error": "Not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
     
-    # Get the current user's ID from the session
-    user_id = request.session.get('shop_user_id')
+    cursor = request.GET.get('cursor')
+    limit = page_size(request.GET.get('limit'))
     
-    try:
-        # Get the current user
-        shop_user = ShopUser.objects.get(id=user_id)
+    def build_page():
+        # The user's orders, read off order_user_date_idx
+        orders, next_cursor = keyset_page(
+            Order.objects.filter(user_id=shop_user.id),
+            cursor=cursor,
+            limit=limit,
+            fields=('id', 'order_id', 'student_id', 'date_created'),
+        )
         
-        # Filter orders where student_id matches the user's name
-        orders = Order.objects.filter(student_id=shop_user.name).order_by('-date_created')
-        data = []
+        # Items for the whole page in one query, straight from tuples
+        items_by_order = {order['id']: [] for order in orders}
+        item_rows = (
+            OrderItem.objects.filter(order_id__in=items_by_order)
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'name', 'price', 'quantity')
+        )
+        for order_pk, name, price, quantity in item_rows:
+            items_by_order[order_pk].append({
+                'name': name,
+                'price': float(price),
+                'quantity': quantity
+            })
         
-        for order in orders:
-            order_items = []
-            for item in order.items.all():
-                order_items.append({
-                    'name': item.name,
-                    'price': float(item.price),
-                    'quantity': item.quantity
-                })
-            
-            order_data = {
-                'orderId': order.order_id,
-                'studentId': order.student_id,
-                'date': int(order.date_created.timestamp() * 1000),
-                'items': order_items
+        data = [
+            {
+                'orderId': order['order_id'],
+                'studentId': order['student_id'],
+                'date': int(order['date_created'].timestamp() * 1000),
+                'items': items_by_order[order['id']]
             }
-            data.append(order_data)
-        
-        return Response(data)
+            for order in orders
+        ]
+        return {'orders': data, 'next_cursor': next_cursor}
+    
+    try:
+        # Cached per user until one of their orders changes
+        page = cached_for_user(shop_user.id, f"order-history-api:{cursor}:{limit}", build_page)
+        return Response(page)
         
-    except ShopUser.DoesNotExist:
-        # Handle case where user doesn't exist
-        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    except InvalidCursor as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 
@@ -91,7 +137,7 @@ def login_view(request):
                 # Check password
                 from django.contrib.auth.hashers import check_password
                 if check_password(form.cleaned_data['password'], user.password):
-                    request.session['shop_user_id'] = user.id
+                    remember_shop_user(request, user)
                     
                     # Important: Set a flag to clear localStorage on client side
                     request.session['clear_local_storage'] = True
@@ -119,7 +165,7 @@ def register_view(request):
             # Now save the user with hashed password
             user.save()
             
-            request.session['shop_user_id'] = user.id
+            remember_shop_user(request, user)
             # Redirect to login page instead of cafe
             return redirect('shop:shop_login')
     else:
@@ -156,74 +202,158 @@ def cafe_view(request):
 # Add this at the end of the file
 def userhelp_view(request):
     """View for the chatbot help page"""
-    if not request.session.get('shop_user_id'):
+    if not request.shop_user:
         return redirect('shop:shop_login')
     
     return render(request, 'shop/userhelp.html')
 
 
-# Updated order_history_view to use the ShopUser model
-# this order history compares names from db and if names match then it displays
-def order_history_view(request):
-    """View for showing the complete order history"""
-    if not request.session.get('shop_user_id'):
-        return redirect('shop:shop_login')
-    
-    user_id = request.session.get('shop_user_id')
-    
-    try:
-        # Get the current user from ShopUser model
-        shop_user = ShopUser.objects.get(id=user_id)
+# Orders rendered on the history page and per Load More request
+HISTORY_PAGE_SIZE = 20
+# An order's rendered rows only change when the order is saved, and its
+# updated_at is part of the cache key, so fragments can be kept for a long time
+HISTORY_FRAGMENT_TIMEOUT = 7 * 24 * 60 * 60
+# Bump whenever the row template or the data it shows changes, so a deploy
+# does not serve rows rendered by the previous version for a week
+HISTORY_FRAGMENT_VERSION = 1
 
 
-        # Option 2: Filter using the name field instead
-        #filters by name instead of student id
-        orders = Order.objects.filter(name__iexact=shop_user.name).order_by('-date_created')
-        
-        # Log for debugging
-        print(f"User: {shop_user.name}, Found {orders.count()} orders")
-        
-        # Process order data for template
-        formatted_orders = []
+def _history_fragment_key(order):
+    """
+    Cache key for an order's rendered history rows.
+
+    Keyed by updated_at rather than the status alone: the admin edits items
+    and refresh_totals rewrites totals without touching the status, and both
+    move updated_at.
+    """
+    changed = int(order.updated_at.timestamp() * 1_000_000)
+    return f"shop:history-order:v{HISTORY_FRAGMENT_VERSION}:{order.pk}:{changed}"
+
+
+def _render_history_rows(orders):
+    """
+    Render the history table rows for a page of orders.
+
+    Rows are cached per order under a key that includes its updated_at, so a
+    completed order is rendered once and any change renders it afresh.
+    Items are loaded (in one query) only for orders missing from the cache.
+
+    Args:
+        orders: Order instances with date_created, status, payment_method,
+            total_amount and updated_at loaded
+
+    Returns:
+        List of rendered HTML fragments, one per order, in the same order
+    """
+    keys = {order.pk: _history_fragment_key(order) for order in orders}
+    fragments = cache.get_many(list(keys.values()))
+    missing = [order for order in orders if keys[order.pk] not in fragments]
+
+    if missing:
+        items_by_order = {order.pk: [] for order in missing}
+        item_rows = (
+            OrderItem.objects.filter(order_id__in=items_by_order)
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'name', 'price', 'quantity')
+        )
+        for order_pk, name, price, quantity in item_rows:
+            item_total = float(price) * quantity
+            items_by_order[order_pk].append({
+                'name': name,
+                'price': float(price),
+                'quantity': quantity,
+                'item_total': f"{item_total:.2f}"
+            })
+
         ist = pytz.timezone('Asia/Kolkata')
-        
-        for order in orders:
-            order_items = []
-            total = 0
-            
-            for item in order.items.all():
-                item_total = float(item.price) * item.quantity
-                total += item_total
-                order_items.append({
-                    'name': item.name,
-                    'price': float(item.price),
-                    'quantity': item.quantity,
-                    'item_total': f"{item_total:.2f}"
-                })
-            
+        rendered = {}
+        for order in missing:
             # Convert date to IST timezone
             local_datetime = timezone.localtime(order.date_created, ist)
-            
-            formatted_orders.append({
+            rendered[keys[order.pk]] = render_to_string('shop/history_order.html', {'order': {
                 'orderId': order.order_id,
                 'studentId': order.student_id,  # This is actually the user's name
-                'date': int(local_datetime.timestamp() * 1000),
+                'date': local_datetime,
                 'date_formatted': local_datetime.strftime('%d %b %Y, %I:%M %p'),
-                'items': order_items,
-                'total': f"{total:.2f}",
-                'status': order.status, # Include status
-                'payment_method': order.payment_method  # Make sure this field exists
-            })
-        
-        context = {
-            'orders': formatted_orders
-        }
-        
-        return render(request, 'shop/history.html', context)
-        
-    except ShopUser.DoesNotExist:
-        # Handle case where user doesn't exist
+                'items': items_by_order[order.pk],
+                'total': f"{order.total_amount:.2f}",
+                'status': order.status,
+                'payment_method': order.payment_method
+            }})
+        cache.set_many(rendered, HISTORY_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+
+    return [mark_safe(fragments[keys[order.pk]]) for order in orders]
+
+
+def _history_page(shop_user, cursor=None):
+    """
+    Render one page of a user's order history.
+
+    Whole pages are cached per user until one of their orders changes; the
+    per-order fragments then let a rebuilt page re-render only that order.
+
+    Returns:
+        Tuple of (rendered row fragments, next cursor or None)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    def build_page():
+        # The user's orders, read off order_user_date_idx
+        orders = Order.objects.filter(user_id=shop_user.id).only(
+            'id', 'order_id', 'student_id', 'date_created', 'status', 'payment_method', 'total_amount',
+            'updated_at',
+        )
+        orders, next_cursor = keyset_page(orders, cursor=cursor, limit=HISTORY_PAGE_SIZE)
+        return [str(row) for row in _render_history_rows(orders)], next_cursor
+
+    rows, next_cursor = cached_for_user(shop_user.id, f"history-page:{cursor}", build_page)
+    return [mark_safe(row) for row in rows], next_cursor
+
+
+# Updated order_history_view to use the ShopUser model
+# this order history compares names from db and if names match then it displays
+def order_history_view(request):
+    """
+    View for showing the order history.
+
+    The first page of orders is rendered here; older orders are fetched a
+    page at a time from order_history_more, so the cost of the page depends
+    on the page size rather than on how many orders the student has placed.
+    """
+    if not request.shop_user:
         return redirect('shop:shop_login')
+    
+    order_rows, next_cursor = _history_page(request.shop_user)
+    
+    context = {
+        'order_rows': order_rows,
+        'next_cursor': next_cursor
+    }
+    
+    return render(request, 'shop/history.html', context)
+
+
+def order_history_more(request):
+    """
+    Return the next page of history rows for the Load More button.
+
+    Query parameters:
+        cursor: next_cursor from the previous page
+
+    Returns JSON with the rendered rows as html and the next_cursor, which
+    is null on the last page.
+    """
+    if not request.shop_user:
+        return JsonResponse({'error': 'Not authenticated'}, status=401)
+    
+    try:
+        order_rows, next_cursor = _history_page(request.shop_user, cursor=request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'html': ''.join(order_rows), 'next_cursor': next_cursor})
 
 def forgot_password(request):
     error = None
@@ -13,6 +13,9 @@ django.setup()
 
 # Import your Order model
 from shop.models import Order
+from shop.order_events import notify_order_change
+from shop.rollups import save_order_status
+from shop.user_cache import bump_order_owner
 from django.utils import timezone
 
 # Define authorized staff phone numbers that can receive payment notifications
@@ -87,7 +90,9 @@ def process_sms_message(sender, body, received_at=None):
                         pass  # Field might not exist
                         
                     order.payment_reference = reference if reference else "Verified via SMS"
-                    order.save()
+                    save_order_status(order)
+                    bump_order_owner(order.user_id, order.name or order.student_id)
+                    notify_order_change()
                     print(f"✅ Updated order status from '{old_status}' to 'successful'")
                     return {
                         "success": True, 
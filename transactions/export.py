@@ -0,0 +1,383 @@
+"""
+Exports of the transactions list.
+
+The Excel report is written in openpyxl's write-only mode: rows go to disk
+as they are appended, so memory stays flat however many orders are
+exported. The summary sheet sums the period's daily sales rollups (see
+shop.rollups), so its cost depends on the number of days rather than the
+number of orders, and the data sheet streams from a single query read in
+chunks with .iterator(). Order totals are stored on the order, so no items
+are read per row.
+
+The raw CSV and NDJSON exports have one row per order item, with the
+order's delivery details. They are generated while the response is sent:
+orders are read a keyset page at a time, with the delivery joined in and
+one query for the page's items, so memory stays constant and the first
+bytes go out before the whole export is read.
+"""
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytz
+from django.db.models import Min, Sum
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.chart import PieChart, Reference
+from openpyxl.chart.label import DataLabelList
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from shop.models import DailyItemSales, DailySales, Order, OrderItem
+from shop.pagination import keyset_page
+from shop.rollups import day_start, for_days
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Orders fetched from the database at a time while writing the data sheet
+EXPORT_CHUNK_SIZE = 2000
+
+DATA_HEADERS = ['Order ID', 'Student ID', 'Name', 'Date', 'Total Amount', 'Payment Method', 'Status']
+DATA_WIDTHS = [15, 15, 20, 20, 15, 20, 15]
+
+HEADER_FILL = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+HEADER_FONT = Font(color="FFFFFF", bold=True)
+HEADER_ALIGN = Alignment(horizontal="center", vertical="center")
+TABLE_FILL = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
+
+# Raw export formats: content type and file extension
+STREAM_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+# Orders read per keyset page of a raw export
+STREAM_BATCH_SIZE = 1000
+# Columns of a raw export row, and the order values they come from
+STREAM_COLUMNS = [
+    'order_id', 'student_id', 'name', 'date_created', 'status', 'payment_method', 'total_amount',
+    'floor_number', 'classroom', 'delivery_time', 'delivery_status',
+    'item_name', 'item_price', 'item_quantity',
+]
+STREAM_ORDER_FIELDS = {
+    'id': 'id',
+    'order_id': 'order_id',
+    'student_id': 'student_id',
+    'name': 'name',
+    'date_created': 'date_created',
+    'status': 'status',
+    'payment_method': 'payment_method',
+    'total_amount': 'total_amount',
+    'floor_number': 'delivery_info__floor_number',
+    'classroom': 'delivery_info__classroom',
+    'delivery_time': 'delivery_info__delivery_time',
+    'delivery_status': 'delivery_info__status__status',
+}
+
+
+def export_period(filter_type, now=None):
+    """
+    Select the orders for an export filter.
+
+    Periods are whole local days, so the orders exported are the ones the
+    daily sales rollups of those days count.
+
+    Args:
+        filter_type: 'today', 'week', 'month' or anything else for all orders
+        now: Current time, for tests
+
+    Returns:
+        Tuple of (queryset, filename, date range caption, days), where days
+        is a (first, last) pair of local dates, None for an open end
+    """
+    today = timezone.localdate(now or timezone.now())
+    if filter_type == 'today':
+        first, filename, caption = today, f"transactions_{today}.xlsx", f"Date: {today}"
+    elif filter_type == 'week':
+        first = today - timedelta(days=7)
+        filename, caption = "transactions_last7days.xlsx", f"Period: {first} to {today}"
+    elif filter_type == 'month':
+        first = today - timedelta(days=30)
+        filename, caption = "transactions_last30days.xlsx", f"Period: {first} to {today}"
+    else:
+        # Default: all transactions
+        return Order.objects.all(), "all_transactions.xlsx", "All Time", (None, None)
+
+    # A range on date_created can use its index; the __date lookup wraps
+    # the column in a function and scans every order
+    queryset = Order.objects.filter(date_created__gte=day_start(first),
+                                    date_created__lt=day_start(today + timedelta(days=1)))
+    return queryset, filename, caption, (first, today)
+
+
+def export_statistics(days=(None, None)):
+    """
+    Compute the summary sheet's figures from the daily sales rollups.
+
+    Payment methods are classified as before: cash, cod or cash on delivery
+    count as cash, anything containing upi or equal to online as online,
+    and an order with a delivery record or a classroom_delivery payment as
+    a delivery, independent of how it was paid. Orders of every status are
+    counted.
+
+    Args:
+        days: (first, last) local dates to summarise, None for an open end
+
+    Returns:
+        Dictionary with count, revenue, average, cash, online, delivery and
+        items, a list of (name, quantity) pairs in order of first sale
+    """
+    methods = (
+        for_days(DailySales.objects.all(), *days)
+        .values('payment_method')
+        .annotate(orders=Sum('order_count'), revenue=Sum('revenue'), delivery=Sum('delivery_count'))
+        .order_by()
+    )
+    count = revenue = cash = online = delivery = 0
+    for row in methods:
+        method = row['payment_method'].lower()
+        count += row['orders']
+        revenue += row['revenue']
+        delivery += row['delivery']
+        if method in ('cash', 'cod', 'cash on delivery'):
+            cash += row['orders']
+        elif 'upi' in method or method == 'online':
+            online += row['orders']
+
+    # Rollup rows are created at an item's first sale of the day, so
+    # ordering by them keeps ties in order of first sale
+    items = (
+        for_days(DailyItemSales.objects.all(), *days)
+        .values('name')
+        .annotate(quantity=Sum('quantity'), first_id=Min('id'))
+        .filter(quantity__gt=0)
+        .order_by('first_id')
+    )
+    return {
+        'count': count,
+        'revenue': revenue,
+        'average': revenue / count if count else 0,
+        'cash': cash,
+        'online': online,
+        'delivery': delivery,
+        'items': [(item['name'], item['quantity']) for item in items],
+    }
+
+
+def _cell(sheet, value, font=None, fill=None, alignment=None):
+    """A write-only cell with optional styles."""
+    cell = WriteOnlyCell(sheet, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if alignment:
+        cell.alignment = alignment
+    return cell
+
+
+def _pie_chart(sheet, title, header_row, last_row, show_values):
+    chart = PieChart()
+    chart.title = title
+    labels = Reference(sheet, min_col=1, min_row=header_row + 1, max_row=last_row)
+    data = Reference(sheet, min_col=2, min_row=header_row, max_row=last_row)
+    chart.add_data(data, titles_from_data=True)
+    chart.set_categories(labels)
+    chart.height = 10
+    chart.width = 15
+
+    # Configure chart data labels
+    chart.dataLabels = DataLabelList()
+    chart.dataLabels.showPercent = True
+    chart.dataLabels.showVal = show_values
+    chart.dataLabels.showCatName = True
+    return chart
+
+
+def _write_summary(sheet, stats, date_range, now):
+    """Write the summary sheet: metrics, payment breakdown, item tables and charts."""
+    # Sort items by popularity for charts
+    sorted_items = sorted(stats['items'], key=lambda x: x[1], reverse=True)
+    top_items = sorted_items[:5]
+    least_items = sorted_items[-5:]
+    least_items.reverse()
+
+    # Write-only sheets take whole rows in order, so lay the cells out first
+    cells = {}
+
+    def put(row, column, value, **styles):
+        cells[row, column] = _cell(sheet, value, **styles) if styles else value
+
+    # --- REPORT HEADER SECTION ---
+    put(1, 1, "Cafeteria Management System - Transaction Report", font=Font(bold=True, size=16))
+    sheet.merged_cells.add('A1:D1')
+    put(3, 1, date_range, font=Font(bold=True))
+    # Download timestamp in IST
+    download_time = now.astimezone(pytz.timezone('Asia/Kolkata')).strftime('%d/%m/%Y %H:%M:%S')
+    put(4, 1, f"Report Downloaded On: {download_time} IST", font=Font(italic=True))
+
+    # --- BASIC STATISTICS SECTION ---
+    put(6, 1, "Total Transactions:")
+    put(6, 2, stats['count'])
+    put(7, 1, "Total Revenue:")
+    put(7, 2, f"₹{stats['revenue']:.2f}")
+    put(8, 1, "Average Order Value:")
+    put(8, 2, f"₹{stats['average']:.2f}")
+
+    # --- PAYMENT METHOD STATISTICS SECTION ---
+    put(6, 4, "Payment Method Breakdown", font=Font(bold=True))
+    for column, header in enumerate(["Payment Type", "Count", "Percentage"], 4):
+        put(7, column, header, font=Font(bold=True), fill=TABLE_FILL)
+    breakdown = [
+        ("Cash Orders", stats['cash']),
+        ("Online/UPI Orders", stats['online']),
+        ("Deliver to Class", stats['delivery']),
+    ]
+    for row, (label, count) in enumerate(breakdown, 8):
+        percentage = count / stats['count'] * 100 if stats['count'] else 0
+        put(row, 4, label)
+        put(row, 5, count)
+        put(row, 6, f"{percentage:.1f}%")
+
+    # --- TOP AND LEAST SOLD ITEMS SECTIONS ---
+    top_header = 11
+    least_header = top_header + len(top_items) + 4
+    for title, header, items in [("Top Sold Items", top_header, top_items),
+                                 ("Least Sold Items", least_header, least_items)]:
+        put(header - 1, 1, title, font=Font(bold=True))
+        put(header, 1, "Item Name", font=Font(bold=True), fill=TABLE_FILL)
+        put(header, 2, "Quantity", font=Font(bold=True), fill=TABLE_FILL)
+        for row, (item_name, count) in enumerate(items, header + 1):
+            put(row, 1, item_name)
+            put(row, 2, count)
+
+    sheet.add_chart(_pie_chart(sheet, "Top Sold Items", top_header, top_header + len(top_items), True), "E15")
+    sheet.add_chart(_pie_chart(sheet, "Least Sold Items", least_header, least_header + len(least_items), False),
+                    "E37")
+
+    # Set column widths for better readability
+    for col in ['A', 'B', 'C', 'D']:
+        sheet.column_dimensions[col].width = 20
+
+    last_row = max(row for row, _ in cells)
+    last_column = max(column for _, column in cells)
+    for row in range(1, last_row + 1):
+        sheet.append([cells.get((row, column)) for column in range(1, last_column + 1)])
+
+
+def write_transactions_workbook(queryset, date_range, output, now=None, days=(None, None)):
+    """
+    Write the transactions report for some orders as an .xlsx file.
+
+    Args:
+        queryset: Orders to export
+        date_range: Caption for the period the orders cover
+        output: Path or binary file object to write the workbook to
+        now: Time shown as the download time; defaults to now
+        days: (first, last) local dates the summary covers, None for an
+            open end; should select the same orders as queryset
+
+    Returns:
+        Number of orders written to the data sheet
+    """
+    now = now or timezone.now()
+    wb = Workbook(write_only=True)
+    stats_sheet = wb.create_sheet(title="Summary Statistics")
+    data_sheet = wb.create_sheet(title="Transaction Data")
+
+    _write_summary(stats_sheet, export_statistics(days), date_range, now)
+
+    # --- TRANSACTION DATA SHEET ---
+    # Column widths must be set before the first row is written
+    for col_idx, width in enumerate(DATA_WIDTHS, 1):
+        data_sheet.column_dimensions[chr(64 + col_idx)].width = width
+    data_sheet.append([
+        _cell(data_sheet, header, font=HEADER_FONT, fill=HEADER_FILL, alignment=HEADER_ALIGN)
+        for header in DATA_HEADERS
+    ])
+
+    rows = (
+        queryset.order_by('-date_created', '-id')
+        .values_list('order_id', 'student_id', 'name', 'date_created', 'total_amount', 'payment_method', 'status')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    written = 0
+    for order_id, student_id, name, date_created, total_amount, payment_method, status in rows:
+        data_sheet.append([
+            order_id,
+            student_id,
+            name or '',
+            date_created.strftime('%Y-%m-%d %H:%M:%S'),
+            float(total_amount),
+            payment_method or '',
+            status.title() if status else 'Pending',
+        ])
+        written += 1
+
+    wb.save(output)
+    return written
+
+
+def export_rows(queryset, batch_size=STREAM_BATCH_SIZE):
+    """
+    Read the raw export rows of some orders, newest order first.
+
+    Each page of orders costs two queries: the orders with their delivery
+    joined in, then the page's items. Amounts are strings, so no precision
+    is lost, and times are ISO 8601 in local time.
+
+    Yields:
+        Lists of rows, one list per page; each row is a dictionary keyed by
+        STREAM_COLUMNS with one row per item, or one row with empty item
+        columns for an order without items
+    """
+    cursor = None
+    while True:
+        orders, cursor = keyset_page(queryset, cursor, batch_size, fields=list(STREAM_ORDER_FIELDS.values()))
+        if not orders:
+            return
+
+        items = {}
+        for order_id, name, price, quantity in (
+            OrderItem.objects.filter(order_id__in=[order['id'] for order in orders])
+            .order_by('order_id', 'id')
+            .values_list('order_id', 'name', 'price', 'quantity')
+        ):
+            items.setdefault(order_id, []).append((name, str(price), quantity))
+
+        batch = []
+        for order in orders:
+            base = {column: order[field] for column, field in STREAM_ORDER_FIELDS.items() if column != 'id'}
+            base['date_created'] = timezone.localtime(base['date_created']).isoformat()
+            base['total_amount'] = str(base['total_amount'])
+            for item_name, item_price, item_quantity in items.get(order['id']) or [(None, None, None)]:
+                batch.append(dict(base, item_name=item_name, item_price=item_price, item_quantity=item_quantity))
+        yield batch
+
+        if cursor is None:
+            return
+
+
+def csv_chunks(queryset, batch_size=STREAM_BATCH_SIZE):
+    """Yield a raw export as CSV text, the header first, then one chunk per page."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=STREAM_COLUMNS)
+
+    def drain():
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+
+    # The header goes out before the first query runs
+    writer.writeheader()
+    yield drain()
+    for batch in export_rows(queryset, batch_size):
+        writer.writerows(batch)
+        yield drain()
+
+
+def ndjson_chunks(queryset, batch_size=STREAM_BATCH_SIZE):
+    """Yield a raw export as newline-delimited JSON, one chunk per page."""
+    for batch in export_rows(queryset, batch_size):
+        yield ''.join(json.dumps(row) + '\n' for row in batch)
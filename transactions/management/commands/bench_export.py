@@ -0,0 +1,114 @@
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from shop.models import Order, OrderItem
+from transactions.export import write_transactions_workbook
+
+# Benchmark orders are recognisable, and rolled back unless --keep is given
+ORDER_PREFIX = 'BENCH-EXPORT-'
+PAYMENT_METHODS = ['upi', 'cash', 'card', 'classroom_delivery']
+STATUSES = ['successful', 'successful', 'successful', 'pending', 'cancelled']
+MENU = [('Samosa', Decimal('25.00')), ('Veg Biryani', Decimal('90.00')), ('Coca Cola', Decimal('25.00'))]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the Excel export at growing order counts and report the peak Python memory of '
+        'each run. Memory should stay flat as the order count grows; time grows linearly. '
+        'Synthetic orders are inserted in a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Orders in the largest export')
+        parser.add_argument('--steps', default='10000,100000',
+                            help='Smaller order counts to export first, comma separated')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Orders inserted per bulk_create')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark orders afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            steps = sorted({int(step) for step in options['steps'].split(',') if step} | {options['orders']})
+        except ValueError:
+            raise CommandError('--steps must be a comma separated list of order counts')
+        if steps[0] < 1 or options['batch_size'] < 1:
+            raise CommandError('Order counts and --batch-size must be positive')
+
+        try:
+            with transaction.atomic():
+                results = self._run(steps, options['batch_size'])
+                if not options['keep']:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write('Benchmark orders rolled back')
+
+        smallest, largest = results[0], results[-1]
+        growth = largest['peak'] / max(smallest['peak'], 1)
+        self.stdout.write(self.style.SUCCESS(
+            f"{largest['orders'] / smallest['orders']:.0f}x the orders used {growth:.2f}x the peak memory"
+        ))
+
+    def _run(self, steps, batch_size):
+        inserted = 0
+        results = []
+        for step in steps:
+            started = time.perf_counter()
+            inserted = self._insert(inserted, step, batch_size)
+            self.stdout.write(f"Inserted {step} orders in {time.perf_counter() - started:.1f}s")
+
+            result = self._export(Order.objects.filter(order_id__startswith=ORDER_PREFIX))
+            results.append(result)
+            self.stdout.write(
+                f"  exported {result['orders']} orders in {result['seconds']:.1f}s "
+                f"({result['orders'] / max(result['seconds'], 0.001):.0f} orders/s), "
+                f"peak memory {result['peak'] / 2**20:.1f} MiB, file {result['size'] / 2**20:.1f} MiB"
+            )
+        return results
+
+    def _insert(self, start, stop, batch_size):
+        """Insert benchmark orders start..stop with one item each; returns stop."""
+        now = timezone.now()
+        for first in range(start, stop, batch_size):
+            indexes = range(first, min(first + batch_size, stop))
+            orders = Order.objects.bulk_create([
+                Order(
+                    order_id=f"{ORDER_PREFIX}{index:08d}",
+                    student_id=f"bench-{index % 5000:04d}",
+                    name=f"Bench Student {index % 5000}",
+                    payment_method=PAYMENT_METHODS[index % len(PAYMENT_METHODS)],
+                    status=STATUSES[index % len(STATUSES)],
+                    # Spread over a year so the export's ordering does real work
+                    date_created=now - timedelta(minutes=(index * 7919) % 525600),
+                    total_amount=MENU[index % len(MENU)][1],
+                    item_count=1,
+                )
+                for index in indexes
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, name=MENU[index % len(MENU)][0], price=MENU[index % len(MENU)][1], quantity=1)
+                for index, order in zip(indexes, orders)
+            ])
+        return stop
+
+    def _export(self, queryset):
+        with tempfile.TemporaryFile() as output:
+            tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                orders = write_transactions_workbook(queryset, 'Benchmark', output)
+                seconds = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            size = output.tell()
+        return {'orders': orders, 'seconds': seconds, 'peak': peak, 'size': size}
@@ -32,8 +32,27 @@ function formatDateToIST(dateString) {
     return date.toLocaleString('en-IN', options);
 }
 
-// Store all transactions for filtering
+// Transactions loaded so far for the current filters, page by page
 let allTransactions = [];
+// Cursor of the next page, or null once every matching order is shown
+let nextCursor = null;
+// ETag of the first page and the query it was for; a refresh of the same
+// query sends it and gets 304 when nothing changed
+let transactionsEtag = null;
+// Incremented per list request so a slow response for old filters is dropped
+let transactionsRequest = 0;
+// Debounce timer for the search box
+let searchTimer = null;
+// Change feed position for the loaded list; polls apply only what changed
+let changesCursor = null;
+// How often to poll the change feed while the live stream is down, in
+// milliseconds
+const CHANGES_POLL_INTERVAL = 15000;
+// Live order stream; while it is open the change feed is read when an order
+// changes instead of on a timer
+let liveOrders = null;
+// Debounce timer so a burst of live events costs one change feed request
+let changesTimer = null;
 
 /************************************************
  * INITIALIZATION
@@ -53,6 +72,9 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('dateFilter').addEventListener('change', function() {
             const filterValue = this.value;
             exportButton.href = `/transactions/api/export/?filter=${filterValue}`;
+            // Raw rows, one per item, streamed as they are read
+            document.getElementById('exportCsvButton').href =
+                `/transactions/api/export/?filter=${filterValue}&format=csv`;
         });
     }
     
@@ -65,21 +87,27 @@ document.addEventListener('DOMContentLoaded', function() {
         document.getElementById('applyCustomRange').addEventListener('click', applyCustomDateRange);
     }
 
-        // Add event listener for items count filter
-    if (document.getElementById('itemsCountFilter')) {
-        document.getElementById('itemsCountFilter').addEventListener('change', function() {
-            // Re-apply the current date filter to update the display
-            const currentFilter = document.getElementById('dateFilter').value;
-            if (currentFilter === 'custom') {
-                applyCustomDateRange();
-            } else {
-                applyDateFilter(currentFilter);
-            }
-        });
+    // Status and payment method filters are applied on the server
+    ['statusFilter', 'paymentFilter'].forEach(id => {
+        const select = document.getElementById(id);
+        if (select) {
+            select.addEventListener('change', fetchTransactions);
+        }
+    });
+    
+    const loadMoreButton = document.getElementById('loadMoreTransactions');
+    if (loadMoreButton) {
+        loadMoreButton.addEventListener('click', loadMoreTransactions);
     }
     
-    // Fetch transactions when the page loads
+    // Fetch transactions when the page loads, then keep them current
     fetchTransactions();
+    connectLiveOrders();
+    setInterval(function() {
+        if (!liveOrders || liveOrders.readyState !== EventSource.OPEN) {
+            fetchChanges();
+        }
+    }, CHANGES_POLL_INTERVAL);
 });
 
 /************************************************
@@ -98,136 +126,111 @@ function displayNoItemStats() {
 
 
 /**
- * Calculate item statistics from transaction data
- * @param {Array} transactions - Array of filtered transaction objects
- * @returns {Object} - Object with top_items and least_items arrays
+ * Update transaction statistics
+ * @param {Object} summary - Summary of all matching orders from the list API
  */
-function calculateItemStats(transactions) {
-    // Early return if no transactions
-    if (!transactions || transactions.length === 0) {
-        return {
-            top_items: [],
-            least_items: []
-        };
+function updateTransactionStatistics(summary) {
+    if (!summary || summary.count === 0) {
+        document.getElementById('totalTransactions').textContent = "0";
+        document.getElementById('totalRevenue').textContent = "₹0.00";
+        document.getElementById('avgOrderValue').textContent = "₹0.00";
+        document.getElementById('recentOrder').textContent = "None";
+        return;
     }
     
-    // Get all items from the transactions
-    let itemCounts = {};
+    // Counted and summed on the server over every matching order, not just
+    // the pages loaded so far
+    document.getElementById('totalTransactions').textContent = summary.count;
+    document.getElementById('totalRevenue').textContent = `₹${summary.revenue.toFixed(2)}`;
+    document.getElementById('avgOrderValue').textContent = `₹${summary.average.toFixed(2)}`;
     
-    // Loop through each transaction
-    transactions.forEach(transaction => {
-        // Only process if the transaction has items
-        if (transaction.items && transaction.items.length > 0) {
-            transaction.items.forEach(item => {
-                const itemName = item.name;
-                if (itemCounts[itemName]) {
-                    itemCounts[itemName] += item.quantity;
-                } else {
-                    itemCounts[itemName] = item.quantity;
-                }
-            });
-        }
-    });
-    
-    // Convert to array for sorting
-    const itemsArray = Object.entries(itemCounts).map(([name, count]) => ({
-        name: name,
-        count: count
-    }));
-    
-    // Get the user-selected number of items to display (default to 3)
-    const itemsToShow = parseInt(document.getElementById('itemsCountFilter')?.value || 3);
-    
-    // Sort by count (descending for top items)
-    itemsArray.sort((a, b) => b.count - a.count);
-    
-    // Get top N items, but only include items actually sold (no empty slots)
-    const topItems = itemsArray.slice(0, Math.min(itemsToShow, itemsArray.length));
-    
-    // Reverse sort for least items (we want the least sold)
-    const leastItemsArray = [...itemsArray].sort((a, b) => a.count - b.count);
-    // Get bottom N items, but only include items actually sold (no empty slots)
-    const leastItems = leastItemsArray.slice(0, Math.min(itemsToShow, leastItemsArray.length));
-    
-    return {
-        top_items: topItems,
-        least_items: leastItems
-    };
+    const recentOrder = summary.recent;
+    document.getElementById('recentOrder').textContent = recentOrder ?
+        `${recentOrder.order_id} - ${formatDateToIST(recentOrder.date)}` : "None";
 }
 
 
 /**
- * Update transaction statistics
- * @param {Array} transactions - Array of transaction objects
+ * Build the list API query string for the current filters
+ * @param {string|null} cursor - Cursor of the page to fetch, null for the first
+ * @returns {string} - URL-encoded query string
  */
-function updateTransactionStatistics(transactions) {
-    if (!transactions || transactions.length === 0) {
-        document.getElementById('totalTransactions').textContent = "0";
-        document.getElementById('totalRevenue').textContent = "₹0.00";
-        document.getElementById('avgOrderValue').textContent = "₹0.00";
-        document.getElementById('recentOrder').textContent = "None";
-        return;
+function buildTransactionsQuery(cursor) {
+    const params = new URLSearchParams();
+    
+    const period = document.getElementById('dateFilter')?.value || 'all';
+    if (period === 'custom') {
+        const startDate = document.getElementById('startDate').value;
+        const endDate = document.getElementById('endDate').value;
+        if (startDate) params.set('start', startDate);
+        if (endDate) params.set('end', endDate);
+    } else if (period !== 'all') {
+        params.set('period', period);
     }
     
-    // Calculate total transactions
-    const totalTransactions = transactions.length;
-    document.getElementById('totalTransactions').textContent = totalTransactions;
+    const search = document.getElementById('searchInput').value.trim();
+    if (search) params.set('q', search);
     
-    // Calculate total revenue
-    const totalRevenue = transactions.reduce((sum, transaction) => sum + transaction.total, 0);
-    document.getElementById('totalRevenue').textContent = `₹${totalRevenue.toFixed(2)}`;
+    const status = document.getElementById('statusFilter')?.value;
+    if (status) params.set('status', status);
     
-    // Calculate average order value
-    const avgOrderValue = totalRevenue / totalTransactions;
-    document.getElementById('avgOrderValue').textContent = `₹${avgOrderValue.toFixed(2)}`;
+    const paymentMethod = document.getElementById('paymentFilter')?.value;
+    if (paymentMethod) params.set('payment_method', paymentMethod);
     
-    // Sort transactions by date (newest first) to find most recent order
-    const sortedTransactions = [...transactions].sort((a, b) => 
-        new Date(b.date) - new Date(a.date)
-    );
+    if (cursor) {
+        params.set('cursor', cursor);
+    } else {
+        // Top and least sold items come with the first page's summary
+        params.set('items', document.getElementById('itemsCountFilter')?.value || 3);
+    }
     
-    // Get most recent order from sorted array
-    const recentOrder = sortedTransactions[0];
-    document.getElementById('recentOrder').textContent = `${recentOrder.order_id} - ${formatDateToIST(recentOrder.date)}`;
+    return params.toString();
 }
 
 
-
-
 /**
- * Fetch transactions from the server with always-fresh status data
+ * Fetch the first page of transactions for the current filters
+ *
+ * Filtering, paging and statistics all happen on the server, so the page
+ * stays fast however many orders exist. The server answers 304 Not Modified
+ * when nothing changed since the ETag we send, and the table is left as it is.
  */
 async function fetchTransactions() {
+    const requestId = ++transactionsRequest;
     try {
-        // Always fetch fresh data by adding a cache-busting parameter
-        const response = await fetch('/transactions/api/list/?fresh=' + new Date().getTime());
+        const query = buildTransactionsQuery(null);
         
-        if (!response.ok) {
-            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+        // Revalidate ourselves; no-store keeps the browser from answering
+        // with its own cached copy
+        const headers = transactionsEtag && transactionsEtag.query === query ?
+            { 'If-None-Match': transactionsEtag.etag } : {};
+        const response = await fetch(`/transactions/api/list/?${query}`, { headers, cache: 'no-store' });
+        
+        if (requestId !== transactionsRequest || response.status === 304) {
+            return;
         }
         
         const data = await response.json();
+        if (requestId !== transactionsRequest) {
+            return;
+        }
         
         if (data.success) {
-            // Store all transactions for filtering
+            transactionsEtag = { query, etag: response.headers.get('ETag') };
             allTransactions = data.transactions;
+            nextCursor = data.next_cursor;
+            changesCursor = data.changes_cursor;
             
-            // IMPORTANT: Clear ALL cached transaction data to prevent stale data
-            localStorage.removeItem('transactionData');
-            localStorage.removeItem('transactionTimestamp');
-            localStorage.removeItem('transactionDetails'); // ADDED THIS LINE to clear cached details
-            
-            // Fetch detailed item data for each transaction
-            await fetchTransactionDetails();
-            
-            // Render transactions and update statistics
             renderTransactionsTable(allTransactions);
-            updateTransactionStatistics(allTransactions);
-            const itemStats = calculateItemStats(allTransactions);
-            updateItemStatistics(itemStats);
+            updateTransactionStatistics(data.summary);
+            updateItemStatistics({
+                top_items: data.summary.top_items,
+                least_items: data.summary.least_items
+            });
+            updateLoadMoreButton();
         } else {
             console.error('Error fetching transactions:', data.error);
-            alert('Failed to load transactions. Please try again later.');
+            alert(`Failed to load transactions: ${data.error}`);
         }
     } catch (error) {
         console.error('Error fetching transactions:', error);
@@ -236,114 +239,175 @@ async function fetchTransactions() {
 }
 
 
-
-
 /**
- * Fetch detailed information for each transaction with caching
+ * Append the next page of transactions to the table
  */
-async function fetchTransactionDetails() {
+async function loadMoreTransactions() {
+    if (!nextCursor) return;
+    
+    const requestId = transactionsRequest;
+    const button = document.getElementById('loadMoreTransactions');
+    button.disabled = true;
     try {
-        // Get new transactions from last 30 minutes
-        const thirtyMinutesAgo = new Date();
-        thirtyMinutesAgo.setMinutes(thirtyMinutesAgo.getMinutes() - 30);
-        
-        // Check if we have cached transaction details
-        const cachedDetails = localStorage.getItem('transactionDetails');
-        let detailsData = {};
-        
-        if (cachedDetails) {
-            detailsData = JSON.parse(cachedDetails);
-        }
-        
-        // Sort transactions: new ones first, then ones without cached details
-        const recentTransactions = allTransactions.filter(tx => 
-            new Date(tx.date) > thirtyMinutesAgo);
-        
-        const oldTransactions = allTransactions.filter(tx => 
-            new Date(tx.date) <= thirtyMinutesAgo);
-        
-        // ALWAYS fetch details for recent transactions (last 30 minutes)
-        if (recentTransactions.length > 0) {
-            console.log(`Fetching fresh details for ${recentTransactions.length} recent transactions`);
-            await fetchMissingDetails(recentTransactions, detailsData);
+        const response = await fetch(`/transactions/api/list/?${buildTransactionsQuery(nextCursor)}`);
+        if (!response.ok) {
+            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
         }
         
-        // For older transactions, use cache when available
-        for (const transaction of oldTransactions) {
-            if (detailsData[transaction.order_id]) {
-                transaction.items = detailsData[transaction.order_id];
-            }
-        }
+        const data = await response.json();
+        // The filters changed while this page was loading
+        if (requestId !== transactionsRequest) return;
         
-        // Fetch details for older transactions that don't have cached details
-        const uncachedOldTransactions = oldTransactions.filter(tx => !tx.items);
-        if (uncachedOldTransactions.length > 0) {
-            console.log(`Fetching details for ${uncachedOldTransactions.length} uncached older transactions`);
-            await fetchMissingDetails(uncachedOldTransactions, detailsData);
+        if (data.success) {
+            allTransactions = allTransactions.concat(data.transactions);
+            nextCursor = data.next_cursor;
+            renderTransactionsTable(data.transactions, true);
+            updateLoadMoreButton();
+        } else {
+            throw new Error(data.error || 'Failed to load more transactions');
         }
     } catch (error) {
-        console.error('Error in fetchTransactionDetails:', error);
+        console.error('Error loading more transactions:', error);
+        alert(`Failed to load more transactions: ${error.message}`);
+    } finally {
+        button.disabled = false;
     }
 }
 
+
 /**
- * Refresh all transaction data on page load/refresh
+ * Show the Load More button only while more pages exist
  */
-window.addEventListener('pageshow', function(event) {
-    // Check if the page is being loaded from cache (back/forward navigation)
-    // or if it's a fresh load/refresh
-    if (event.persisted || (window.performance && 
-        window.performance.navigation.type === window.performance.navigation.TYPE_RELOAD)) {
-        console.log('Page refreshed - forcing data reload');
-        
-        // Clear all localStorage cache
-        localStorage.removeItem('transactionData');
-        localStorage.removeItem('transactionTimestamp');
-        localStorage.removeItem('transactionDetails');
-        
-        // Fetch fresh transactions
-        fetchTransactions();
+function updateLoadMoreButton() {
+    const button = document.getElementById('loadMoreTransactions');
+    if (button) {
+        button.style.display = nextCursor ? 'inline-block' : 'none';
     }
-});
-
+}
 
 
 /**
- * Helper function to fetch only missing transaction details
+ * Apply orders created or changed since the last poll
+ *
+ * Asks the change feed for what changed after changesCursor and patches the
+ * loaded rows, so a refresh with nothing new costs a single small request
+ * instead of reloading the whole list. A burst larger than one page of the
+ * feed is read page after page straight away rather than one per poll.
  */
-async function fetchMissingDetails(transactions, detailsCache) {
-    for (const transaction of transactions) {
-        try {
-            const response = await fetch(`/transactions/api/details/${transaction.order_id}/`);
-            if (response.ok) {
-                const data = await response.json();
-                if (data.success && data.order) {
-                    // Add items to transaction
-                    transaction.items = data.order.items;
-                    
-                    // Add to cache
-                    detailsCache[transaction.order_id] = data.order.items;
-                }
-            }
-        } catch (error) {
-            console.error(`Error fetching details for order ${transaction.order_id}:`, error);
+async function fetchChanges() {
+    if (!changesCursor) return;
+    
+    const requestId = transactionsRequest;
+    const since = changesCursor;
+    try {
+        const params = new URLSearchParams(buildTransactionsQuery(null));
+        params.set('since', since);
+        const response = await fetch(`/transactions/api/changes/?${params}`, { cache: 'no-store' });
+        if (!response.ok) {
+            throw new Error(`Server returned ${response.status}: ${response.statusText}`);
+        }
+        
+        const data = await response.json();
+        // The filters changed while polling; the new list has its own cursor
+        if (requestId !== transactionsRequest || !data.success) return;
+        
+        changesCursor = data.cursor;
+        if (data.changes.length === 0) return;
+        
+        applyTransactionChanges(data.changes);
+        renderTransactionsTable(allTransactions);
+        
+        data.summary.recent = allTransactions[0] || null;
+        updateTransactionStatistics(data.summary);
+        updateItemStatistics({
+            top_items: data.summary.top_items,
+            least_items: data.summary.least_items
+        });
+        
+        // The feed stopped at its page size; read the rest now. A cursor
+        // that did not move would only fetch the same page again.
+        if (data.has_more && changesCursor !== since) {
+            fetchChanges();
         }
+    } catch (error) {
+        // The next poll tries again
+        console.error('Error fetching transaction changes:', error);
     }
-    
-    // Save updated cache
-    localStorage.setItem('transactionDetails', JSON.stringify(detailsCache));
 }
 
 
+/**
+ * Follow the live order stream
+ *
+ * The server pushes an event whenever an order is created or changes; the
+ * page then reads the change feed, which applies the current filters and
+ * refreshes the statistics. Browsers without EventSource keep polling, as
+ * do pages served without a stream: the server then answers 204, which
+ * closes the EventSource for good.
+ */
+function connectLiveOrders() {
+    if (!window.EventSource) return;
+    
+    liveOrders = new EventSource('/transactions/api/live/');
+    ['order_created', 'order_status', 'order_updated'].forEach(type => {
+        liveOrders.addEventListener(type, scheduleChanges);
+    });
+    // Catch up on anything missed while (re)connecting
+    liveOrders.addEventListener('open', scheduleChanges);
+    // The server dropped events for this page; reload the list
+    liveOrders.addEventListener('resync', fetchTransactions);
+    // A closed stream is not retried by the browser; the poll takes over
+    liveOrders.addEventListener('error', function() {
+        if (liveOrders.readyState === EventSource.CLOSED) {
+            liveOrders = null;
+        }
+    });
+}
 
 
+/**
+ * Read the change feed shortly, once per burst of live events
+ */
+function scheduleChanges() {
+    clearTimeout(changesTimer);
+    changesTimer = setTimeout(fetchChanges, 300);
+}
 
 
+/**
+ * Merge changed orders into the loaded transactions
+ * @param {Array} changes - Changed orders from the change feed
+ */
+function applyTransactionChanges(changes) {
+    // Orders older than the last loaded row arrive with Load More instead
+    const oldestLoaded = nextCursor && allTransactions.length ?
+        allTransactions[allTransactions.length - 1].date : null;
+    
+    changes.forEach(change => {
+        const index = allTransactions.findIndex(order => order.order_id === change.order_id);
+        if (!change.matches) {
+            // No longer passes the filters
+            if (index !== -1) allTransactions.splice(index, 1);
+        } else if (index !== -1) {
+            allTransactions[index] = change;
+        } else if (oldestLoaded === null || change.date >= oldestLoaded) {
+            allTransactions.push(change);
+        }
+    });
+    
+    // Keep the list newest first, as the server pages it
+    allTransactions.sort((a, b) => b.date - a.date);
+}
 
 
-
-
-
+/**
+ * Catch up when the page is restored from the back/forward cache
+ */
+window.addEventListener('pageshow', function(event) {
+    if (event.persisted) {
+        fetchChanges();
+    }
+});
 
 
 
@@ -354,12 +418,15 @@ async function fetchMissingDetails(transactions, detailsCache) {
 /**
  * Render transactions in the table
  * @param {Array} transactions - Array of transaction objects
+ * @param {boolean} append - Add the rows below the existing ones
  */
-function renderTransactionsTable(transactions) {
+function renderTransactionsTable(transactions, append = false) {
     const tableBody = document.getElementById('transactionsTable');
-    tableBody.innerHTML = '';
+    if (!append) {
+        tableBody.innerHTML = '';
+    }
     
-    if (transactions.length === 0) {
+    if (transactions.length === 0 && !append) {
         tableBody.innerHTML = `<tr><td colspan="5" class="no-data">No transactions found</td></tr>`;
         return;
     }
@@ -386,8 +453,9 @@ function renderTransactionsTable(transactions) {
         tableBody.appendChild(row);
     });
     
-    // Add event listeners to the view details buttons
-    document.querySelectorAll('.view-details-btn').forEach(button => {
+    // Add event listeners to the new view details buttons
+    tableBody.querySelectorAll('.view-details-btn:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', function() {
             const orderId = this.getAttribute('data-id');
             viewOrderDetails(orderId);
@@ -530,15 +598,13 @@ function closeDetailsModal() {
 
 /**
  * Handle search input
+ *
+ * Searches order IDs, student IDs and names on the server, once typing
+ * pauses.
  */
 function handleSearch() {
-    const searchText = document.getElementById('searchInput').value.toLowerCase();
-    const rows = document.querySelectorAll('#transactionsTable tr');
-    
-    rows.forEach(row => {
-        const text = row.textContent.toLowerCase();
-        row.style.display = text.includes(searchText) ? '' : 'none';
-    });
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(fetchTransactions, 300);
 }
 
 /**
@@ -546,7 +612,8 @@ function handleSearch() {
  */
 function clearSearch() {
     document.getElementById('searchInput').value = '';
-    handleSearch();
+    clearTimeout(searchTimer);
+    fetchTransactions();
 }
 
 /************************************************
@@ -566,59 +633,8 @@ function handleDateFilterChange() {
         document.getElementById('customDateRange').style.display = 'none';
         
         // Apply selected filter immediately
-        applyDateFilter(filterValue);
-    }
-}
-
-/**
- * Apply date filter to transactions
- * @param {string} filterType - Type of filter (all, today, week, month)
- */
-function applyDateFilter(filterType) {
-    if (!allTransactions || allTransactions.length === 0) return;
-    
-    const now = new Date();
-    let filteredTransactions = [];
-    
-    switch(filterType) {
-        case 'all':
-            filteredTransactions = [...allTransactions];
-            break;
-            
-        case 'today':
-            const today = new Date(now.getFullYear(), now.getMonth(), now.getDate()).getTime();
-            filteredTransactions = allTransactions.filter(transaction => {
-                const txDate = new Date(transaction.date);
-                return txDate >= today;
-            });
-            break;
-            
-        case 'week':
-            const weekAgo = new Date(now);
-            weekAgo.setDate(weekAgo.getDate() - 7);
-            filteredTransactions = allTransactions.filter(transaction => {
-                return new Date(transaction.date) >= weekAgo;
-            });
-            break;
-            
-        case 'month':
-            const monthAgo = new Date(now);
-            monthAgo.setDate(monthAgo.getDate() - 30);
-            filteredTransactions = allTransactions.filter(transaction => {
-                return new Date(transaction.date) >= monthAgo;
-            });
-            break;
+        fetchTransactions();
     }
-    
-    // Update the UI with filtered transactions
-    renderTransactionsTable(filteredTransactions);
-    
-    // THIS LINE IS MISSING - Update the transaction statistics based on filtered data
-    updateTransactionStatistics(filteredTransactions);
-    
-    // Calculate and update item statistics based on filtered transactions
-    const itemStats = calculateItemStats(filteredTransactions);
-    updateItemStatistics(itemStats);
 }
 
 /**
@@ -633,73 +649,11 @@ function applyCustomDateRange() {
         return;
     }
     
-    // Convert to Date objects and set time to start/end of day
-    const start = new Date(startDate);
-    const end = new Date(endDate);
-    end.setHours(23, 59, 59, 999); // End of day
-    
-    const filteredTransactions = allTransactions.filter(transaction => {
-        const txDate = new Date(transaction.date);
-        return txDate >= start && txDate <= end;
-    });
-    
-    // Update the UI with filtered transactions
-    renderTransactionsTable(filteredTransactions);
-    
-    // THIS LINE IS MISSING - Update the transaction statistics based on filtered data
-    updateTransactionStatistics(filteredTransactions);
-    
-    // Calculate and update item statistics based on filtered transactions
-    const itemStats = calculateItemStats(filteredTransactions);
-    updateItemStatistics(itemStats);
+    fetchTransactions();
 }
 
 
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
 /**
  * Generate random pastel colors for charts
  * @param {number} count - Number of colors to generate
@@ -846,16 +800,8 @@ if (itemsCountFilter) {
         itemsCountValue.textContent = this.value;
     });
     
-    // Keep your existing change event listener for filtering
-    itemsCountFilter.addEventListener('change', function() {
-        // Re-apply the current date filter to update the display
-        const currentFilter = document.getElementById('dateFilter').value;
-        if (currentFilter === 'custom') {
-            applyCustomDateRange();
-        } else {
-            applyDateFilter(currentFilter);
-        }
-    });
+    // The item statistics come from the server with the first page
+    itemsCountFilter.addEventListener('change', fetchTransactions);
 }
 
 
@@ -918,35 +864,8 @@ async function updateOrderStatus(orderId, newStatus) {
                 }
             }
             
-            // FIX: Update the localStorage cache too
-            const cachedDataString = localStorage.getItem('transactionData');
-            if (cachedDataString) {
-                const cachedData = JSON.parse(cachedDataString);
-                if (cachedData.transactions) {
-                    for (let i = 0; i < cachedData.transactions.length; i++) {
-                        if (cachedData.transactions[i].order_id === orderId) {
-                            cachedData.transactions[i].status = newStatus;
-                            localStorage.setItem('transactionData', JSON.stringify(cachedData));
-                            console.log(`Updated cached status for order ${orderId} to ${newStatus}`);
-                            break;
-                        }
-                    }
-                }
-            }
-            
-            // Update transaction details cache if it exists
-            const detailsCacheString = localStorage.getItem('transactionDetails');
-            if (detailsCacheString) {
-                const detailsCache = JSON.parse(detailsCacheString);
-                if (detailsCache[orderId]) {
-                    const orderDetails = detailsCache[orderId];
-                    // If the cached details include status, update it
-                    if (orderDetails.status !== undefined) {
-                        orderDetails.status = newStatus;
-                        localStorage.setItem('transactionDetails', JSON.stringify(detailsCache));
-                    }
-                }
-            }
+            // Bring the new status into the statistics
+            fetchChanges();
             
             // Refresh the order details view
             viewOrderDetails(orderId);
@@ -1,3 +1,302 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
 
-# Create your tests here.
+from io import BytesIO
+
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from cafeteria_management_system.query_budget import QueryBudgetMixin
+from managepayments.models import DeliveryInfo
+from shop.models import Order, OrderItem
+from shop.pagination import encode_cursor
+from transactions.export import export_rows
+
+
+class TransactionsQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """The manager's transaction views must not query once per order."""
+
+    def setUp(self):
+        self.login_manager()
+        self.orders = self.seed_orders(5)
+
+    def test_transactions_page(self):
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('transactions:transactions')))
+
+    def test_list_transactions(self):
+        # Session, manager, the ETag aggregate, the page and the summary
+        response = self.assertQueryBudget(5, lambda: self.client.get(reverse('transactions:list_transactions')))
+        transactions = response.json()['transactions']
+        self.assertEqual(len(transactions), 25)
+        # Totals come from the stored column, not per-order item queries
+        order = self.orders[0]
+        expected = sum(item.price * item.quantity for item in order.items.all())
+        listed = next(t for t in transactions if t['order_id'] == order.order_id)
+        self.assertEqual(listed['total'], float(expected))
+
+    def test_list_transactions_summary(self):
+        url = reverse('transactions:list_transactions')
+        # Item statistics add one grouped query, whatever the number of orders
+        response = self.assertQueryBudget(6, lambda: self.client.get(url, {'items': 3, 'limit': 10}))
+        data = response.json()
+        self.assertEqual(len(data['transactions']), 10)
+        self.assertIsNotNone(data['next_cursor'])
+
+        # The summary covers every matching order, not just the first page
+        summary = data['summary']
+        orders = Order.objects.all()
+        self.assertEqual(summary['count'], orders.count())
+        self.assertAlmostEqual(summary['revenue'], float(sum(order.total_amount for order in orders)))
+        self.assertEqual(summary['by_status']['in_progress'], orders.count())
+        self.assertEqual(summary['recent']['order_id'], data['transactions'][0]['order_id'])
+        self.assertEqual(len(summary['top_items']), 3)
+        sold = {}
+        for item in OrderItem.objects.all():
+            sold[item.name] = sold.get(item.name, 0) + item.quantity
+        top = sorted(sold.items(), key=lambda pair: (-pair[1], pair[0]))[:3]
+        self.assertEqual([(item['name'], item['count']) for item in summary['top_items']], top)
+
+    def test_list_transactions_pages(self):
+        url = reverse('transactions:list_transactions')
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 7, 'cursor': cursor} if cursor else {'limit': 7}
+            data = self.client.get(url, params).json()
+            # Only the first page carries the summary
+            self.assertEqual('summary' in data, cursor is None)
+            seen.extend(row['order_id'] for row in data['transactions'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = list(Order.objects.order_by('-date_created', '-id').values_list('order_id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_list_transactions_filters(self):
+        url = reverse('transactions:list_transactions')
+        order = self.orders[0]
+        Order.objects.filter(pk=order.pk).update(status='successful')
+        old = self.orders[1]
+        Order.objects.filter(pk=old.pk).update(date_created=timezone.now() - timedelta(days=10))
+
+        def listed(**params):
+            return [row['order_id'] for row in self.client.get(url, params).json()['transactions']]
+
+        self.assertEqual(listed(status='successful'), [order.order_id])
+        self.assertNotIn(order.order_id, listed(status='pending,in_progress'))
+        self.assertEqual(listed(q=order.student_id.upper()), [order.order_id])
+        self.assertTrue(all(row['payment_method'] == 'upi' for row in self.client.get(
+            url, {'payment_method': 'upi'}).json()['transactions']))
+        self.assertNotIn(old.order_id, listed(period='week'))
+        self.assertIn(old.order_id, listed(period='month'))
+        day = timezone.localdate(timezone.now() - timedelta(days=10)).isoformat()
+        self.assertEqual(listed(start=day, end=day), [old.order_id])
+
+    def test_list_transactions_bad_params(self):
+        url = reverse('transactions:list_transactions')
+        for params in ({'status': 'lost'}, {'period': 'year'}, {'start': '2024-13-01'}, {'cursor': 'nonsense'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(response.json()['success'])
+
+    def test_transaction_changes(self):
+        list_url = reverse('transactions:list_transactions')
+        changes_url = reverse('transactions:transaction_changes')
+        # Start the feed from before the seeded orders were written
+        Order.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        cursor = self.client.get(list_url).json()['changes_cursor']
+
+        # Nothing changed: one indexed query besides the session and manager
+        with self.assertMaxQueries(3):
+            response = self.client.get(changes_url, {'since': cursor})
+        data = response.json()
+        self.assertEqual(data['changes'], [])
+        self.assertNotIn('summary', data)
+
+        order = self.orders[0]
+        self.client.post(reverse('transactions:update_order_status', args=[order.order_id]),
+                         json.dumps({'status': 'successful'}), content_type='application/json')
+        # Changes add one query for the filters and one for the summary
+        with self.assertMaxQueries(5):
+            response = self.client.get(changes_url, {'since': cursor, 'status': 'in_progress'})
+        data = response.json()
+        self.assertEqual([(c['order_id'], c['status'], c['matches']) for c in data['changes']],
+                         [(order.order_id, 'successful', False)])
+        self.assertEqual(data['summary']['count'], Order.objects.filter(status='in_progress').count())
+
+        # The cursor trails the clock, so a change may be sent again but is
+        # never skipped; once it is older than the lag it is not repeated
+        self.assertEqual(len(self.client.get(changes_url, {'since': data['cursor']}).json()['changes']), 1)
+        Order.objects.filter(pk=order.pk).update(updated_at=timezone.now() - timedelta(seconds=30))
+        cursor = self.client.get(changes_url, {'since': cursor}).json()['cursor']
+        self.assertEqual(self.client.get(changes_url, {'since': cursor}).json()['changes'], [])
+
+    def test_transaction_changes_bad_params(self):
+        url = reverse('transactions:transaction_changes')
+        for params in ({}, {'since': 'nonsense'}, {'since': encode_cursor(timezone.now(), 0), 'period': 'year'}):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_list_transactions_not_modified(self):
+        url = reverse('transactions:list_transactions')
+        etag = self.client.get(url)['ETag']
+
+        # An unchanged list costs the session, the manager and one aggregate
+        with self.assertMaxQueries(3):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.client.post(reverse('transactions:update_order_status', args=[self.orders[0].order_id]),
+                         json.dumps({'status': 'successful'}), content_type='application/json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_order_details(self):
+        order_id = self.orders[0].order_id
+        self.assertQueryBudget(4, lambda: self.client.get(reverse('transactions:order_details', args=[order_id])))
+
+    def test_export_transactions(self):
+        for filter_type in ['all', 'today', 'week', 'month']:
+            with self.subTest(filter=filter_type):
+                # Two sums over the daily rollups for the summary, one streamed query for the rows
+                self.assertQueryBudget(
+                    5, lambda: self.client.get(reverse('transactions:export_transactions'), {'filter': filter_type})
+                )
+
+    def test_export_workbook(self):
+        response = self.client.get(reverse('transactions:export_transactions'))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="all_transactions.xlsx"')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Summary Statistics', 'Transaction Data'])
+
+        orders = Order.objects.order_by('-date_created', '-id')
+        summary = workbook['Summary Statistics']
+        self.assertEqual(summary['B6'].value, orders.count())
+        self.assertEqual(summary['B7'].value, f"₹{sum(order.total_amount for order in orders):.2f}")
+        self.assertEqual(summary['E8'].value, orders.filter(payment_method='cash').count())
+        self.assertEqual(summary['E10'].value, DeliveryInfo.objects.count())
+        self.assertEqual([chart.tagname for chart in summary._charts], ['pieChart', 'pieChart'])
+        self.assertIn('A1:D1', summary.merged_cells)
+
+        rows = list(workbook['Transaction Data'].iter_rows(values_only=True))
+        self.assertEqual(rows[0][0], 'Order ID')
+        self.assertEqual([row[0] for row in rows[1:]], [order.order_id for order in orders])
+        self.assertEqual(rows[1][4], float(orders[0].total_amount))
+
+    def test_export_csv(self):
+        url = reverse('transactions:export_transactions')
+        # Session, manager, then the orders and their items per page
+        content = self.assertQueryBudget(
+            4, lambda: b''.join(self.client.get(url, {'format': 'csv'}).streaming_content)
+        )
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="all_transactions.csv"')
+
+        rows = list(csv.DictReader(io.StringIO(content.decode())))
+        self.assertEqual(len(rows), OrderItem.objects.count())
+        order = Order.objects.order_by('-date_created', '-id').first()
+        first = [row for row in rows if row['order_id'] == order.order_id]
+        self.assertEqual([(row['item_name'], int(row['item_quantity'])) for row in first],
+                         list(order.items.order_by('id').values_list('name', 'quantity')))
+        self.assertEqual(first[0]['total_amount'], str(order.total_amount))
+
+    def test_export_ndjson_gzip(self):
+        response = self.client.get(reverse('transactions:export_transactions'), {'format': 'ndjson', 'filter': 'today'},
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual(len(rows), OrderItem.objects.count())
+
+        delivery = DeliveryInfo.objects.select_related('order').first()
+        delivered = next(row for row in rows if row['order_id'] == delivery.order.order_id)
+        self.assertEqual((delivered['classroom'], delivered['floor_number']), (delivery.classroom, delivery.floor_number))
+
+    def test_export_rows_pages(self):
+        batches = list(export_rows(Order.objects.all(), batch_size=2))
+        self.assertEqual(len(batches), 3)
+        order_ids = list(dict.fromkeys(row['order_id'] for batch in batches for row in batch))
+        self.assertEqual(order_ids, list(Order.objects.order_by('-date_created', '-id').values_list('order_id', flat=True)))
+
+    def test_export_unknown_format(self):
+        response = self.client.get(reverse('transactions:export_transactions'), {'format': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_update_order_status(self):
+        order = self.orders[3]
+        delivery = DeliveryInfo.objects.get(order=order)
+        # Repeated with the same status, so no rollup writes: the locked
+        # status read and its savepoint are the only cost of the rollups
+        self.assertQueryBudget(10, lambda: self.client.post(
+            reverse('transactions:update_order_status', args=[order.order_id]),
+            json.dumps({'status': 'successful', 'delivery_id': delivery.id}),
+            content_type='application/json',
+        ))
+
+    def test_delivery_orders(self):
+        response = self.assertQueryBudget(3, lambda: self.client.get(reverse('transactions:view_delivery_orders')))
+        # The page polls the change feed from here when it has no live stream
+        cursor = response.context['changes_cursor']
+        changes = self.client.get(reverse('transactions:transaction_changes'), {'since': cursor}).json()
+        self.assertTrue(changes['success'])
+
+
+@override_settings(LIVE_ORDERS_POLL_INTERVAL=0.05, LIVE_ORDERS_HEARTBEAT=0.2)
+class LiveOrdersTests(QueryBudgetMixin, TestCase):
+    """The live stream pushes order changes as Server-Sent Events."""
+
+    def setUp(self):
+        self.login_manager()
+        self.async_client.cookies = self.client.cookies
+
+    async def _next_event(self, stream):
+        """Read the next event, skipping keepalive comments."""
+        while True:
+            chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+            if not chunk.startswith(':'):
+                event, data = chunk.strip().split('\n')
+                return event[len('event: '):], json.loads(data[len('data: '):])
+
+    async def test_streams_new_orders_and_status_changes(self):
+        response = await self.async_client.get(reverse('transactions:live_orders'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+            [order] = await sync_to_async(self.seed_orders)(1)
+            event, data = await self._next_event(stream)
+            self.assertEqual((event, data['order_id'], data['status']),
+                             ('order_created', order.order_id, 'in_progress'))
+
+            order.status = 'successful'
+            await sync_to_async(order.save)()
+            event, data = await self._next_event(stream)
+            self.assertEqual((event, data['order_id'], data['status']),
+                             ('order_status', order.order_id, 'successful'))
+        finally:
+            await stream.aclose()
+
+    async def test_requires_manager(self):
+        self.async_client.cookies.clear()
+        response = await self.async_client.get(reverse('transactions:live_orders'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_no_stream_under_wsgi(self):
+        # The sync client builds a WSGIRequest; the console falls back to polling
+        with self.assertMaxQueries(2):
+            response = self.client.get(reverse('transactions:live_orders'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
@@ -6,6 +6,8 @@ app_name = 'transactions'
 urlpatterns = [
     path('', views.transactions_view, name='transactions'),
     path('api/list/', views.get_transactions, name='list_transactions'),
+    path('api/changes/', views.get_transaction_changes, name='transaction_changes'),
+    path('api/live/', views.live_orders, name='live_orders'),
     path('api/details/<str:order_id>/', views.get_order_details, name='order_details'),
     path('api/export/', views.export_transactions, name='export_transactions'),
     path('api/update-status/<str:order_id>/', views.update_order_status, name='update_order_status'),
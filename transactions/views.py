@@ -10,12 +10,27 @@ from rest_framework import status
 from datetime import datetime, timedelta
 from import_export.formats.base_formats import XLSX
 from .resources import TransactionResource
-from django.http import HttpResponse
+from .export import (
+    STREAM_FORMATS, XLSX_CONTENT_TYPE, csv_chunks, export_period, ndjson_chunks, write_transactions_workbook,
+)
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from datetime import datetime, timedelta
-import pytz
+import asyncio
 import json
+import re
+import tempfile
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from cafeteria_management_system.conditional import conditional_on
 from managers.decorators import manager_required
+from shop.user_cache import bump_order_owner
 from managepayments.models import DeliveryInfo, DeliveryStatus
+from django.db.models import Count, Q, Sum
+from shop.order_events import ORDER_FIELDS, changes_floor, hub, notify_order_change, order_row, read_changes
+from shop.rollups import save_order_status
+from shop.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page, page_size
 
 
 @manager_required
@@ -24,35 +39,247 @@ def transactions_view(request):
     return render(request, 'transactions/transactions.html')
 
 
+# Orders per page of the transactions list, and the most a client may ask for
+TRANSACTIONS_PAGE_SIZE = 50
+TRANSACTIONS_MAX_PAGE_SIZE = 200
+# Most top and least sold items the list summary reports
+MAX_ITEM_STATS = 10
+# Length in days of the relative date filters; today starts at local midnight
+PERIOD_DAYS = {'week': 7, 'month': 30}
+# Same test GZipMiddleware uses for Accept-Encoding
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+# Most changed orders one poll of the change feed returns
+CHANGES_PAGE_SIZE = 200
+
+
+def _parse_day(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+
+
+def _filtered_transactions(params):
+    """
+    Orders matching the transactions list filters.
+
+    Every filter is applied in the database, so the page and the summary
+    are computed over the same rows without loading the others.
+
+    Args:
+        params: Query parameters; any of status (comma-separated),
+            payment_method, period (today, week, month or all), start and
+            end (YYYY-MM-DD, inclusive, in the cafeteria's time zone) and q
+            (part of an order ID, student ID or name)
+
+    Returns:
+        Unordered Order queryset
+
+    Raises:
+        ValueError: If a parameter is not valid
+    """
+    orders = Order.objects.all()
+
+    statuses = [value for value in params.get('status', '').split(',') if value]
+    if statuses:
+        valid = {choice for choice, _ in Order.ORDER_STATUS_CHOICES}
+        unknown = set(statuses) - valid
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        orders = orders.filter(status__in=statuses)
+
+    if params.get('payment_method'):
+        orders = orders.filter(payment_method=params['payment_method'])
+
+    # Date filters are ranges on date_created so order_date_id_idx serves them
+    period = params.get('period', 'all')
+    now = timezone.now()
+    if period == 'today':
+        orders = orders.filter(date_created__gte=timezone.localtime(now).replace(
+            hour=0, minute=0, second=0, microsecond=0))
+    elif period in PERIOD_DAYS:
+        orders = orders.filter(date_created__gte=now - timedelta(days=PERIOD_DAYS[period]))
+    elif period != 'all':
+        raise ValueError(f"Unknown period: {period}")
+
+    if params.get('start'):
+        start = _parse_day(params['start'], 'start')
+        orders = orders.filter(date_created__gte=timezone.make_aware(datetime.combine(start, datetime.min.time())))
+    if params.get('end'):
+        end = _parse_day(params['end'], 'end') + timedelta(days=1)
+        orders = orders.filter(date_created__lt=timezone.make_aware(datetime.combine(end, datetime.min.time())))
+
+    search = params.get('q', '').strip()
+    if search:
+        orders = orders.filter(
+            Q(order_id__icontains=search) | Q(student_id__icontains=search) | Q(name__icontains=search)
+        )
+
+    return orders
+
+
+def _transactions_summary(orders, item_limit=0):
+    """
+    Summary statistics over filtered orders.
+
+    Counts, revenue and the count per status come from one aggregate query;
+    item sales, when asked for, from one grouped query over the items.
+
+    Args:
+        orders: Filtered Order queryset
+        item_limit: Number of top and least sold items to include; 0 skips
+            the item query
+
+    Returns:
+        Dictionary with count, revenue, average, by_status, and top_items and
+        least_items as lists of {name, count}
+    """
+    per_status = {
+        f"status_{value}": Count('id', filter=Q(status=value)) for value, _ in Order.ORDER_STATUS_CHOICES
+    }
+    totals = orders.order_by().aggregate(count=Count('id'), revenue=Sum('total_amount'), **per_status)
+    revenue = totals['revenue'] or 0
+    summary = {
+        'count': totals['count'],
+        'revenue': float(revenue),
+        'average': float(revenue / totals['count']) if totals['count'] else 0.0,
+        'by_status': {value: totals[f"status_{value}"] for value, _ in Order.ORDER_STATUS_CHOICES},
+        'top_items': [],
+        'least_items': [],
+    }
+
+    if item_limit:
+        # The menu is small, so every item's total fits in one result
+        item_counts = [
+            {'name': row['name'], 'count': row['count']}
+            for row in (
+                OrderItem.objects.filter(order__in=orders.values('id'))
+                .values('name')
+                .annotate(count=Sum('quantity'))
+                .order_by('-count', 'name')
+            )
+        ]
+        summary['top_items'] = item_counts[:item_limit]
+        summary['least_items'] = sorted(item_counts, key=lambda item: (item['count'], item['name']))[:item_limit]
+
+    return summary
+
+
+def _filtered_transactions_or_none(request):
+    """The orders behind a transactions list response, for conditional GETs."""
+    try:
+        return _filtered_transactions(request.GET)
+    except ValueError:
+        return Order.objects.none()
+
+
 @manager_required
+@conditional_on(_filtered_transactions_or_none, vary_func=lambda request: request.GET.urlencode())
 def get_transactions(request):
-    """API endpoint to get all transactions"""
+    """
+    API endpoint to list transactions, a page at a time.
+
+    Query parameters:
+        status, payment_method, period, start, end, q: Filters, see
+            _filtered_transactions
+        cursor: next_cursor from the previous page; omit for the first page
+        limit: Orders per page (default 50, at most 200)
+        items: Number of top and least sold items in the summary (at most 10)
+
+    Returns the page as transactions, a next_cursor that is null on the last
+    page and, on the first page only, a summary of all matching orders. The
+    cost of a page does not depend on how many orders exist; totals are
+    stored on the order, so items are never read for the page itself.
+    Answers 304 when no matching order was added, changed or deleted since
+    the ETag the client sends in If-None-Match.
+    """
     try:
-        # Get all orders
-        orders = Order.objects.all().order_by('-date_created')
+        try:
+            orders = _filtered_transactions(request.GET)
+            cursor = request.GET.get('cursor')
+            rows, next_cursor = keyset_page(
+                orders,
+                cursor=cursor,
+                limit=page_size(request.GET.get('limit'), TRANSACTIONS_PAGE_SIZE, TRANSACTIONS_MAX_PAGE_SIZE),
+                fields=ORDER_FIELDS,
+            )
+        except (ValueError, InvalidCursor) as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
         
         # Format the orders
-        formatted_orders = []
-        for order in orders:
-            # Calculate total
-            total = sum(item.price * item.quantity for item in OrderItem.objects.filter(order=order))
-            
-            # Format the date
-            date_timestamp = int(order.date_created.timestamp() * 1000)
-            
-            # Format the order
-            formatted_orders.append({
-                'order_id': order.order_id,
-                'student_id': order.student_id,
-                'date': date_timestamp,
-                'total': float(total),
-                'status': order.status  # Make sure this is included!
-            })
+        formatted_orders = [order_row(row) for row in rows]
         
+        data = {
+            'success': True,
+            'transactions': formatted_orders,
+            'next_cursor': next_cursor,
+        }
+        
+        # Later pages only extend the table; the summary comes with the first
+        if not cursor:
+            items = request.GET.get('items')
+            item_limit = page_size(items, maximum=MAX_ITEM_STATS) if items else 0
+            data['summary'] = _transactions_summary(orders, item_limit)
+            data['summary']['recent'] = formatted_orders[0] if formatted_orders else None
+            # Where to start following /api/changes/ from
+            data['changes_cursor'] = encode_cursor(*changes_floor())
+        
+        return JsonResponse(data)
+    except Exception as e:
         return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=500)
+
+
+@manager_required
+def get_transaction_changes(request):
+    """
+    API endpoint listing orders created or changed since a cursor.
+
+    Lets the transactions page stay current without reloading the list: a
+    poll with nothing new is one indexed query, and otherwise returns just
+    the changed orders, oldest change first.
+
+    Query parameters:
+        since: changes_cursor from the first list page, or cursor from the
+            previous poll
+        status, payment_method, period, start, end, q: The list's filters
+        items: As for the list summary
+
+    Returns changes, each order with matches set to whether it passes the
+    filters (the client drops rows that stopped matching), the cursor for
+    the next poll and has_more when the poll was cut short. When anything
+    changed, summary holds fresh statistics for the filtered orders, as on
+    the first list page but without recent. Deleted orders are not reported.
+    """
+    try:
+        try:
+            since = request.GET.get('since')
+            if not since:
+                raise ValueError("since is required")
+            since = decode_cursor(since)
+            orders = _filtered_transactions(request.GET)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        
+        rows, cursor, has_more = read_changes(since, CHANGES_PAGE_SIZE)
+        
+        data = {
             'success': True,
-            'transactions': formatted_orders
-        })
+            'changes': [],
+            'cursor': encode_cursor(*cursor),
+            'has_more': has_more,
+        }
+        if rows:
+            matching = set(orders.filter(id__in=[row['id'] for row in rows]).order_by().values_list('id', flat=True))
+            data['changes'] = [dict(order_row(row), matches=row['id'] in matching) for row in rows]
+            items = request.GET.get('items')
+            data['summary'] = _transactions_summary(
+                orders, page_size(items, maximum=MAX_ITEM_STATS) if items else 0
+            )
+        
+        return JsonResponse(data)
     except Exception as e:
         return JsonResponse({
             'success': False,
@@ -60,6 +287,52 @@ def get_transactions(request):
         }, status=500)
 
 
+def _sse_event(event, data):
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@manager_required
+async def live_orders(request):
+    """
+    Stream new orders and status changes to a manager console.
+
+    A Server-Sent Events stream: each message's event is order_created,
+    order_status or order_updated and its data the order as in the list
+    API. After a resync event the client should reload instead, as it fell
+    too far behind. All streams of a process share one poller (see
+    shop.order_events), so open consoles do not add database load.
+
+    Needs an ASGI server. Under WSGI the endless stream would tie up a
+    worker for as long as the console stays open, so the view answers 204
+    instead: browsers do not reconnect after a 204, and the consoles fall
+    back to polling the change feed.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def stream():
+        queue = hub.subscribe()
+        try:
+            # Reconnect after 5 seconds if the connection drops
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), settings.LIVE_ORDERS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse_event(event, data)
+        finally:
+            hub.unsubscribe(queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @manager_required
 def get_order_details(request, order_id):
     """API endpoint to get details of a specific order"""
@@ -70,8 +343,8 @@ def get_order_details(request, order_id):
         # Get order items
         order_items = OrderItem.objects.filter(order=order)
         
-        # Calculate total
-        total = sum(item.price * item.quantity for item in order_items)
+        # Total stored when the order was written
+        total = order.total_amount
         
         # Format the date
         date_timestamp = int(order.date_created.timestamp() * 1000)
@@ -409,297 +682,39 @@ def get_order_details(request, order_id):
 
 @manager_required
 def export_transactions(request):
-    """Export transactions to Excel based on filter with statistics"""
-    # --- IMPORT LIBRARIES ---
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, Alignment, PatternFill
-    # Add these imports for charts
-    from openpyxl.chart import PieChart, Reference
-    from openpyxl.chart.label import DataLabelList
-    
-    # --- FILTER SETUP ---
-    # Get filter type parameter from request (defaults to 'all')
-    filter_type = request.GET.get('filter', 'all')
-    
-    # --- TRANSACTION FILTERING BASED ON TIME PERIOD ---
-    now = datetime.now()
-    if filter_type == 'today':
-        today = now.date()
-        queryset = Order.objects.filter(date_created__date=today)
-        filename = f"transactions_{today}.xlsx"
-        date_range = f"Date: {today}"
-    elif filter_type == 'week':
-        week_ago = now - timedelta(days=7)
-        queryset = Order.objects.filter(date_created__gte=week_ago)
-        filename = "transactions_last7days.xlsx"
-        date_range = f"Period: {week_ago.date()} to {now.date()}"
-    elif filter_type == 'month':
-        month_ago = now - timedelta(days=30)
-        queryset = Order.objects.filter(date_created__gte=month_ago)
-        filename = "transactions_last30days.xlsx"
-        date_range = f"Period: {month_ago.date()} to {now.date()}"
-    else:
-        # Default: all transactions
-        queryset = Order.objects.all()
-        filename = "all_transactions.xlsx"
-        date_range = "All Time"
-    
-    # --- EXCEL WORKBOOK CREATION ---
-    # Create workbook with two sheets: stats and transaction data
-    wb = Workbook()
-    stats_sheet = wb.active
-    stats_sheet.title = "Summary Statistics"
-    data_sheet = wb.create_sheet(title="Transaction Data")
-    
-    # --- CALCULATE BASIC STATISTICS ---
-    # Count and financial calculations
-    total_transactions = queryset.count()
-    total_revenue = sum(sum(item.price * item.quantity for item in OrderItem.objects.filter(order=order)) for order in queryset) if total_transactions > 0 else 0
-    avg_order_value = total_revenue / total_transactions if total_transactions > 0 else 0
-    
-    # --- CALCULATE ITEM STATISTICS ---
-    # Build dictionary of item counts from order items
-    item_counts = {}
-    order_items = OrderItem.objects.filter(order__in=queryset)
-    for item in order_items:
-        if item.name in item_counts:
-            item_counts[item.name] += item.quantity
+    """
+    Export transactions for a period (?filter=today, week, month or all).
+
+    The default format is the Excel report with statistics. ?format=csv or
+    ?format=ndjson streams the raw rows instead, one per order item with
+    delivery details, gzip-compressed on the fly when the client accepts it.
+    """
+    queryset, filename, date_range, days = export_period(request.GET.get('filter', 'all'))
+    
+    export_format = request.GET.get('format', 'xlsx')
+    if export_format in STREAM_FORMATS:
+        content_type, extension = STREAM_FORMATS[export_format]
+        chunks = csv_chunks(queryset) if export_format == 'csv' else ndjson_chunks(queryset)
+        # Each chunk is a page of orders, compressed and flushed as it comes
+        if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = StreamingHttpResponse(
+                compress_sequence(chunk.encode() for chunk in chunks), content_type=content_type
+            )
+            response['Content-Encoding'] = 'gzip'
         else:
-            item_counts[item.name] = item.quantity
-    
-    # Sort items by popularity for charts
-    sorted_items = sorted(item_counts.items(), key=lambda x: x[1], reverse=True)
-    top_items = sorted_items[:5] if len(sorted_items) >= 5 else sorted_items
-    least_items = sorted_items[-5:] if len(sorted_items) >= 5 else sorted_items
-    least_items.reverse()
-    
-    # --- STYLE DEFINITIONS ---
-    # Define cell styles for consistent formatting
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True)
-    header_align = Alignment(horizontal="center", vertical="center")
-    
-    # --- REPORT HEADER SECTION ---
-    # Add report title
-    stats_sheet['A1'] = "Cafeteria Management System - Transaction Report"
-    stats_sheet['A1'].font = Font(bold=True, size=16)
-    stats_sheet.merge_cells('A1:D1')
-    
-    # Add date range information
-    stats_sheet['A3'] = date_range
-    stats_sheet['A3'].font = Font(bold=True)
-
-    # Add download timestamp in IST timezone
-    ist_timezone = pytz.timezone('Asia/Kolkata')
-    ist_now = now.astimezone(ist_timezone)
-    download_time = ist_now.strftime('%d/%m/%Y %H:%M:%S')
-    stats_sheet['A4'] = f"Report Downloaded On: {download_time} IST"
-    stats_sheet['A4'].font = Font(italic=True)
-    
-    # --- BASIC STATISTICS SECTION ---
-    # Add key metrics to the report
-    stats_sheet['A6'] = "Total Transactions:"
-    stats_sheet['B6'] = total_transactions
-    
-    stats_sheet['A7'] = "Total Revenue:"
-    stats_sheet['B7'] = f"₹{total_revenue:.2f}"
-    
-    stats_sheet['A8'] = "Average Order Value:"
-    stats_sheet['B8'] = f"₹{avg_order_value:.2f}"
-    
-    # --- TOP SOLD ITEMS SECTION ---
-    # Add section title and headers
-    stats_sheet['A10'] = "Top Sold Items"
-    stats_sheet['A10'].font = Font(bold=True)
-    stats_sheet['A11'] = "Item Name"
-    stats_sheet['B11'] = "Quantity"
-    
-    # Style the header row
-    for cell in stats_sheet['A11:B11'][0]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-    
-    # Add top selling items data to the table
-    row = 12
-    for item_name, count in top_items:
-        stats_sheet[f'A{row}'] = item_name
-        stats_sheet[f'B{row}'] = count
-        row += 1
-    
-    top_items_end_row = row - 1
-    
-    # --- TOP ITEMS CHART ---
-    # Create pie chart for top selling items
-    pie1 = PieChart()
-    pie1.title = "Top Sold Items"
-    labels = Reference(stats_sheet, min_col=1, min_row=12, max_row=top_items_end_row)
-    data = Reference(stats_sheet, min_col=2, min_row=11, max_row=top_items_end_row)
-    pie1.add_data(data, titles_from_data=True)
-    pie1.set_categories(labels)
-    pie1.height = 10
-    pie1.width = 15
-    
-    # Configure chart data labels
-    pie1.dataLabels = DataLabelList()
-    pie1.dataLabels.showPercent = True
-    pie1.dataLabels.showVal = True
-    pie1.dataLabels.showCatName = True
-    
-    # Position the chart in the sheet
-    stats_sheet.add_chart(pie1, "E15")
-    
-    # --- LEAST SOLD ITEMS SECTION ---
-    # Add section title with spacing after top items
-    stats_sheet[f'A{row+2}'] = "Least Sold Items"
-    stats_sheet[f'A{row+2}'].font = Font(bold=True)
-    stats_sheet[f'A{row+3}'] = "Item Name"
-    stats_sheet[f'B{row+3}'] = "Quantity"
-    
-    # Style the header row
-    for cell in stats_sheet[f'A{row+3}:B{row+3}'][0]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-    
-    # Add least selling items data to the table
-    least_start_row = row + 4
-    row = least_start_row
-    
-    for item_name, count in least_items:
-        stats_sheet[f'A{row}'] = item_name
-        stats_sheet[f'B{row}'] = count
-        row += 1
-    
-    least_end_row = row - 1
-    
-    # --- LEAST ITEMS CHART ---
-    # Create pie chart for least selling items
-    pie2 = PieChart()
-    pie2.title = "Least Sold Items"
-    labels = Reference(stats_sheet, min_col=1, min_row=least_start_row, max_row=least_end_row)
-    data = Reference(stats_sheet, min_col=2, min_row=least_start_row-1, max_row=least_end_row)
-    pie2.add_data(data, titles_from_data=True)
-    pie2.set_categories(labels)
-    pie2.height = 10
-    pie2.width = 15
-    
-    # Configure chart data labels
-    pie2.dataLabels = DataLabelList()
-    pie2.dataLabels.showPercent = True
-    pie2.dataLabels.showVal = False
-    pie2.dataLabels.showCatName = True
-    
-    # Position the chart below the first chart
-    stats_sheet.add_chart(pie2, "E37")
-    
-    # Set column widths for better readability
-    for col in ['A', 'B', 'C', 'D']:
-        stats_sheet.column_dimensions[col].width = 20
-    
-    # --- DUPLICATE AVERAGE ORDER VALUE (redundant, can be removed) ---
-    stats_sheet['A8'] = "Average Order Value:"
-    stats_sheet['B8'] = f"₹{avg_order_value:.2f}"
-
-    # --- PAYMENT METHOD STATISTICS SECTION ---
-    # Initialize counters for payment methods
-    cash_orders = 0
-    online_orders = 0
-    deliver_to_class = 0
-
-    # Count orders by payment method and delivery type
-    for order in queryset:
-        # Check payment method with safety check for attribute existence
-        payment_method = order.payment_method.lower() if hasattr(order, 'payment_method') and order.payment_method else ""
-        
-        # Classify and count by payment method
-        if payment_method in ['cash', 'cod', 'cash on delivery']:
-            cash_orders += 1
-        elif 'upi' in payment_method or payment_method == 'online':
-            online_orders += 1
-            
-        # Count orders with delivery info (class delivery) - independent of payment method
-        if hasattr(order, 'delivery_info') and order.delivery_info:
-            deliver_to_class += 1
-        # Also check if payment_method contains classroom_delivery
-        elif payment_method and 'classroom_delivery' in payment_method:
-            deliver_to_class += 1
-
-    # Calculate percentages with division by zero protection
-    cash_percentage = (cash_orders / total_transactions * 100) if total_transactions > 0 else 0
-    online_percentage = (online_orders / total_transactions * 100) if total_transactions > 0 else 0
-    delivery_percentage = (deliver_to_class / total_transactions * 100) if total_transactions > 0 else 0
-
-    # Add payment method breakdown table header
-    stats_sheet['D6'] = "Payment Method Breakdown"
-    stats_sheet['D6'].font = Font(bold=True)
-
-    # Add header row for payment method table
-    stats_sheet['D7'] = "Payment Type"
-    stats_sheet['E7'] = "Count"
-    stats_sheet['F7'] = "Percentage"
-
-    # Style the header row
-    for cell in stats_sheet['D7:F7'][0]:
-        cell.font = Font(bold=True)
-        cell.fill = PatternFill(start_color="E0E0E0", end_color="E0E0E0", fill_type="solid")
-
-    # Add payment method statistics data rows
-    stats_sheet['D8'] = "Cash Orders"
-    stats_sheet['E8'] = cash_orders
-    stats_sheet['F8'] = f"{cash_percentage:.1f}%"
-
-    stats_sheet['D9'] = "Online/UPI Orders"
-    stats_sheet['E9'] = online_orders
-    stats_sheet['F9'] = f"{online_percentage:.1f}%"
-
-    stats_sheet['D10'] = "Deliver to Class"
-    stats_sheet['E10'] = deliver_to_class
-    stats_sheet['F10'] = f"{delivery_percentage:.1f}%"
-
-    # --- REDUNDANT TOP ITEMS SECTION HEADERS (duplicated code, can be removed) ---
-    stats_sheet['A10'] = "Top Sold Items"
-    stats_sheet['A10'].font = Font(bold=True)
-    stats_sheet['A11'] = "Item Name"
-    stats_sheet['B11'] = "Quantity"
-    
-    # --- TRANSACTION DATA SHEET ---
-    # Define columns for transaction details
-    headers = ['Order ID', 'Student ID', 'Name', 'Date', 'Total Amount', 'Payment Method', 'Status']
-    for col_idx, header in enumerate(headers, 1):
-        cell = data_sheet.cell(row=1, column=col_idx)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = header_align
-        
-    # Add individual transaction rows to the data sheet
-    row = 2
-    for order in queryset:
-        # Calculate total amount for this specific order
-        order_total = sum(item.price * item.quantity for item in OrderItem.objects.filter(order=order))
-        
-        # Fill in transaction details with safety checks for missing attributes
-        data_sheet.cell(row=row, column=1).value = order.order_id
-        data_sheet.cell(row=row, column=2).value = order.student_id
-        data_sheet.cell(row=row, column=3).value = order.name if hasattr(order, 'name') and order.name else ''
-        data_sheet.cell(row=row, column=4).value = order.date_created.strftime('%Y-%m-%d %H:%M:%S')
-        data_sheet.cell(row=row, column=5).value = float(order_total)
-        data_sheet.cell(row=row, column=6).value = order.payment_method if hasattr(order, 'payment_method') and order.payment_method else ''
-        data_sheet.cell(row=row, column=7).value = order.status.title() if hasattr(order, 'status') and order.status else 'Pending'
-        row += 1
-    
-    # Set column widths for better readability in data sheet
-    for col_idx, width in enumerate([15, 15, 20, 20, 15, 20, 15], 1):
-        data_sheet.column_dimensions[chr(64 + col_idx)].width = width
-    
-    # --- GENERATE AND RETURN EXCEL RESPONSE ---
-    # Create HTTP response with Excel file
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
+            response = StreamingHttpResponse(chunks, content_type=content_type)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Content-Disposition'] = f'attachment; filename="{filename.rsplit(".", 1)[0]}.{extension}"'
+        return response
+    if export_format != 'xlsx':
+        return JsonResponse({'success': False, 'error': f"Unknown format: {export_format}"}, status=400)
     
-    return response
+    # Written to a temporary file rather than held in memory, then streamed;
+    # the file is deleted once the response is closed
+    output = tempfile.TemporaryFile()
+    write_transactions_workbook(queryset, date_range, output, days=days)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
 
 
 
@@ -726,7 +741,11 @@ def update_order_status(request, order_id):
         # Update order status
         order = Order.objects.get(order_id=order_id)
         order.status = new_status
-        order.save()
+        # Moves the order's daily sales to the new status in the same transaction
+        save_order_status(order)
+        # The student's cached history shows the old status
+        bump_order_owner(order.user_id, order.name or order.student_id)
+        notify_order_change()
         
         # IMPORTANT - Update the delivery status directly
         if delivery_id:
@@ -803,11 +822,14 @@ def update_order_status(request, order_id):
 @manager_required
 def view_delivery_orders(request):
     """View for displaying classroom delivery orders from DeliveryInfo model"""
-    # Get all delivery info records, most recent first
-    delivery_orders = DeliveryInfo.objects.select_related('order').order_by('-order__date')
+    # Get all delivery info records, most recent first; the template shows
+    # each record's delivery status, so load it in the same query
+    delivery_orders = DeliveryInfo.objects.select_related('order', 'status').order_by('-order__date_created')
     
     context = {
-        'delivery_orders': delivery_orders
+        'delivery_orders': delivery_orders,
+        # Where the page polls the change feed from when there is no live stream
+        'changes_cursor': encode_cursor(*changes_floor()),
     }
     return render(request, 'transactions/view_deliver_to_class.html', context)
 
@@ -1,21 +1,19 @@
 from django.shortcuts import render, redirect
 from .models import UserProfile
 from django.contrib.auth.decorators import login_required
-from shop.models import ShopUser
+from shop.user_cache import bump_user_version, cached_for_user
 
 
 def profile(request):
     # Check if user is logged in via shop session
-    shop_user_id = request.session.get('shop_user_id')
+    shop_user = request.shop_user
     
     # If not logged in, redirect to login page
-    if not shop_user_id:
+    if not shop_user:
         return redirect('shop:shop_login')
+    shop_user_id = shop_user.id
     
-    try:
-        # Get the shop user
-        shop_user = ShopUser.objects.get(id=shop_user_id)
-        
+    def load_profile():
         # Get or create a corresponding UserProfile
         user_profile, created = UserProfile.objects.get_or_create(
             shop_user_id=shop_user_id,
@@ -25,30 +23,34 @@ def profile(request):
                 'phone_number': shop_user.phone
             }
         )
+        return user_profile
+    
+    if request.method == 'POST':
+        user_profile = load_profile()
+    else:
+        # Cached until the profile or the user's orders change
+        user_profile = cached_for_user(shop_user_id, 'profile', load_profile)
+    
+    if request.method == 'POST':
+        # Process form data
+        user_profile.name = request.POST.get('user-name', '')
+        user_profile.id_number = request.POST.get('id-number', '')
+        user_profile.email = request.POST.get('email', '')
+        user_profile.company = request.POST.get('company', '')
+        user_profile.phone_number = request.POST.get('phone-number', '')
+        user_profile.birthday = request.POST.get('birthday', '')
+        user_profile.country = request.POST.get('country', '')
+        user_profile.bio = request.POST.get('bio', '')
         
-        if request.method == 'POST':
-            # Process form data
-            user_profile.name = request.POST.get('user-name', '')
-            user_profile.id_number = request.POST.get('id-number', '')
-            user_profile.email = request.POST.get('email', '')
-            user_profile.company = request.POST.get('company', '')
-            user_profile.phone_number = request.POST.get('phone-number', '')
-            user_profile.birthday = request.POST.get('birthday', '')
-            user_profile.country = request.POST.get('country', '')
-            user_profile.bio = request.POST.get('bio', '')
-            
-            # Save the updated profile
-            user_profile.save()
-            
-            # Use the current path instead of named URL
-            return redirect(request.path)
-        
-        # Provide the profile data to the template
-        context = {
-            'profile': user_profile,
-        }
-        return render(request, 'users/profile.html', context)
+        # Save the updated profile
+        user_profile.save()
+        bump_user_version(shop_user_id)
         
-    except ShopUser.DoesNotExist:
-        # Shop user not found, redirect to login
-        return redirect('shop:shop_login')
\ No newline at end of file
+        # Use the current path instead of named URL
+        return redirect(request.path)
+    
+    # Provide the profile data to the template
+    context = {
+        'profile': user_profile,
+    }
+    return render(request, 'users/profile.html', context)
\ No newline at end of file